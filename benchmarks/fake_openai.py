@@ -0,0 +1,222 @@
+# benchmarks/fake_openai.py
+# Deterministic local stand-in for the OpenAI chat-completions and embeddings
+# endpoints, with injected latency. Point the app at it with
+#   OPENAI_BASE_URL=http://127.0.0.1:<port>/v1   (and any OPENAI_API_KEY)
+#
+#   python -m benchmarks.fake_openai --port 8765 --latency-ms 200 --token-latency-ms 15
+
+import re
+import json
+import time
+import zlib
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _words(item) -> List[str]:
+    # Embedding inputs arrive as text or, from OpenAIEmbeddings, as token id lists
+    if isinstance(item, list):
+        return [str(t) for t in item]
+    return re.findall(r"\w+", str(item).lower())
+
+
+class FakeOpenAI:
+    """
+    Threaded HTTP server answering /v1/chat/completions (plain and streamed) and
+    /v1/embeddings.
+    - chat: `latency_ms` before the first token, then `token_latency_ms` per token;
+      the answer is `answer_words` words picked from the prompt (same prompt → same answer)
+    - embeddings: `latency_ms` per request; hashed bag-of-words vectors of `dim`
+      (similar texts → similar vectors, so retrieval behaves plausibly)
+    `calls` counts requests per endpoint.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        token_latency_ms: float = 0.0,
+        embed_latency_ms: Optional[float] = None,
+        answer_words: int = 60,
+        dim: int = 1536,
+    ):
+        self.latency = latency_ms / 1000.0
+        self.token_latency = token_latency_ms / 1000.0
+        self.embed_latency = (latency_ms if embed_latency_ms is None else embed_latency_ms) / 1000.0
+        self.answer_words = answer_words
+        self.dim = dim
+        self.calls: Dict[str, int] = {"chat": 0, "chat_stream": 0, "embeddings": 0, "embedded_inputs": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.calls[key] += n
+
+    def reset_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self.calls)
+            for key in self.calls:
+                self.calls[key] = 0
+        return counts
+
+    # ── Responses ──
+
+    def embed(self, inputs: List) -> np.ndarray:
+        out = np.zeros((len(inputs), self.dim), dtype=np.float32)
+        for row, item in enumerate(inputs):
+            for word in _words(item):
+                h = zlib.crc32(word.encode("utf-8"))
+                out[row, h % self.dim] += -1.0 if h & 0x80000000 else 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def answer(self, messages: List[dict]) -> List[str]:
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+        words = re.findall(r"[A-Za-z][\w'-]*", prompt) or ["ok"]
+        rng = np.random.default_rng(zlib.crc32(prompt.encode("utf-8")))
+        picked = [words[i] for i in rng.integers(0, len(words), self.answer_words)]
+        return ["According", " to", " the", " documents,"] + [f" {w}" for w in picked] + ["."]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._json(400, {"error": {"message": "invalid JSON"}})
+                    return
+                path = self.path.rstrip("/")
+                if path.endswith("/chat/completions"):
+                    self._chat(request)
+                elif path.endswith("/embeddings"):
+                    self._embeddings(request)
+                else:
+                    self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+            def _chat(self, request: dict):
+                model = request.get("model", "fake")
+                tokens = fake.answer(request.get("messages") or [])
+                created = int(time.time())
+                if not request.get("stream"):
+                    fake._count("chat")
+                    time.sleep(fake.latency + fake.token_latency * len(tokens))
+                    self._json(200, {
+                        "id": f"chatcmpl-{created}",
+                        "object": "chat.completion",
+                        "created": created,
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+                    })
+                    return
+
+                fake._count("chat_stream")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                time.sleep(fake.latency)
+
+                def event(delta: dict, finish: Optional[str] = None):
+                    chunk = {
+                        "id": f"chatcmpl-{created}",
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                event({"role": "assistant", "content": ""})
+                for token in tokens:
+                    time.sleep(fake.token_latency)
+                    event({"content": token})
+                event({}, "stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _embeddings(self, request: dict):
+                inputs = request.get("input")
+                if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+                    inputs = [inputs]
+                inputs = inputs or []
+                fake._count("embeddings")
+                fake._count("embedded_inputs", len(inputs))
+                time.sleep(fake.embed_latency)
+                vectors = fake.embed(inputs)
+                as_base64 = request.get("encoding_format") == "base64"
+                data = [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": base64.b64encode(v.astype("<f4").tobytes()).decode("ascii") if as_base64 else v.tolist(),
+                    }
+                    for i, v in enumerate(vectors)
+                ]
+                self._json(200, {
+                    "object": "list",
+                    "data": data,
+                    "model": request.get("model", "fake"),
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake of the OpenAI chat/embeddings API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    server = FakeOpenAI(args.host, args.port, args.latency_ms, args.token_latency_ms, dim=args.dim).start()
+    print(f"🧪 Fake OpenAI API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
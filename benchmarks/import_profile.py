@@ -0,0 +1,179 @@
+# benchmarks/import_profile.py
+# Cold-start import profile of the entry points: runs each file's module-level
+# imports (what executes before the first screen / prompt) in a fresh interpreter
+# with `-X importtime`, and reports wall time, RSS, module count, the heaviest
+# packages and whether the ingestion stack was pulled in.
+#
+#   python -m benchmarks.import_profile                       # ui/streamlit_app.py + demo_workflow.py
+#   python -m benchmarks.import_profile demo_workflow.py --repeat 5 --top 15
+#   python -m benchmarks.import_profile --out before.json ; ... ; --compare before.json
+#
+# Imports inside functions (deferred on purpose) are not counted. A package that is
+# not installed is reported as missing and skipped, so the numbers are a lower bound.
+
+import os
+import sys
+import ast
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+ENTRY_POINTS = ["ui/streamlit_app.py", "demo_workflow.py"]
+
+# Packages only ingestion needs; a query-only cold start should import none of them
+INGEST_STACK = [
+    "modules.rag_ingest",
+    "langchain_community.document_loaders",
+    "playwright",
+    "unstructured",
+    "pypdf",
+]
+
+# Runs in the child interpreter: execute each import, then report timings
+_CHILD = r"""
+import os, sys, json, time, resource
+sys.path[:0] = {paths!r}
+missing = []
+start = time.perf_counter()
+for stmt in {statements!r}:
+    try:
+        exec(stmt, {{}})
+    except ImportError as e:
+        missing.append(getattr(e, "name", None) or str(e))
+wall = time.perf_counter() - start
+rss = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024.0
+except OSError:
+    pass
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024.0 ** 2 if sys.platform == "darwin" else 1024.0)
+print(json.dumps({{"wall_s": wall, "rss_mb": rss or maxrss, "modules": sorted(sys.modules), "missing": missing}}))
+"""
+
+
+def module_level_imports(path: str) -> List[str]:
+    """Source of every import statement that runs when `path` is executed (not inside defs)."""
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source, filename=path)
+    out = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                out.append(ast.get_source_segment(source, node))
+            elif isinstance(node, (ast.If, ast.Try, ast.With)):
+                visit(node.body)
+                for handler in getattr(node, "handlers", []):
+                    visit(handler.body)
+                visit(getattr(node, "orelse", []))
+                visit(getattr(node, "finalbody", []))
+
+    visit(tree.body)
+    return out
+
+
+def _parse_importtime(stderr: str) -> Dict[str, int]:
+    """Self time (µs) per imported module from `-X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   <self> | <cumulative> | <indent><module>"
+        head, _, name = line.split("|", 2)
+        try:
+            times[name.strip()] = int(head.split(":", 1)[1])
+        except ValueError:
+            continue
+    return times
+
+
+def profile_once(entry: str) -> dict:
+    path = os.path.join(ROOT, entry)
+    statements = module_level_imports(path)
+    code = _CHILD.format(paths=[ROOT, os.path.dirname(path)], statements=statements)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"profiling {entry} failed:\n{proc.stderr[-2000:]}")
+    report = json.loads(lines[-1])
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us in _parse_importtime(proc.stderr).items():
+        by_package[name.split(".")[0]] += self_us
+    modules = report.pop("modules")
+    report.update({
+        "statements": len(statements),
+        "module_count": len(modules),
+        "ingest_stack": [p for p in INGEST_STACK if any(m == p or m.startswith(p + ".") for m in modules)],
+        "packages_ms": {k: round(v / 1000.0, 1) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])},
+    })
+    return report
+
+
+def profile(entry: str, repeat: int) -> dict:
+    """Best of `repeat` cold starts (each in a new interpreter)."""
+    runs = [profile_once(entry) for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda r: r["wall_s"])
+    best["wall_s"] = round(best["wall_s"], 3)
+    best["rss_mb"] = round(best["rss_mb"], 1)
+    best["runs_s"] = [round(r["wall_s"], 3) for r in runs]
+    return best
+
+
+def _print(entry: str, r: dict, top: int):
+    print(f"\n🚀 {entry}: {r['wall_s'] * 1000:.0f} ms, RSS {r['rss_mb']} MB, "
+          f"{r['module_count']} modules ({r['statements']} import statements)")
+    if r["missing"]:
+        print(f"   ⚠️ not installed (skipped): {', '.join(r['missing'])}")
+    print(f"   📥 ingestion stack: {', '.join(r['ingest_stack']) or 'not imported'}")
+    for name, ms in list(r["packages_ms"].items())[:top]:
+        print(f"   {name:<32} {ms:>8.1f} ms")
+
+
+def compare(baseline: dict, current: dict):
+    print("\n📊 baseline → current")
+    for entry, r in current.items():
+        b = baseline.get(entry)
+        if not b:
+            continue
+        for key, unit in (("wall_s", "s"), ("rss_mb", "MB"), ("module_count", "")):
+            a, c = b[key], r[key]
+            delta = f"{(c - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"   {entry:<24} {key:<13} {a!s:>8}{unit} → {c!s:>8}{unit}  {delta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import profile of the entry points")
+    parser.add_argument("entries", nargs="*", default=ENTRY_POINTS, help="entry files, relative to the project root")
+    parser.add_argument("--repeat", type=int, default=3, help="cold starts per entry (best is reported)")
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to list")
+    parser.add_argument("--out", default=None, help="write the report as JSON")
+    parser.add_argument("--compare", default=None, help="earlier --out report to compare against")
+    args = parser.parse_args()
+
+    results = {entry: profile(entry, args.repeat) for entry in args.entries}
+    for entry, r in results.items():
+        _print(entry, r, args.top)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Report saved to {args.out}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
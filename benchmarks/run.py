@@ -0,0 +1,362 @@
+# benchmarks/run.py
+# Offline benchmark of ingestion, RAG queries and the full UI flow against a local
+# fake of the OpenAI API (benchmarks/fake_openai.py) with injected latency.
+#
+#   python -m benchmarks.run                                 # all scenarios, results/<time>-<commit>.json
+#   python -m benchmarks.run --latency-ms 300 --synthetic-docs 100 --scenarios ingest
+#   python -m benchmarks.run --compare benchmarks/results/<baseline>.json
+#
+# Everything runs on a scratch copy (documents + synthetic PDFs, empty URL list,
+# fresh vectorstore and caches); the project's own vectorstore is never touched.
+# With EMBED_BACKEND=openai, OpenAIEmbeddings needs tiktoken's BPE file: offline,
+# pre-populate TIKTOKEN_CACHE_DIR or use --embed-backend hashing.
+
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.synthetic import make_corpus
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Fixed question set: answerable from the bundled policies, plus off-topic ones
+# that should miss and exercise the fallback in the flow scenario
+QUESTIONS = [
+    "What is covered under the Home+ plan?",
+    "How do I cancel my plan and get a refund?",
+    "Is accidental damage from handling covered?",
+    "What is the deductible for a claim?",
+    "How do I file a claim?",
+    "Are pre-existing conditions excluded?",
+    "What happens if my product cannot be repaired?",
+    "Can I transfer the plan to someone else?",
+    "What are the limits of liability?",
+    "Is there a service fee for repairs?",
+    "How does arbitration work under this agreement?",
+    "What do Arizona residents get on cancellation?",
+]
+OFF_TOPIC = [
+    "What is the capital of Australia?",
+    "Give me a recipe for banana bread.",
+    "Who wrote the Odyssey?",
+]
+
+
+# ── Measurement helpers ──
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+class PeakRSS:
+    """Samples this process's RSS every `interval` s while active (falls back to ru_maxrss)."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = _rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_mb() or 0.0
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            try:
+                import resource
+
+                scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+                self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+            except ImportError:
+                pass
+
+
+def _children_peak_mb() -> Optional[float]:
+    # PDF parsing runs in worker processes; their peak is reported separately
+    try:
+        import resource
+
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    except ImportError:
+        return None
+
+
+def _latency(samples: List[float]) -> dict:
+    if not samples:
+        return {}
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "mean": round(float(values.mean()), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def _measure(name: str, fake: FakeOpenAI, items: List, run_one: Callable, unit: str) -> dict:
+    """Time `run_one(item)` for each item; returns the scenario's result dict."""
+    from modules.tracing import get_tracer
+
+    tracer = get_tracer()
+    tracer.reset()
+    fake.reset_counts()
+    samples, extra = [], {}
+    print(f"⏱️  {name}: {len(items)} run(s)…")
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        for item in items:
+            t0 = time.perf_counter()
+            info = run_one(item)
+            samples.append(time.perf_counter() - t0)
+            for key, value in (info or {}).items():
+                extra[key] = extra.get(key, 0) + value
+        wall = time.perf_counter() - started
+    units = extra.pop("units", len(items))
+    return {
+        "runs": len(items),
+        "wall_s": round(wall, 3),
+        "throughput": {"value": round(units / wall, 3) if wall else None, "unit": unit},
+        "latency_ms": _latency(samples),
+        "peak_rss_mb": round(rss.peak, 1),
+        "stages": {
+            stage: {"count": s["count"], "p50_ms": round(s["p50_ms"], 2), "p95_ms": round(s["p95_ms"], 2)}
+            for stage, s in sorted(tracer.stage_stats().items())
+        },
+        "api_calls": fake.reset_counts(),
+        **extra,
+    }
+
+
+# ── Scenarios ──
+
+def bench_ingest(fake: FakeOpenAI, runs: int) -> Dict[str, dict]:
+    from modules.config import PERSIST_DIR
+    from modules.rag_ingest import ingest_documents
+    from modules.store_registry import get_registry
+
+    def chunks() -> int:
+        return get_registry(PERSIST_DIR).current().chroma._collection.count()
+
+    def full(_):
+        ingest_documents(force_reload=True)
+        return {"units": chunks()}
+
+    def incremental(_):
+        # Nothing changed: measures hashing + manifest checks only
+        ingest_documents(force_reload=False)
+        return {}
+
+    results = {"ingest_full": _measure("ingest (full rebuild)", fake, list(range(runs)), full, "chunks/s")}
+    results["ingest_full"]["chunks"] = chunks()
+    results["ingest_full"]["children_peak_rss_mb"] = _children_peak_mb()
+    results["ingest_noop"] = _measure("ingest (no changes)", fake, list(range(runs)), incremental, "runs/s")
+    return results
+
+
+def bench_query(fake: FakeOpenAI, rounds: int) -> dict:
+    from modules.rag_qa import RAGQA
+
+    rag = RAGQA()
+
+    def one(question):
+        answer, sources = rag.query(question)
+        return {"hits": int(bool(answer and sources))}
+
+    return _measure("RAGQA.query", fake, QUESTIONS * rounds, one, "queries/s")
+
+
+def bench_flow(fake: FakeOpenAI, rounds: int, max_tokens: int) -> dict:
+    """plan → RAG / fallback (orchestrated) → summarize → memory, as the Streamlit app does."""
+    from modules.rag_qa import RAGQA
+    from modules.planner import Planner
+    from modules.orchestrator import AnswerOrchestrator
+    from modules.summarizer import Summarizer
+    from modules.memory import ChatMemory
+    from modules.tracing import span
+
+    orchestrator = AnswerOrchestrator(RAGQA())
+    planner, summarizer, memory = Planner(), Summarizer(), ChatMemory()
+
+    def one(question):
+        with span("flow"):
+            with span("plan"):
+                plan = planner.plan(question)
+            memory.add_user_message(question)
+            outcome = planner.answer(plan, orchestrator, max_tokens=max_tokens)
+            summary = summarizer.summarize(outcome.answer, max_tokens=max_tokens)
+            memory.add_ai_message(summary)
+        return {"fallbacks": int(outcome.provenance == "GPT"), f"band_{outcome.band}": 1}
+
+    return _measure("plan → RAG / fallback → summarize", fake, (QUESTIONS + OFF_TOPIC) * rounds, one, "turns/s")
+
+
+# ── Setup / results ──
+
+def _prepare_workspace(work: str, synthetic_docs: int, pages: int) -> str:
+    docs = os.path.join(work, "documents")
+    os.makedirs(docs)
+    for pdf in glob.glob(os.path.join(ROOT, "documents", "*.pdf")):
+        shutil.copy(pdf, docs)
+    if synthetic_docs:
+        make_corpus(docs, docs=synthetic_docs, pages=pages)
+    open(os.path.join(docs, "urls.txt"), "w").close()  # no network sources in benchmarks
+    return docs
+
+
+def _configure_env(args, work: str, docs: str, fake: FakeOpenAI):
+    # Must run before any `modules.*` import: config is read at import time
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": fake.base_url,
+        "OPENAI_API_BASE": fake.base_url,
+        "DOCS_DIR": docs,
+        "CHROMA_DB_DIR": os.path.join(work, "vectorstore"),
+        "CACHE_DIR": os.path.join(work, ".cache"),
+        "EMBED_BACKEND": args.embed_backend,
+        "TRACE_SINKS": "",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    if not args.warm_caches:
+        os.environ["EMBED_CACHE_ENABLED"] = "false"
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+
+def _git_commit() -> dict:
+    def git(*cmd) -> str:
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def _summary_rows(results: dict) -> Dict[str, float]:
+    rows = {}
+    for name, r in results.get("scenarios", {}).items():
+        rows[f"{name} throughput ({r['throughput']['unit']})"] = r["throughput"]["value"]
+        for q in ("p50", "p95", "p99"):
+            rows[f"{name} {q} ms"] = r["latency_ms"].get(q)
+        rows[f"{name} peak RSS MB"] = r["peak_rss_mb"]
+    return rows
+
+
+def compare(baseline: dict, current: dict):
+    """Print each headline metric of `current` next to `baseline` with the change in %."""
+    old, new = _summary_rows(baseline), _summary_rows(current)
+    print(f"\n📊 {baseline['meta'].get('commit')} → {current['meta'].get('commit')}")
+    for key in new:
+        a, b = old.get(key), new[key]
+        delta = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+        print(f"   {key:<55} {a!s:>10} → {b!s:>10}  {delta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks (fake OpenAI API)")
+    parser.add_argument("--scenarios", default="ingest,query,flow", help="comma separated: ingest, query, flow")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="injected latency per API request")
+    parser.add_argument("--token-latency-ms", type=float, default=2.0, help="injected latency per generated token")
+    parser.add_argument("--answer-words", type=int, default=60, help="words in each fake chat answer")
+    parser.add_argument("--synthetic-docs", type=int, default=20, help="synthetic PDFs added to documents/")
+    parser.add_argument("--pages", type=int, default=3, help="pages per synthetic PDF")
+    parser.add_argument("--ingest-runs", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the question set")
+    parser.add_argument("--max-tokens", type=int, default=60, help="answer/summary length in the flow")
+    parser.add_argument("--embed-backend", default="openai", help="EMBED_BACKEND (openai goes to the fake API)")
+    parser.add_argument("--warm-caches", action="store_true", help="keep embedding/answer caches enabled")
+    parser.add_argument("--out", default=None, help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="baseline result file to compare against")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per fake API call otherwise
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    fake = FakeOpenAI(latency_ms=args.latency_ms, token_latency_ms=args.token_latency_ms,
+                      answer_words=args.answer_words).start()
+    work = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        docs = _prepare_workspace(work, args.synthetic_docs, args.pages)
+        _configure_env(args, work, docs, fake)
+
+        results = {
+            "meta": {
+                **_git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "documents": len(glob.glob(os.path.join(docs, "*.pdf"))),
+                "args": vars(args),
+            },
+            "scenarios": {},
+        }
+        if "ingest" in scenarios or not os.path.exists(os.environ["CHROMA_DB_DIR"]):
+            ingest = bench_ingest(fake, args.ingest_runs)
+            if "ingest" in scenarios:
+                results["scenarios"].update(ingest)
+        if "query" in scenarios:
+            results["scenarios"]["query"] = bench_query(fake, args.rounds)
+        if "flow" in scenarios:
+            results["scenarios"]["flow"] = bench_flow(fake, args.rounds, args.max_tokens)
+    finally:
+        fake.stop()
+        shutil.rmtree(work, ignore_errors=True)
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, r in results["scenarios"].items():
+        lat = r["latency_ms"]
+        print(f"✅ {name}: {r['throughput']['value']} {r['throughput']['unit']}, "
+              f"p50 {lat.get('p50')} / p95 {lat.get('p95')} / p99 {lat.get('p99')} ms, "
+              f"peak RSS {r['peak_rss_mb']} MB, API calls {r['api_calls']}")
+    print(f"💾 Results saved to {out}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/synthetic.py
+# Synthetic policy-like PDFs for ingestion benchmarks (stdlib only: the PDF is
+# written by hand — one Helvetica text stream per page, enough for pypdf).
+
+import os
+import random
+from typing import List
+
+TOPICS = [
+    "water damage", "accidental breakage", "theft", "fire and smoke", "power surge",
+    "cancellation refund", "deductible", "service fee", "claims process", "arbitration",
+    "pre-existing conditions", "transfer of plan", "renewal", "limits of liability",
+]
+VERBS = ["covers", "excludes", "limits", "requires", "reimburses", "replaces", "repairs"]
+OBJECTS = [
+    "the covered product", "parts and labor", "the monthly plan fee", "written notice",
+    "the original receipt", "an authorized repair center", "the replacement device",
+]
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    code = f"{rng.choice('ABCDEFGH')}{rng.randint(100, 999)}-{rng.randint(10, 99)}"
+    return (
+        f"Clause {code}: this plan {rng.choice(VERBS)} {rng.choice(OBJECTS)} for {topic} "
+        f"within {rng.randint(10, 90)} days, up to ${rng.randint(50, 5000)} per claim."
+    )
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: str, pages: List[str]):
+    """Minimal valid PDF with one text page per entry of `pages`."""
+    objects: List[bytes] = []
+    n_pages = len(pages)
+    # 1 catalog, 2 pages, 3 font, then (page, content) pairs
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n_pages))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        rows = ["BT /F1 10 Tf 12 TL 50 780 Td"]
+        rows += [f"({_escape(line)}) '" for line in _wrap(text)[:60]]
+        rows.append("ET")
+        stream = "\n".join(rows).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{off:010d} 00000 n \n" for off in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(directory: str, docs: int = 20, pages: int = 3, sentences: int = 25, seed: int = 0) -> List[str]:
+    """Write `docs` synthetic PDFs of `pages` pages into `directory`; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for d in range(docs):
+        body = []
+        for _ in range(pages):
+            topic = rng.choice(TOPICS)
+            body.append(f"Section on {topic}. " + " ".join(_sentence(rng, topic) for _ in range(sentences)))
+        path = os.path.join(directory, f"synthetic_{seed}_{d:04d}.pdf")
+        write_pdf(path, body)
+        paths.append(path)
+    return paths
@@ -2,13 +2,25 @@
 import os
 import time
 import argparse
-import shutil
 
 from modules.context import AgentContext
-from modules.rag_ingest import ingest_documents
 from modules.rag_qa import RAGQA
-from modules.fallback import fallback_answer
+from modules.orchestrator import AnswerOrchestrator
 from modules.config import PERSIST_DIR as CHROMA_DB_DIR
+from modules.generation import has_store
+
+def wait_for_job(job_id, interval=2.0):
+    """Poll an ingestion job, printing progress until it finishes."""
+    from modules.rag_ingest import job_status
+
+    while True:
+        job = job_status(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        eta = f", ~{int(job['eta'])}s left" if job["eta"] is not None else ""
+        print(f"   … {job['sources_done']}/{job['sources_total'] or '?'} source(s), "
+              f"{job['chunks_embedded']} chunk(s) embedded{eta}")
+        time.sleep(interval)
 
 def main():
     parser = argparse.ArgumentParser(description="AI Agent MCP CLI Demo")
@@ -20,23 +32,34 @@ def main():
         "--rebuild-db", action="store_true",
         help="Force rebuild of the vector DB before starting"
     )
+    parser.add_argument(
+        "--skip-ingest", action="store_true",
+        help="Query the existing vector DB without refreshing it (skips loading the ingestion stack)"
+    )
     args = parser.parse_args()
 
-    # Optional: wipe vectorstore if requested
-    if args.rebuild_db and os.path.exists(CHROMA_DB_DIR):
-        print("🧹 Wiping existing vector store...")
-        shutil.rmtree(CHROMA_DB_DIR)
-
     use_fallback = args.gpt_fallback or \
         os.getenv("FALLBACK_WEB_SEARCH", "false").lower() == "true"
 
-    # 0️⃣ Ingest
-    print("📥 Ingesting documents…")
-    ingest_documents(force_reload=False)
+    # 0️⃣ Ingest in the background (--rebuild-db re-embeds everything into a new generation)
+    job_id, job_reported = None, True
+    if not args.skip_ingest or args.rebuild_db or not has_store(CHROMA_DB_DIR):
+        # Imported here: query-only runs never load loaders/Playwright
+        from modules.rag_ingest import submit_ingest
+
+        print("📥 Ingesting documents in the background…")
+        job_id = submit_ingest(force_reload=args.rebuild_db)
+        job_reported = False
+    if job_id is not None and not has_store(CHROMA_DB_DIR):
+        # Nothing to query yet: wait for the first build
+        job = wait_for_job(job_id)
+        job_reported = True
+        print(f"📥 Ingestion {job['status']}." + (f" {job['error']}" if job["error"] else ""))
 
     # 1️⃣ Initialize
     ctx = AgentContext()
     rag = RAGQA(force_reload=False)
+    orchestrator = AnswerOrchestrator(rag)
     print("🤖 AI Agent MCP Initialized.\n")
 
     # 2️⃣ Chat loop
@@ -48,54 +71,32 @@ def main():
 
         ctx.add_chat("user", q)
 
-        # 3️⃣ RAG
+        # Report the background refresh once it has finished
+        if not job_reported:
+            from modules.rag_ingest import job_status
+
+            job = job_status(job_id)
+            if job["status"] not in ("queued", "running"):
+                print(f"📥 Background ingestion {job['status']}.")
+                job_reported = True
+
+        # 3️⃣ RAG, or GPT fallback on a miss (borderline retrievals race both, so a
+        #    miss costs one LLM round trip instead of RAG then fallback)
         print("🔎 Searching documents…")
         try:
-            ans, srcs = rag.query(q)
+            outcome = orchestrator.answer(q, use_fallback=use_fallback)
         except Exception as e:
-            ans, srcs = f"[Error: {e}]", []
-
-        # Normalize the answer
-        normalized_ans = ans.strip().lower() if ans else ""
-
-        # List of fallback-worthy phrases
-        fallback_phrases = [
-            "i'm sorry, but the provided context",
-            "the text does not provide information",
-            "the provided context does not include",
-            "no relevant documents found",
-            "no relevant context was found",
-        ]
-
-        # Check if RAG answer is meaningful or fallback-worthy
-        if normalized_ans and not any(p in normalized_ans for p in fallback_phrases):
-            print(f"📄 RAG Answer:\n{ans}\n")
-            ctx.add_chat("agent", ans)
-        else:
-            # Trigger fallback
-            if use_fallback:
-                print("💬 No useful RAG answer — asking ChatGPT (fallback)…")
-                try:
-                    fallback = fallback_answer(q)
-                    print(f"💬 ChatGPT:\n{fallback}\n")
-                    ctx.add_chat("agent", fallback)
-                except Exception as e:
-                    print(f"[Fallback Error: {e}]")
-            else:
-                print("⚠️  No useful RAG answer and fallback is OFF.\n")
-
-        
-        # 4️⃣ GPT fallback
-        if use_fallback:
-            print("💬 No RAG hit — ChatGPT fallback…")
-            try:
-                ans = fallback_answer(q)
-            except Exception as e:
-                ans = f"[GPT fallback error: {e}]"
-            print(f"💬 ChatGPT:\n{ans}\n")
-            ctx.add_chat("agent", ans)
+            print(f"[Error: {e}]\n")
+            continue
+
+        if outcome.provenance == "RAG":
+            print(f"📄 RAG Answer:\n{outcome.answer}\n")
+            ctx.add_chat("agent", outcome.answer)
+        elif outcome.provenance == "GPT":
+            print(f"💬 ChatGPT (fallback):\n{outcome.answer}\n")
+            ctx.add_chat("agent", outcome.answer)
         else:
-            print("⚠️  No answer found and fallback is OFF.\n")
+            print("⚠️  No useful RAG answer and fallback is OFF.\n")
 
         time.sleep(0.5)
 
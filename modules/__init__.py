@@ -1 +1,16 @@
-from . import rag_ingest
+# Submodules load on first use: `import modules` stays cheap, and query-only
+# processes never pull in the ingestion stack (rag_ingest → loaders, Playwright).
+import importlib
+
+__all__ = [
+    "answer_cache", "compact_index", "config", "context", "context_packer",
+    "embedding_cache", "embeddings", "fallback", "generation", "llm_pool",
+    "memory", "orchestrator", "planner", "rag_ingest", "rag_qa", "reranker",
+    "service", "sparse_index", "store_registry", "summarizer", "tokens", "tracing",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
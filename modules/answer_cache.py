@@ -0,0 +1,145 @@
+# modules/answer_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, Hashable, Optional
+
+import numpy as np
+
+from modules.config import (
+    ANSWER_CACHE_MAX_DISTANCE,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+)
+from modules.sparse_index import tokenize
+
+# Words that flip a question's meaning but barely move its embedding
+NEGATIONS = frozenset(
+    "not no nor never none without except excluding excluded exclude exclusion exclusions "
+    "cannot isn aren doesn don didn won wasn weren hasn haven".split()
+)
+
+
+def key_terms(question: str) -> FrozenSet[str]:
+    """
+    Terms two questions must share for a cache hit: numbers, dates, policy numbers
+    and other codes, and negations. "Is claim 1234 covered?" and "Is claim 1235
+    covered?" embed almost identically, yet need different answers.
+    """
+    return frozenset(
+        t for t in tokenize(question)
+        if t in NEGATIONS or any(c.isdigit() for c in t) or any(c in "-_./" for c in t)
+    )
+
+
+class SemanticAnswerCache:
+    """
+    Answer-level cache for RAGQA.
+    A lookup hits when a previously answered question's embedding is within
+    `max_distance` cosine distance of the new one, both questions have the same
+    `key_terms`, and the vectorstore generation and model settings (`namespace`)
+    are the same.
+    Bounded by `max_entries` (LRU) and `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        max_distance: float = ANSWER_CACHE_MAX_DISTANCE,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = ANSWER_CACHE_TTL,
+    ):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _evict(self, generation: str):
+        # Entries from another store generation can never hit again
+        now = time.monotonic()
+        stale = [
+            key for key, e in self._entries.items()
+            if e["generation"] != generation or now - e["created"] > self.ttl
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def lookup(
+        self, vector, generation: str, namespace: Hashable = None, question: str = ""
+    ) -> Optional[tuple[str, list]]:
+        """Return the cached (answer, sources) closest to `vector`, or None."""
+        query = self._unit(vector)
+        terms = key_terms(question)
+        with self._lock:
+            self._evict(generation)
+            keys = [
+                k for k, e in self._entries.items()
+                if e["namespace"] == namespace and e["terms"] == terms
+            ]
+            if keys:
+                matrix = np.stack([self._entries[k]["vector"] for k in keys])
+                distances = 1.0 - matrix @ query
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entry = self._entries[key]
+                    return entry["answer"], list(entry["sources"])
+            self.misses += 1
+            return None
+
+    def store(
+        self, vector, answer: str, sources: list, generation: str, namespace: Hashable = None, question: str = ""
+    ):
+        terms = key_terms(question)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": self._unit(vector),
+                "terms": terms,
+                "answer": answer,
+                "sources": list(sources),
+                "generation": generation,
+                "namespace": namespace,
+                "created": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+# Process-wide instance shared by every RAGQA (e.g. all Streamlit sessions)
+_shared_cache: Optional[SemanticAnswerCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = SemanticAnswerCache()
+        return _shared_cache
@@ -0,0 +1,182 @@
+# modules/compact_index.py
+# Compact, memory-mapped vector index (VECTOR_INDEX=compact).
+# - int8 scalar-quantized vectors (one scale per vector) are scanned for candidates
+# - the top candidates are re-scored against float16 copies of the vectors
+#   (2 bytes per dimension; ranking-exact for normalized embeddings in practice)
+# Both matrices are .npy files opened with mmap, so loading is near-instant and
+# only the pages a query touches become resident. Chunk text and metadata stay
+# in Chroma's SQLite (read by id); Chroma's HNSW index is never loaded.
+
+import os
+import json
+import shutil
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+COMPACT_DIR = "compact"
+SCAN_BLOCK = 8192  # rows de-quantized per step (bounds the temporary float copy)
+RESCORE_DTYPE = np.float16
+
+
+class ReadOnlyIndexError(Exception):
+    """Raised on writes to a CompactVectorStore (it is rebuilt from Chroma by ingestion)."""
+
+
+class CompactIndex:
+    """int8 codes + per-vector scales for scanning, float16 vectors for re-scoring."""
+
+    def __init__(self, ids: List[str], codes: np.ndarray, scales: np.ndarray, vectors: np.ndarray):
+        self.ids = ids
+        self.codes = codes
+        self.scales = scales
+        self.vectors = vectors
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ── Build / load ──
+
+    @staticmethod
+    def build(persist_dir: str, collection, page: int = 5000) -> int:
+        """Export every vector of a Chroma `collection` into `persist_dir/compact/`; returns the count."""
+        total = collection.count()
+        target = os.path.join(persist_dir, COMPACT_DIR)
+        tmp = target + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        ids: List[str] = []
+        codes = vectors = scales = None
+        for offset in range(0, total, page):
+            got = collection.get(include=["embeddings"], limit=page, offset=offset)
+            block = np.asarray(got["embeddings"], dtype=np.float32)
+            if codes is None:
+                shape = (total, block.shape[1])
+                codes = np.lib.format.open_memmap(os.path.join(tmp, "codes.npy"), "w+", np.int8, shape)
+                vectors = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), "w+", RESCORE_DTYPE, shape)
+                scales = np.zeros(total, dtype=np.float32)
+            rows = slice(len(ids), len(ids) + len(block))
+            peak = np.abs(block).max(axis=1)
+            peak[peak == 0] = 1.0
+            scales[rows] = peak / 127.0
+            codes[rows] = np.round(block / scales[rows, None]).astype(np.int8)
+            vectors[rows] = block.astype(RESCORE_DTYPE)
+            ids.extend(got["ids"])
+
+        if codes is not None:
+            codes.flush()
+            vectors.flush()
+            del codes, vectors
+        np.save(os.path.join(tmp, "scales.npy"), scales if scales is not None else np.zeros(0, np.float32))
+        with open(os.path.join(tmp, "ids.json"), "w") as f:
+            json.dump(ids, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+        return len(ids)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> Optional["CompactIndex"]:
+        """Memory-map the index in `persist_dir` (None if it was never built)."""
+        root = os.path.join(persist_dir, COMPACT_DIR)
+        try:
+            with open(os.path.join(root, "ids.json"), "r") as f:
+                ids = json.load(f)
+            scales = np.load(os.path.join(root, "scales.npy"))
+            if not ids:
+                return cls([], np.zeros((0, 0), np.int8), scales, np.zeros((0, 0), RESCORE_DTYPE))
+            codes = np.load(os.path.join(root, "codes.npy"), mmap_mode="r")
+            vectors = np.load(os.path.join(root, "vectors.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return cls(ids, codes, scales, vectors)
+
+    # ── Search ──
+
+    def search(self, query: List[float], k: int, rescore: int = 4) -> List[Tuple[str, float]]:
+        """
+        Top-k → [(chunk_id, squared L2 distance)] (the distance Chroma reports).
+        The int8 scan keeps k·`rescore` candidates; those are re-scored in float32
+        from their float16 copies.
+        """
+        n = len(self.ids)
+        if not n or k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        approx = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK):
+            stop = min(n, start + SCAN_BLOCK)
+            approx[start:stop] = (self.codes[start:stop].astype(np.float32) @ q) * self.scales[start:stop]
+
+        keep = min(n, max(k, k * rescore))
+        candidates = np.argpartition(-approx, keep - 1)[:keep]
+        candidates.sort()  # ascending rows → sequential reads from the mmap
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32)
+        dist = (exact * exact).sum(axis=1) + float(q @ q) - 2.0 * (exact @ q)
+        order = np.argsort(dist)[:k]
+        return [(self.ids[candidates[i]], float(max(dist[i], 0.0))) for i in order]
+
+    def vectors_for(self, ids: Iterable[str]) -> np.ndarray:
+        rows = [self._rows[i] for i in ids]
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+
+class CompactVectorStore(VectorStore):
+    """
+    Read-only LangChain VectorStore over a CompactIndex; documents are read from
+    the Chroma collection by id. Drop-in for Chroma wherever only search is used
+    (e.g. `as_retriever(search_type="similarity_score_threshold")`).
+    """
+
+    def __init__(self, index: CompactIndex, chroma, embeddings: Embeddings, rescore: int = 4):
+        self.index = index
+        self.chroma = chroma
+        self._collection = chroma._collection
+        self._embedding_function = embeddings
+        self.rescore = rescore
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def _select_relevance_score_fn(self):
+        return self.chroma._select_relevance_score_fn()
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise ReadOnlyIndexError("CompactVectorStore is read-only; ingest into Chroma and rebuild the index.")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise ReadOnlyIndexError("CompactVectorStore is read-only; build a CompactIndex from a Chroma collection.")
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        hits = self.index.search(embedding, k, self.rescore)
+        if not hits:
+            return []
+        got = self._collection.get(ids=[h[0] for h in hits], include=["documents", "metadatas"])
+        docs = {
+            i: Document(id=i, page_content=text or "", metadata=meta or {})
+            for i, text, meta in zip(got["ids"], got["documents"], got["metadatas"])
+        }
+        return [(docs[i], dist) for i, dist in hits if i in docs]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4, **kwargs: Any):
+        relevance = self._select_relevance_score_fn()
+        return [(doc, relevance(dist)) for doc, dist in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any):
+        return self.similarity_search_by_vector_with_relevance_scores(self.embeddings.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
@@ -16,19 +16,114 @@ PERSIST_DIR = os.path.join(BASE_DIR, "vectorstore")
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 load_dotenv(os.path.join(ROOT, ".env"))
 
-# --- Vector DB ---
-PERSIST_DIR = os.path.join(ROOT, "vectorstore")
+# --- Sources and vector DB (overridable, e.g. for benchmarks on a scratch copy) ---
+DOCS_DIR = os.getenv("DOCS_DIR", DOCS_DIR)
+URL_FILE = os.path.join(DOCS_DIR, "urls.txt")
+PERSIST_DIR = os.getenv("CHROMA_DB_DIR", os.path.join(ROOT, "vectorstore"))
 
 # --- OpenAI models (override in .env if you like) ---
 OPENAI_MODEL_CHAT = os.getenv("OPENAI_MODEL_CHAT", "gpt-4")           # used for RAG QA chain
 OPENAI_MODEL_FALLBACK = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4")   # used for GPT fallback
 OPENAI_MODEL_SUMMARY = os.getenv("OPENAI_MODEL_SUMMARY", "gpt-4")     # used for summarizer
+OPENAI_MODEL_PLANNER = os.getenv("OPENAI_MODEL_PLANNER", OPENAI_MODEL_CHAT)  # question decomposition + synthesis
+
+# --- Shared LLM clients (one per model/temperature, one keep-alive connection pool) ---
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "32"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "16"))         # idle connections kept open
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "120"))  # seconds an idle one lives
 
 # --- Temperatures (override if needed) ---
 TEMP_CHAT = float(os.getenv("TEMP_CHAT", "0.0"))
 TEMP_FALLBACK = float(os.getenv("TEMP_FALLBACK", "0.0"))
 TEMP_SUMMARY = float(os.getenv("TEMP_SUMMARY", "0.0"))
+TEMP_PLANNER = float(os.getenv("TEMP_PLANNER", "0.0"))
 
 # --- Retrieval knobs ---
 RETRIEVER_K = int(os.getenv("RETRIEVER_K", "3"))
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.2"))  # 0.2–0.4 typical
+
+# --- Speculative fallback (race RAG and GPT fallback on borderline retrievals) ---
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_ENABLED", "true").lower() == "true"
+SPECULATIVE_MARGIN = float(os.getenv("SPECULATIVE_MARGIN", "0.1"))  # best score < threshold + margin → race
+
+# --- Query planner (compound questions → sub-query DAG, answered in parallel, then synthesized) ---
+PLANNER_ENABLED = os.getenv("PLANNER_ENABLED", "true").lower() == "true"
+PLANNER_MAX_SUBQUERIES = int(os.getenv("PLANNER_MAX_SUBQUERIES", "4"))
+PLANNER_DEP_TOKENS = int(os.getenv("PLANNER_DEP_TOKENS", "80"))  # of a prerequisite's answer spliced into a dependent sub-query
+
+# --- Dense index used at query time ---
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "chroma")           # "chroma" (HNSW) | "compact" (int8 mmap)
+COMPACT_RESCORE = int(os.getenv("COMPACT_RESCORE", "4"))     # int8 candidates per result re-scored in float
+
+# --- Vectorstore generations (refresh builds a new one, then swaps the pointer) ---
+GENERATIONS_KEEP = int(os.getenv("GENERATIONS_KEEP", "1"))  # retired generations kept for other processes
+
+# --- Hybrid retrieval (BM25 index next to the vectors, fused by reciprocal rank) ---
+HYBRID_ENABLED = os.getenv("HYBRID_ENABLED", "true").lower() == "true"
+SPARSE_K = int(os.getenv("SPARSE_K", "10"))                      # BM25 / dense candidates before fusion
+BM25_MIN_SCORE = float(os.getenv("BM25_MIN_SCORE", "0.5"))       # share of a perfect BM25 match (0–1)
+RRF_K = int(os.getenv("RRF_K", "60"))                            # reciprocal rank fusion constant
+
+# --- Reranking (many candidates in, RETRIEVER_K out; CPU only) ---
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "mmr")               # "mmr" | "cross-encoder"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))     # retrieved before reranking
+RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", "150"))
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", "16"))               # cross-encoder pairs per batch
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))  # 1.0 = relevance only
+
+# --- Context packing for the "stuff" prompt ---
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # 0 = no cap (merge only)
+
+# --- Conversation memory (recent turns verbatim, older ones in a running summary) ---
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))      # verbatim turns + summary
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "400"))   # cap on the running summary
+MEMORY_MAX_MESSAGES = int(os.getenv("MEMORY_MAX_MESSAGES", "40"))        # verbatim messages kept at most
+
+# --- Embeddings ---
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")              # "openai" | "onnx" | "hashing"
+OPENAI_MODEL_EMBED = os.getenv("OPENAI_MODEL_EMBED", "text-embedding-ada-002")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(ROOT, "models", "all-MiniLM-L6-v2"))
+EMBED_DIM = int(os.getenv("EMBED_DIM", "384"))                     # hashing backend width
+EMBED_LOCAL_BATCH = int(os.getenv("EMBED_LOCAL_BATCH", "64"))      # texts per local inference call
+
+# --- Query-embedding cache (LRU in memory, SQLite on disk) ---
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(ROOT, ".cache"))
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(CACHE_DIR, "query_embeddings.sqlite"))
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "1024"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "50000"))
+
+# --- Semantic answer cache (skips the chat model for paraphrased repeats) ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.02"))  # cosine distance; numbers/codes/negations must match too
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+
+# --- Tracing (per-stage latency; sinks: jsonl, prometheus, otel — comma separated) ---
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_SINKS = os.getenv("TRACE_SINKS", "")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", os.path.join(ROOT, "logs", "traces.jsonl"))
+TRACE_PROMETHEUS_PORT = int(os.getenv("TRACE_PROMETHEUS_PORT", "0"))   # 0 = only GET /metrics of the service
+TRACE_PROMETHEUS_HOST = os.getenv("TRACE_PROMETHEUS_HOST", "127.0.0.1")  # 0.0.0.0 to expose it beyond this machine
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))                  # recent spans per stage for p50/p95
+
+# --- Ingestion embedding stage ---
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))   # tokens per embedding request
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))         # batches in flight
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# --- Ingestion loader stage ---
+INGEST_URL_CONCURRENCY = int(os.getenv("INGEST_URL_CONCURRENCY", "8"))        # pages fetched at once
+INGEST_PDF_WORKERS = int(os.getenv("INGEST_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_SOURCE_TIMEOUT = float(os.getenv("INGEST_SOURCE_TIMEOUT", "120"))     # seconds per source
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))                 # loaded sources buffered ahead of embedding
+
+# --- Async HTTP service (python -m modules.service) ---
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_LLM_CONCURRENCY = int(os.getenv("SERVICE_LLM_CONCURRENCY", "8"))   # requests talking to the LLM at once
+SERVICE_MAX_PENDING = int(os.getenv("SERVICE_MAX_PENDING", "64"))          # beyond this → 503 (backpressure)
+SERVICE_FALLBACK = os.getenv("SERVICE_FALLBACK", "true").lower() == "true"
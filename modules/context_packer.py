@@ -0,0 +1,115 @@
+# modules/context_packer.py
+# Builds the "stuff" context: adjacent chunks of the same page are merged (the
+# splitter's chunk_overlap is kept only once) and chunks are added in relevance
+# order until the token budget is spent.
+
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from modules.tokens import count_tokens
+
+# Longest chunk_overlap we try to detect in chunks stored without `start_index`
+MAX_TEXT_OVERLAP = 200
+MIN_TEXT_OVERLAP = 10
+
+
+def _page_key(doc: Document) -> Tuple:
+    meta = doc.metadata or {}
+    return meta.get("source"), meta.get("page")
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    longest = min(len(left), len(right), MAX_TEXT_OVERLAP)
+    for size in range(longest, MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Span:
+    """Merged text of consecutive chunks of one page."""
+
+    __slots__ = ("doc", "text", "start", "end", "rank")
+
+    def __init__(self, doc: Document, rank: int):
+        self.doc = doc
+        self.text = doc.page_content or ""
+        self.start = (doc.metadata or {}).get("start_index")
+        self.end = self.start + len(self.text) if self.start is not None else None
+        self.rank = rank
+
+    def absorb(self, other: "_Span") -> bool:
+        """Append `other` if it continues this span (by offsets, else by shared text)."""
+        if self.start is not None and other.start is not None:
+            if not (self.start <= other.start <= self.end):
+                return False
+            self.text += other.text[self.end - other.start:]
+            self.end = max(self.end, other.end)
+        else:
+            overlap = _text_overlap(self.text, other.text)
+            if overlap:
+                self.text += other.text[overlap:]
+            else:
+                # `other` may precede this chunk on the page
+                overlap = _text_overlap(other.text, self.text)
+                if not overlap:
+                    return False
+                self.text = other.text + self.text[overlap:]
+            self.start = self.end = None
+        self.rank = min(self.rank, other.rank)
+        return True
+
+
+def _merge(docs: List[Document]) -> List[_Span]:
+    # Group by page, order each page's chunks by position, then fold neighbours together
+    pages: Dict[Tuple, List[_Span]] = {}
+    for rank, doc in enumerate(docs):
+        pages.setdefault(_page_key(doc), []).append(_Span(doc, rank))
+
+    spans = []
+    for chunks in pages.values():
+        if all(c.start is not None for c in chunks):
+            chunks.sort(key=lambda c: c.start)
+        current = chunks[0]
+        for chunk in chunks[1:]:
+            if not current.absorb(chunk):
+                spans.append(current)
+                current = chunk
+        spans.append(current)
+    # Most relevant first (a merged span ranks as its best chunk)
+    spans.sort(key=lambda s: s.rank)
+    return spans
+
+
+def _to_documents(spans: List[_Span]) -> List[Document]:
+    return [
+        Document(id=s.doc.id, page_content=s.text, metadata=dict(s.doc.metadata or {}))
+        for s in spans
+    ]
+
+
+def pack_context(docs: List[Document], budget: Optional[int], model: str = "gpt-4") -> List[Document]:
+    """
+    Pack `docs` (most relevant first) into at most `budget` tokens.
+    - adjacent/overlapping chunks from the same source page are merged
+    - chunks are admitted in relevance order; one that no longer fits is skipped
+      (a later, shorter one may still fit)
+    - the most relevant chunk is always kept
+    `budget` of None/0 only merges.
+    """
+    if not docs:
+        return []
+    if not budget:
+        return _to_documents(_merge(docs))
+
+    chosen: List[Document] = []
+    packed: List[_Span] = []
+    for doc in docs:
+        trial = _merge(chosen + [doc])
+        tokens = sum(count_tokens(s.text, model) for s in trial)
+        if tokens <= budget or not chosen:
+            chosen.append(doc)
+            packed = trial
+    return _to_documents(packed)
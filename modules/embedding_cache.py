@@ -0,0 +1,161 @@
+# modules/embedding_cache.py
+
+import os
+import re
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from modules.tracing import annotate
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different questions share a key."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Query-embedding cache in front of any LangChain `Embeddings`.
+    - Keyed by model name + normalized question text
+    - In-memory LRU tier backed by a SQLite file
+    - Both tiers are size-bounded (least recently used rows are evicted)
+    - `stats()` reports hits/misses so the savings are visible
+    Document embeddings (ingestion) are passed straight through.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: str,
+        memory_items: int = 1024,
+        max_entries: int = 50_000,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One connection shared across threads (Streamlit runs sessions in threads);
+        # every access goes through self._lock.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._db.commit()
+        self._tick = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+
+    # ── Keys & (de)serialization ──
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.model_name}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _pack(vector: List[float]) -> bytes:
+        return array.array("f", vector).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[float]:
+        vec = array.array("f")
+        vec.frombytes(blob)
+        return vec.tolist()
+
+    # ── Tiers ──
+
+    def _remember(self, key: str, vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_items:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, key: str):
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            return vector
+
+        self._tick += 1
+        row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (self._tick, key))
+        self._db.commit()
+        vector = self._unpack(row[0])
+        self._remember(key, vector)
+        return vector
+
+    def _store(self, key: str, vector: List[float]):
+        self._tick += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            (key, self._pack(vector), self._tick),
+        )
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._db.commit()
+        self._remember(key, vector)
+
+    # ── Embeddings interface ──
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        with self._lock:
+            vector = self._lookup(key)
+            if vector is not None:
+                self.hits += 1
+                annotate(embed_cache_hit=True)
+                return vector
+            self.misses += 1
+        annotate(embed_cache_hit=False)
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    # ── Introspection ──
+
+    def stats(self) -> dict:
+        with self._lock:
+            (stored,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "memory_items": len(self._lru),
+                "stored_items": stored,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._db.execute("DELETE FROM embeddings")
+            self._db.commit()
+            self.hits = self.misses = 0
@@ -0,0 +1,179 @@
+# modules/embeddings.py
+# Embedding backends selected by EMBED_BACKEND:
+#   openai  – OpenAI API (default)
+#   onnx    – local sentence-transformer exported to ONNX (CPU, offline)
+#   hashing – feature-hashing vectorizer (NumPy only; offline tests, no model files)
+# Every store records which backend embedded it, so a query never searches
+# vectors of another model/dimension.
+
+import os
+import json
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from modules.config import (
+    EMBED_BACKEND,
+    OPENAI_MODEL_EMBED,
+    EMBED_DIM,
+    EMBED_LOCAL_BATCH,
+    ONNX_MODEL_DIR,
+)
+from modules.sparse_index import tokenize
+
+EMBEDDING_INFO_FILE = "embedding.json"
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashing vectorizer: word unigrams + bigrams hashed (crc32) into `dim`
+    signed buckets, log-scaled term frequency, L2-normalized. Deterministic and
+    model-free; lexical similarity only.
+    """
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+        self.backend_id = f"hashing:{dim}"
+
+    def _features(self, text: str) -> List[int]:
+        tokens = tokenize(text)
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            hashes = np.asarray(self._features(text), dtype=np.uint32)
+            rows.append(np.full(len(hashes), row))
+            cols.append(hashes % self.dim)
+            signs.append(np.where(hashes & 0x80000000, -1.0, 1.0))
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(out, (np.concatenate(rows), np.concatenate(cols)), np.concatenate(signs))
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformer exported to ONNX, run with onnxruntime on the CPU.
+    `model_dir` holds `model.onnx` and the Hugging Face `tokenizer.json`.
+    Batches of `batch_size` texts are tokenized together, padded, and mean-pooled.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, batch_size: int = EMBED_LOCAL_BATCH, max_length: int = 256):
+        import onnxruntime as ort  # optional dependency
+        from tokenizers import Tokenizer
+
+        self.batch_size = max(1, batch_size)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_padding()
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        width = self.session.get_outputs()[0].shape[-1]
+        self.dim = width if isinstance(width, int) else None
+        self.backend_id = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in encoded], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        # Mean pooling over real tokens, then L2 normalization
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-9, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            out.extend(self._embed_batch(texts[i:i + self.batch_size]).tolist())
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def get_embeddings(backend: Optional[str] = None) -> Embeddings:
+    """Embedding client for `backend` (defaults to EMBED_BACKEND)."""
+    backend = (backend or EMBED_BACKEND).lower()
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "onnx":
+        return OnnxEmbeddings()
+    if backend != "openai":
+        raise ValueError(f"Unknown EMBED_BACKEND: {backend!r} (expected openai, onnx or hashing)")
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=OPENAI_MODEL_EMBED)
+
+
+def backend_id(embeddings: Embeddings) -> str:
+    """Stable name of the model behind `embeddings` (recorded with every store)."""
+    known = getattr(embeddings, "backend_id", None)
+    if known:
+        return known
+    inner = getattr(embeddings, "embeddings", None)
+    if isinstance(inner, Embeddings):
+        return backend_id(inner)  # e.g. CachedEmbeddings
+    model = getattr(embeddings, "model", None)
+    if type(embeddings).__name__ == "OpenAIEmbeddings" and model:
+        return f"openai:{model}"
+    return type(embeddings).__name__
+
+
+# ── Store compatibility ──
+
+def read_embedding_info(persist_dir: str) -> Optional[dict]:
+    """{"backend": ..., "dim": ...} recorded for the store at `persist_dir` (None if unknown)."""
+    try:
+        with open(os.path.join(persist_dir, EMBEDDING_INFO_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_embedding_info(persist_dir: str, backend: str, dim: Optional[int]):
+    path = os.path.join(persist_dir, EMBEDDING_INFO_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"backend": backend, "dim": dim}, f)
+    os.replace(tmp, path)
+
+
+def check_store(persist_dir: str, embeddings: Embeddings):
+    """
+    Raise ValueError if the store at `persist_dir` was embedded by another backend
+    or with another dimension than `embeddings` produces.
+    """
+    info = read_embedding_info(persist_dir)
+    if not info:
+        return  # store predates the record; nothing to compare
+    current = backend_id(embeddings)
+    if info.get("backend") != current:
+        raise ValueError(
+            f"❌ Vector store at {persist_dir} was embedded with {info.get('backend')}, "
+            f"but EMBED_BACKEND gives {current}. Re-ingest (full rebuild) or switch the backend back."
+        )
+    dim = getattr(getattr(embeddings, "embeddings", embeddings), "dim", None)
+    if dim and info.get("dim") and dim != info["dim"]:
+        raise ValueError(
+            f"❌ Vector store at {persist_dir} holds {info['dim']}-d vectors, "
+            f"but {current} produces {dim}-d vectors."
+        )
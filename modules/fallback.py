@@ -1,5 +1,10 @@
-from langchain_openai import ChatOpenAI
+import time
+from typing import Iterator
+
+from modules.llm_pool import get_chat_model
 from modules.config import OPENAI_MODEL_FALLBACK, TEMP_FALLBACK
+from modules.tokens import count_tokens, length_instruction
+from modules.tracing import span, annotate, get_tracer
 
 SYSTEM = "You are a helpful AI assistant. If documents are unavailable, answer using your general knowledge."
 
@@ -9,22 +14,93 @@ Assistant:"""
 
 class GPTFallback:
     def __init__(self, model_name: str | None = None, temperature: float | None = None):
-        self.llm = ChatOpenAI(
-            model_name=model_name or OPENAI_MODEL_FALLBACK,
-            temperature=TEMP_FALLBACK if temperature is None else temperature,
-        )
+        self.model_name = model_name or OPENAI_MODEL_FALLBACK
+        # Shared client: no new connection pool per GPTFallback
+        self.llm = get_chat_model(self.model_name, TEMP_FALLBACK if temperature is None else temperature)
+
+    @staticmethod
+    def _prompt(question: str, max_tokens: int | None) -> str:
+        system = f"{SYSTEM} {length_instruction(max_tokens)}".strip()
+        return PROMPT.format(system=system, question=question)
+
+    @staticmethod
+    def _content(resp) -> str:
+        content = getattr(resp, "content", None)
+        if not isinstance(content, str):
+            return "[Fallback Error: Invalid response content]"
+        return content.strip()
+
+    def _span(self, prompt: str):
+        return span("fallback.llm", model=self.model_name, prompt_tokens=count_tokens(prompt, self.model_name))
+
+    def _traced(self, text: str) -> str:
+        annotate(answer_tokens=count_tokens(text, self.model_name))
+        return text
+
+    def answer(self, question: str, max_tokens: int | None = None) -> str:
+        prompt = self._prompt(question, max_tokens)
+        with self._span(prompt):
+            try:
+                return self._traced(self._content(self.llm.invoke(prompt)))
+            except Exception as e:
+                annotate(error=str(e))
+                return f"[Fallback Error: {e}]"
+
+    async def aanswer(self, question: str, max_tokens: int | None = None) -> str:
+        prompt = self._prompt(question, max_tokens)
+        with self._span(prompt):
+            try:
+                return self._traced(self._content(await self.llm.ainvoke(prompt)))
+            except Exception as e:
+                annotate(error=str(e))
+                return f"[Fallback Error: {e}]"
 
-    def answer(self, question: str) -> str:
-        prompt = PROMPT.format(system=SYSTEM, question=question)
+    def stream(self, question: str, max_tokens: int | None = None) -> Iterator[str]:
+        """Yield the answer token by token (errors are yielded as text, like `answer`)."""
+        prompt = self._prompt(question, max_tokens)
+        # Recorded as `fallback.llm` like `answer`; timed by hand because a span
+        # cannot stay open across the yields of a generator
+        started = time.perf_counter()
+        first_token_ms, error = None, None
+        shown: list[str] = []
         try:
-            resp = self.llm.invoke(prompt)
-            content = getattr(resp, "content", None)
-            if not isinstance(content, str):
-                return "[Fallback Error: Invalid response content]"
-            return content.strip()
+            for chunk in self.llm.stream(prompt):
+                content = getattr(chunk, "content", None)
+                if isinstance(content, str) and content:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000.0, 1)
+                    shown.append(content)
+                    yield content
         except Exception as e:
-            return f"[Fallback Error: {e}]"
+            error = str(e)
+            yield f"[Fallback Error: {e}]"
+        finally:
+            attrs = {"error": error} if error else {}
+            get_tracer().record(
+                "fallback.llm",
+                (time.perf_counter() - started) * 1000.0,
+                model=self.model_name,
+                prompt_tokens=count_tokens(prompt, self.model_name),
+                streamed=True,
+                first_token_ms=first_token_ms,
+                answer_tokens=count_tokens("".join(shown), self.model_name),
+                **attrs,
+            )
+
+
+_default: GPTFallback | None = None
+
+
+def _default_fallback() -> GPTFallback:
+    global _default
+    if _default is None:
+        _default = GPTFallback()
+    return _default
+
+
+def fallback_answer(question: str, max_tokens: int | None = None) -> str:
+    return _default_fallback().answer(question, max_tokens=max_tokens)
 
 
-def fallback_answer(question: str) -> str:
-    return GPTFallback().answer(question)
+def fallback_stream(question: str, max_tokens: int | None = None) -> Iterator[str]:
+    return _default_fallback().stream(question, max_tokens=max_tokens)
@@ -0,0 +1,251 @@
+# modules/generation.py
+# Vectorstore generations.
+# - Every store directory carries a generation stamp that changes whenever ingestion
+#   rewrites it, so caches keyed on it are invalidated automatically
+# - A refresh builds a new generation directory next to the live one and then swaps
+#   the CURRENT pointer (atomic rename); readers never see a half-built store
+#
+# Layout under PERSIST_DIR:
+#   CURRENT                  → id of the live generation
+#   generations/<id>/        → one complete Chroma store (+ ingest manifest)
+# A store built before generations existed (Chroma files directly in PERSIST_DIR)
+# is served as-is until the first refresh publishes a generation.
+
+import os
+import uuid
+import shutil
+from typing import Iterable, List, Tuple
+
+GENERATION_FILE = ".generation"
+CURRENT_FILE = "CURRENT"
+GENERATIONS_DIR = "generations"
+STAGING_FILE = ".staging"
+CHROMA_FILE = "chroma.sqlite3"
+
+
+def _write_atomic(path: str, text: str):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def read_generation(persist_dir: str) -> str:
+    """Return the generation id of the store at `persist_dir` ('' if unknown)."""
+    try:
+        with open(os.path.join(persist_dir, GENERATION_FILE), "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def write_generation(persist_dir: str, generation: str) -> str:
+    """Stamp `persist_dir` with `generation` (atomic rename)."""
+    _write_atomic(os.path.join(persist_dir, GENERATION_FILE), generation)
+    return generation
+
+
+def bump_generation(persist_dir: str) -> str:
+    """Stamp `persist_dir` with a fresh generation id and return it."""
+    return write_generation(persist_dir, uuid.uuid4().hex)
+
+
+# ── Generation directories ──
+
+def generation_path(persist_dir: str, generation: str) -> str:
+    return os.path.join(persist_dir, GENERATIONS_DIR, generation)
+
+
+def resolve_store(persist_dir: str) -> Tuple[str, str]:
+    """
+    Return (generation, store_dir) for the live store under `persist_dir`.
+    Falls back to the flat legacy layout (store_dir == persist_dir).
+    """
+    try:
+        with open(os.path.join(persist_dir, CURRENT_FILE), "r") as f:
+            generation = f.read().strip()
+    except OSError:
+        generation = ""
+    if generation:
+        path = generation_path(persist_dir, generation)
+        if os.path.isdir(path):
+            return generation, path
+    return read_generation(persist_dir), persist_dir
+
+
+def has_store(persist_dir: str) -> bool:
+    """True once `persist_dir` holds a built store (published generation or legacy layout)."""
+    _, path = resolve_store(persist_dir)
+    return os.path.exists(os.path.join(path, CHROMA_FILE))
+
+
+def _staging_owner(path: str) -> int:
+    try:
+        with open(os.path.join(path, STAGING_FILE), "r") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _kernel32():
+    import ctypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = ctypes.c_void_p
+    kernel32.OpenProcess.argtypes = (ctypes.c_ulong, ctypes.c_int, ctypes.c_ulong)
+    kernel32.GetExitCodeProcess.argtypes = (ctypes.c_void_p, ctypes.POINTER(ctypes.c_ulong))
+    kernel32.CloseHandle.argtypes = (ctypes.c_void_p,)
+    return kernel32, ctypes.get_last_error
+
+
+def _alive_nt(pid: int, api=None) -> bool:
+    # os.kill(pid, 0) would terminate the process on Windows: ask for its exit code instead
+    import ctypes
+
+    kernel32, last_error = api or _kernel32()
+    handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return last_error() == 5  # ERROR_ACCESS_DENIED: exists, owned by someone else
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == 259  # STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        return _alive_nt(pid)
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _abandoned_stagings(persist_dir: str) -> List[str]:
+    root = os.path.join(persist_dir, GENERATIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.exists(os.path.join(path, STAGING_FILE)) and not _alive(_staging_owner(path)):
+            found.append(path)
+    return found
+
+
+def stage_generation(persist_dir: str, copy_current: bool = True) -> Tuple[str, bool]:
+    """
+    Create an unpublished generation directory; returns (path, resumed).
+    With `copy_current`, it starts as a copy of the live store so an incremental
+    ingest only has to embed what changed; a build abandoned by a failed or
+    killed run is picked up instead, so its finished sources are not re-embedded.
+    """
+    abandoned = _abandoned_stagings(persist_dir)
+    if copy_current and abandoned:
+        path = abandoned.pop()
+        _write_atomic(os.path.join(path, STAGING_FILE), str(os.getpid()))
+        for stale in abandoned:
+            discard_generation(stale)
+        return path, True
+    for stale in abandoned:
+        discard_generation(stale)
+
+    path = generation_path(persist_dir, uuid.uuid4().hex)
+    os.makedirs(path)
+    # Marker first (owner pid): collect_generations() never touches a directory being built
+    _write_atomic(os.path.join(path, STAGING_FILE), str(os.getpid()))
+
+    if copy_current:
+        _, current = resolve_store(persist_dir)
+        if os.path.isdir(current):
+            skip = {CURRENT_FILE, GENERATIONS_DIR, STAGING_FILE}
+            shutil.copytree(
+                current, path, dirs_exist_ok=True,
+                ignore=lambda d, names: [n for n in names if d == current and n in skip],
+            )
+    return path, False
+
+
+def publish_generation(persist_dir: str, path: str) -> str:
+    """Make the staged generation at `path` the live one (atomic pointer swap)."""
+    generation = os.path.basename(os.path.normpath(path))
+    write_generation(path, generation)
+    os.remove(os.path.join(path, STAGING_FILE))
+    _write_atomic(os.path.join(persist_dir, CURRENT_FILE), generation)
+    return generation
+
+
+def abandon_generation(path: str):
+    """Release a staged generation after a failed build so the next refresh resumes it."""
+    _write_atomic(os.path.join(path, STAGING_FILE), "0")
+
+
+def discard_generation(path: str):
+    """Drop a staged generation that will not be published."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _published_at(path: str) -> float:
+    try:
+        return os.path.getmtime(os.path.join(path, GENERATION_FILE))
+    except OSError:
+        return 0.0
+
+
+def _remove_legacy(persist_dir: str):
+    for name in os.listdir(persist_dir):
+        if name == GENERATIONS_DIR or name.startswith(CURRENT_FILE):
+            continue
+        path = os.path.join(persist_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def collect_generations(persist_dir: str, in_use: Iterable[str] = (), keep: int = 1) -> List[str]:
+    """
+    Delete retired generations no reader in this process holds (`in_use` store dirs).
+    The `keep` most recent retired ones survive for readers in other processes.
+    Returns the removed store directories.
+    """
+    current, current_path = resolve_store(persist_dir)
+    if current_path == persist_dir:
+        return []  # legacy layout is still the live store
+
+    in_use = {os.path.abspath(p) for p in in_use}
+    retired = []
+    root = os.path.join(persist_dir, GENERATIONS_DIR)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name == current or not os.path.isdir(path) or os.path.exists(os.path.join(path, STAGING_FILE)):
+            continue
+        retired.append(path)
+    retired.sort(key=_published_at, reverse=True)
+
+    # Legacy flat store (if still present) is older than any generation
+    legacy = [n for n in os.listdir(persist_dir) if n != GENERATIONS_DIR and not n.startswith(CURRENT_FILE)]
+    if legacy:
+        retired.append(persist_dir)
+
+    removed = []
+    for path in retired[max(keep, 0):]:
+        if os.path.abspath(path) in in_use:
+            continue
+        if path == persist_dir:
+            _remove_legacy(persist_dir)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
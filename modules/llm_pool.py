@@ -0,0 +1,84 @@
+# modules/llm_pool.py
+# Process-wide registry of chat model clients.
+# - one ChatOpenAI per (model, temperature), built on first use and reused
+# - every client shares one sync and one async httpx pool with keep-alive, so
+#   requests reuse open connections instead of paying TCP/TLS setup each time
+# Async calls should run on long-lived event loops (the service loop, the
+# orchestrator loop): pooled async connections belong to the loop that opened them.
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from modules.config import (
+    LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE,
+    LLM_POOL_KEEPALIVE_EXPIRY,
+)
+
+_lock = threading.Lock()
+_models: Dict[Tuple, ChatOpenAI] = {}
+_http: Optional[httpx.Client] = None
+_http_async: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """The shared keep-alive (sync, async) httpx clients behind every pooled model."""
+    global _http, _http_async
+    with _lock:
+        if _http is None:
+            _http = openai.DefaultHttpxClient(limits=_limits())
+            _http_async = openai.DefaultAsyncHttpxClient(limits=_limits())
+        return _http, _http_async
+
+
+def get_chat_model(model_name: str, temperature: float = 0.0, **kwargs) -> ChatOpenAI:
+    """
+    Shared ChatOpenAI for (`model_name`, `temperature`, extra `kwargs`).
+    Instances are safe to share: LangChain chat models hold no per-call state.
+    """
+    key = (model_name, float(temperature), tuple(sorted(kwargs.items())))
+    model = _models.get(key)
+    if model is not None:
+        return model
+    sync_client, async_client = http_clients()
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = ChatOpenAI(
+                model_name=model_name,
+                temperature=temperature,
+                http_client=sync_client,
+                http_async_client=async_client,
+                **kwargs,
+            )
+            _models[key] = model
+        return model
+
+
+def pool_stats() -> dict:
+    with _lock:
+        return {"models": len(_models), "keys": [f"{m}@{t}" for m, t, _ in _models]}
+
+
+def close_pool():
+    """Drop every pooled model and close the shared connections (tests, shutdown)."""
+    global _http, _http_async
+    with _lock:
+        _models.clear()
+        http = _http
+        _http = _http_async = None
+    # Async connections belong to their event loops and are released with them
+    if http is not None:
+        http.close()
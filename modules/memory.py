@@ -1,24 +1,251 @@
-from langchain.memory import ConversationBufferMemory
-# If LangChain breaks this in future, change to langchain_core.memory
-from langchain_openai import ChatOpenAI
+# modules/memory.py
+# Bounded conversation memory: the most recent messages are kept verbatim within a
+# token budget (tiktoken); older ones are folded into a running summary, a few
+# turns at a time, so neither memory nor history prompts grow with the session.
+# The model call for that runs in a worker thread after the answer (never on the
+# question's critical path); until it returns, the evicted lines stay in the summary
+# as plain text.
+# The same object backs the prompt history and the UI's history view.
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from modules.config import (
+    OPENAI_MODEL_SUMMARY,
+    TEMP_SUMMARY,
+    MEMORY_TOKEN_BUDGET,
+    MEMORY_SUMMARY_TOKENS,
+    MEMORY_MAX_MESSAGES,
+)
+from modules.tokens import count_tokens, truncate_tokens
+
+log = logging.getLogger(__name__)
+
+# After an eviction the verbatim part is brought down to this share of its budget,
+# so the summary is updated every few turns rather than on every message.
+LOW_WATER = 0.75
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _fold_executor() -> ThreadPoolExecutor:
+    # Shared by all sessions; created on the first fold
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-fold")
+        return _executor
+
+SUMMARY_PROMPT = """
+Progressively summarize the conversation, adding onto the previous summary.
+Keep facts the user stated, questions asked and answers given. Stay under {max_tokens} tokens.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:
+"""
+
+
+class Message:
+    """One chat message; the token count is computed once, on insert."""
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: int):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def as_line(self) -> str:
+        return f"{'User' if self.role == 'user' else 'AI'}: {self.content}"
+
 
 class ChatMemory:
     """
-    Wrapper around LangChain's ConversationBufferMemory.
-    Stores chat history for conversation context.
+    Recent messages verbatim + a running summary of everything older.
+    - `token_budget` covers summary and verbatim messages together
+    - at most `max_messages` messages are kept verbatim
+    - evicted messages (whole turns) are merged into the summary with one LLM call,
+      started by `add_ai_message` in the background; until it returns (or if it
+      fails) the summary keeps the most recent text that fits
     """
 
-    def __init__(self):
-        self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    memory_key = "chat_history"
+
+    def __init__(
+        self,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+        max_messages: int = MEMORY_MAX_MESSAGES,
+        model_name: str | None = None,
+        llm=None,
+    ):
+        self.token_budget = token_budget
+        self.summary_tokens = min(summary_tokens, token_budget // 2)
+        self.max_messages = max(2, max_messages)
+        self.model_name = model_name or OPENAI_MODEL_SUMMARY
+        self._llm = llm
+        self._messages: Deque[Message] = deque()
+        self._tokens = 0  # tokens of the verbatim messages
+        self.summary = ""
+        self._summary_size = 0
+        # Model summary so far + evicted messages it does not cover yet
+        self._base = ""
+        self._unfolded: List[Message] = []
+        self._pending: Optional[Future] = None
+        self._epoch = 0  # bumped by clear(); a fold of an older epoch is dropped
+        self._lock = threading.RLock()
+
+    # ── Writing ──
 
     def add_user_message(self, message: str):
-        self.memory.chat_memory.add_user_message(message)
+        self._append("user", message)
 
     def add_ai_message(self, message: str):
-        self.memory.chat_memory.add_ai_message(message)
+        self._append("assistant", message)
+        # The answer is out: a good time to fold evicted turns into the summary
+        self._start_fold()
+
+    def _append(self, role: str, content: str):
+        content = content if isinstance(content, str) else str(content)
+        msg = Message(role, content, count_tokens(content, self.model_name))
+        with self._lock:
+            self._messages.append(msg)
+            self._tokens += msg.tokens
+            if self._over(self.token_budget - self._summary_size, self.max_messages):
+                self._compact()
+
+    def _over(self, tokens: int, messages: int) -> bool:
+        # The newest message always stays verbatim
+        return len(self._messages) > 1 and (self._tokens > tokens or len(self._messages) > messages)
+
+    def _compact(self):
+        allowance = self.token_budget - self.summary_tokens
+        target_tokens = int(allowance * LOW_WATER)
+        target_messages = int(self.max_messages * LOW_WATER)
+        evicted: List[Message] = []
+        while self._over(target_tokens, target_messages):
+            evicted.append(self._pop())
+        # Do not split a turn: an answer leaves together with its question
+        while len(self._messages) > 1 and self._messages[0].role != "user":
+            evicted.append(self._pop())
+        if evicted:
+            self._unfolded.extend(evicted)
+            self._set_summary(self._plain_summary())
+
+    def _pop(self) -> Message:
+        msg = self._messages.popleft()
+        self._tokens -= msg.tokens
+        return msg
+
+    # ── Running summary ──
+
+    def _get_llm(self):
+        if self._llm is None:
+            from modules.llm_pool import get_chat_model
+
+            self._llm = get_chat_model(self.model_name, TEMP_SUMMARY)
+        return self._llm
+
+    def _plain_summary(self, base: Optional[str] = None, evicted: Optional[List[Message]] = None) -> str:
+        # Fallback text: the model summary followed by the lines it does not cover yet
+        lines = "\n".join(m.as_line() for m in (self._unfolded if evicted is None else evicted))
+        return f"{self._base if base is None else base}\n{lines}".strip()
+
+    def _set_summary(self, text: str):
+        self.summary = truncate_tokens(text, self.summary_tokens, self.model_name, keep_end=True)
+        self._summary_size = count_tokens(self.summary, self.model_name)
+
+    def _start_fold(self):
+        with self._lock:
+            if not self._unfolded or self._pending is not None:
+                return
+            batch, base, epoch = list(self._unfolded), self._base, self._epoch
+            self._pending = _fold_executor().submit(self._fold, base, batch, epoch)
+
+    def _fold(self, base: str, batch: List[Message], epoch: int):
+        """Merge `batch` into the running summary (only the new lines are sent)."""
+        summary = None
+        try:
+            prompt = SUMMARY_PROMPT.strip().format(
+                max_tokens=self.summary_tokens, summary=base or "(none)",
+                lines="\n".join(m.as_line() for m in batch),
+            )
+            output = self._get_llm().invoke(prompt)
+            summary = (getattr(output, "content", None) or "").strip() or None
+        except Exception as e:
+            log.warning(f"⚠️ Memory summary not updated by the model ({e}); keeping the latest text.")
+        with self._lock:
+            if epoch != self._epoch:
+                return  # cleared meanwhile
+            self._pending = None
+            self._base = truncate_tokens(
+                summary or self._plain_summary(base, batch), self.summary_tokens, self.model_name, keep_end=True
+            )
+            # Turns evicted while the model was working stay as plain text until the next fold
+            del self._unfolded[:len(batch)]
+            self._set_summary(self._plain_summary())
+
+    def flush(self, timeout: Optional[float] = None):
+        """Fold every evicted turn into the model summary and wait for it (tests, shutdown)."""
+        while True:
+            pending = self._pending
+            if pending is None:
+                self._start_fold()
+                pending = self._pending
+                if pending is None:
+                    return
+            pending.result(timeout)
+
+    # ── Reading ──
+
+    def history(self) -> List[Dict[str, str]]:
+        """Verbatim messages as {"role", "content"} dicts (oldest first), for display."""
+        return [m.as_dict() for m in self._messages]
+
+    def messages(self) -> List[BaseMessage]:
+        """Summary (as a system message) + verbatim messages, ready for a chat prompt."""
+        out: List[BaseMessage] = []
+        if self.summary:
+            out.append(SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}"))
+        for m in self._messages:
+            out.append(HumanMessage(content=m.content) if m.role == "user" else AIMessage(content=m.content))
+        return out
+
+    def load_memory_variables(self, inputs: Optional[dict] = None) -> Dict[str, List[BaseMessage]]:
+        # Same shape as LangChain's memory classes (memory_key → messages)
+        return {self.memory_key: self.messages()}
 
     def get_memory(self):
-        return self.memory
+        return self
+
+    def token_count(self) -> int:
+        """Tokens the history adds to a prompt (summary + verbatim messages)."""
+        return self._summary_size + self._tokens
+
+    def __len__(self) -> int:
+        return len(self._messages)
 
     def clear(self):
-        self.memory.chat_memory.messages = []
\ No newline at end of file
+        with self._lock:
+            self._messages.clear()
+            self._tokens = 0
+            self.summary = ""
+            self._summary_size = 0
+            self._base = ""
+            self._unfolded = []
+            self._pending = None
+            self._epoch += 1
@@ -0,0 +1,207 @@
+# modules/orchestrator.py
+# Confidence-aware RAG → GPT fallback.
+# Retrieval (embedding + search, no LLM) runs first; its best dense score decides:
+#   confident  (≥ SIMILARITY_THRESHOLD + SPECULATIVE_MARGIN) → RAG answer only
+#   borderline (sources, but a lower score)                  → RAG and fallback race
+#   miss       (no sources)                                  → fallback only
+# In a race the RAG answer still wins whenever it is a real answer (provenance
+# rules do not change); the fallback is cancelled as soon as RAG produces one, and
+# on a RAG miss its answer is already (nearly) done, so a miss costs about one LLM
+# latency instead of two.
+
+import asyncio
+import logging
+import threading
+from typing import Iterator, Optional
+
+from modules.config import (
+    SIMILARITY_THRESHOLD,
+    SPECULATIVE_ENABLED,
+    SPECULATIVE_MARGIN,
+)
+from modules.fallback import GPTFallback
+from modules.rag_qa import RAGQA, Retrieval
+from modules.tracing import span, annotate
+
+log = logging.getLogger(__name__)
+
+CONFIDENT, BORDERLINE, MISS, CACHED = "confident", "borderline", "miss", "cached"
+
+
+class Outcome:
+    """Final answer with its provenance: "RAG", "GPT" or "NONE" (no answer, fallback off)."""
+
+    __slots__ = ("answer", "sources", "provenance", "band")
+
+    def __init__(self, answer: str, sources: list, provenance: str, band: str):
+        self.answer = answer
+        self.sources = sources
+        self.provenance = provenance
+        self.band = band
+
+
+class StreamedOutcome:
+    """
+    Streaming answer. `provenance` and `sources` are settled right before the
+    first token is yielded (None until then), so a caller can label the answer
+    as it starts.
+    """
+
+    def __init__(self, band: str, tokens_factory):
+        self.band = band
+        self.provenance: Optional[str] = None
+        self.sources: list = []
+        self.tokens: Iterator[str] = tokens_factory(self)
+
+
+# One event loop thread runs the async races for synchronous callers (Streamlit)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="orchestrator-loop", daemon=True).start()
+        return _loop
+
+
+class AnswerOrchestrator:
+    """RAGQA + GPTFallback behind one call; see the module comment for the policy."""
+
+    def __init__(
+        self,
+        rag: RAGQA,
+        fallback: Optional[GPTFallback] = None,
+        speculative: bool = SPECULATIVE_ENABLED,
+        margin: float = SPECULATIVE_MARGIN,
+    ):
+        self.rag = rag
+        self._fallback = fallback
+        self.speculative = speculative
+        self.margin = margin
+
+    @property
+    def fallback(self) -> GPTFallback:
+        if self._fallback is None:
+            self._fallback = GPTFallback()
+        return self._fallback
+
+    def band(self, retrieval: Optional[Retrieval]) -> str:
+        if retrieval is None or (retrieval.cached is None and not retrieval.sources):
+            return MISS
+        if retrieval.cached is not None:
+            return CACHED
+        if retrieval.confidence is not None and retrieval.confidence >= SIMILARITY_THRESHOLD + self.margin:
+            return CONFIDENT
+        # Passed the gate by a hair, or only through BM25
+        return BORDERLINE if self.speculative else CONFIDENT
+
+    # ── Async ──
+
+    async def _aretrieve(self, question: str, max_tokens: Optional[int]) -> Optional[Retrieval]:
+        try:
+            return await self.rag.aretrieve(question, max_tokens)
+        except Exception as e:
+            log.warning(f"RAG retrieval failed: {e}")
+            return None
+
+    async def _arag(self, question: str, retrieval: Retrieval, max_tokens: Optional[int]) -> tuple[str, list]:
+        try:
+            return await self.rag.aanswer(question, retrieval, max_tokens)
+        except Exception as e:
+            log.warning(f"RAG answer failed: {e}")
+            return "", []
+
+    async def aanswer(self, question: str, max_tokens: Optional[int] = None, use_fallback: bool = True) -> Outcome:
+        with span("orchestrate", speculative=self.speculative):
+            retrieval = await self._aretrieve(question, max_tokens)
+            band = self.band(retrieval)
+            annotate(band=band, confidence=retrieval.confidence if retrieval else None)
+
+            if band == MISS:
+                if not use_fallback:
+                    return Outcome("", [], "NONE", band)
+                return Outcome(await self.fallback.aanswer(question, max_tokens), [], "GPT", band)
+
+            if band == BORDERLINE and use_fallback:
+                # Race: start the fallback now, keep it only if RAG comes back empty
+                spare = asyncio.ensure_future(self.fallback.aanswer(question, max_tokens))
+                try:
+                    answer, sources = await self._arag(question, retrieval, max_tokens)
+                except BaseException:
+                    spare.cancel()
+                    raise
+                if answer.strip() and sources:
+                    spare.cancel()
+                    annotate(winner="RAG")
+                    return Outcome(answer, sources, "RAG", band)
+                annotate(winner="GPT")
+                return Outcome(await spare, [], "GPT", band)
+
+            answer, sources = await self._arag(question, retrieval, max_tokens)
+            if answer.strip() and sources:
+                return Outcome(answer, sources, "RAG", band)
+            if not use_fallback:
+                return Outcome("", [], "NONE", band)
+            # Confident retrieval that still missed: sequential fallback
+            return Outcome(await self.fallback.aanswer(question, max_tokens), [], "GPT", band)
+
+    def answer(self, question: str, max_tokens: Optional[int] = None, use_fallback: bool = True) -> Outcome:
+        """Blocking `aanswer` (runs on the orchestrator's event loop thread)."""
+        future = asyncio.run_coroutine_threadsafe(
+            self.aanswer(question, max_tokens, use_fallback), _background_loop()
+        )
+        return future.result()
+
+    # ── Streaming (synchronous callers) ──
+
+    def stream(self, question: str, max_tokens: Optional[int] = None, use_fallback: bool = True) -> StreamedOutcome:
+        """
+        Retrieve now and return a StreamedOutcome whose tokens come from RAG, or from
+        the fallback on a miss. On borderline retrievals the fallback is requested in
+        the background while RAG streams, and cancelled once RAG yields a token.
+        """
+        with span("orchestrate.retrieve", speculative=self.speculative):
+            try:
+                retrieval = self.rag.retrieve(question, max_tokens)
+            except Exception as e:
+                log.warning(f"RAG retrieval failed: {e}")
+                retrieval = None
+            band = self.band(retrieval)
+            annotate(band=band, confidence=retrieval.confidence if retrieval else None)
+
+        spare = None
+        if band == BORDERLINE and use_fallback:
+            spare = asyncio.run_coroutine_threadsafe(
+                self.fallback.aanswer(question, max_tokens), _background_loop()
+            )
+
+        def tokens(out: StreamedOutcome) -> Iterator[str]:
+            try:
+                if band != MISS:
+                    rag_tokens = self.rag.stream_answer(question, retrieval, max_tokens)
+                    for token in rag_tokens:
+                        if out.provenance is None:
+                            out.provenance, out.sources = "RAG", retrieval.sources
+                            if spare is not None:
+                                spare.cancel()
+                        yield token
+                    if out.provenance is not None:
+                        return
+                if not use_fallback:
+                    out.provenance = "NONE"
+                    return
+                out.provenance, out.sources = "GPT", []
+                if spare is not None:
+                    # Requested while RAG was streaming: usually ready by now
+                    yield spare.result()
+                else:
+                    yield from self.fallback.stream(question, max_tokens)
+            finally:
+                if spare is not None and not spare.done():
+                    spare.cancel()
+
+        return StreamedOutcome(band, tokens)
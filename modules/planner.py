@@ -1,26 +1,384 @@
-from typing import List, Dict
-from langchain_openai import ChatOpenAI
+# modules/planner.py
+# Query planning:
+# - a compound question ("what's covered AND how do I return it") is split by the
+#   LLM into sub-queries with dependencies (a DAG); single questions skip that call
+# - sub-queries run through the orchestrator (RAG, fallback on a miss) as soon as
+#   their prerequisites are done, so independent parts share one retrieval round
+# - one synthesis call merges the partial answers
+# Plus an indexed task queue (status → deque, name → pending tasks) for multi-step workflows.
+
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
 from dotenv import load_dotenv
-load_dotenv
+
+from modules.config import (
+    OPENAI_MODEL_PLANNER,
+    TEMP_PLANNER,
+    PLANNER_ENABLED,
+    PLANNER_MAX_SUBQUERIES,
+    PLANNER_DEP_TOKENS,
+)
+from modules.llm_pool import get_chat_model
+from modules.orchestrator import AnswerOrchestrator, Outcome, StreamedOutcome, _background_loop
+from modules.tokens import length_instruction, truncate_tokens
+from modules.tracing import span, annotate, get_tracer
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+PENDING, COMPLETED = "pending", "completed"
+
+# Cheap gate before the decomposition call: several questions, or a conjunction
+# followed by another question word
+_COMPOUND = re.compile(
+    r"\?\s*\S|\b(and|also|as well as|plus|then)\b.+\b(how|what|when|where|why|which|who|can|do|does|is|are)\b",
+    re.IGNORECASE,
+)
+
+DECOMPOSE_PROMPT = """
+Split the user's question into the fewest self-contained sub-questions that can each
+be answered by searching a document collection.
+- If it asks one thing, return exactly one sub-question: the question itself.
+- Return at most {max_subqueries} sub-questions.
+- If a sub-question needs another one's answer, put that id in "depends_on" and write
+  {{id}} (e.g. {{q1}}) where the answer belongs.
+Reply with JSON only: {{"subqueries": [{{"id": "q1", "question": "...", "depends_on": []}}]}}
+
+Question: {question}
+"""
+
+SYNTHESIS_PROMPT = """
+Answer the user's question from the answers to its parts below. Keep the facts as
+given, do not add new ones, and say briefly if a part could not be answered. {length}
+
+Question: {question}
+
+{parts}
+
+Answer:
+"""
+
+
+class SubQuery:
+    """One node of a QueryPlan; `outcome` is filled in when it has been answered."""
+
+    __slots__ = ("id", "question", "depends_on", "outcome")
+
+    def __init__(self, id: str, question: str, depends_on: Optional[List[str]] = None):
+        self.id = id
+        self.question = question
+        self.depends_on = list(depends_on or [])
+        self.outcome: Optional[Outcome] = None
+
+
+class QueryPlan:
+    """Sub-queries of one question, in a dependency-respecting (topological) order."""
+
+    def __init__(self, question: str, nodes: List[SubQuery]):
+        self.question = question
+        self.nodes = _topological(nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def compound(self) -> bool:
+        return len(self.nodes) > 1
+
+    def steps(self) -> List[str]:
+        """Human-readable plan (shown in the UI)."""
+        if not self.compound:
+            return [f"Step 1: Answer '{self.question}' from the documents (GPT fallback on a miss)."]
+        steps = []
+        for i, node in enumerate(self.nodes, start=1):
+            after = f" (after {', '.join(node.depends_on)})" if node.depends_on else " (in parallel)"
+            steps.append(f"Step {i}: [{node.id}] {node.question}{after}")
+        steps.append(f"Step {len(self.nodes) + 1}: Combine the {len(self.nodes)} answers.")
+        return steps
+
+
+def _drop_dependencies(node: SubQuery, keep) -> None:
+    """Keep only the dependencies in `keep`; the dropped ones' {id} placeholders go too."""
+    dropped = [d for d in node.depends_on if d not in keep]
+    if not dropped:
+        return
+    node.depends_on = [d for d in node.depends_on if d in keep]
+    question = node.question
+    for dep in dropped:
+        question = question.replace(f"{{{dep}}}", "")
+    # Tidy what the placeholder leaves behind ("fee for ?" → "fee for?")
+    question = re.sub(r"\s+([?.,;:!])", r"\1", re.sub(r"\s{2,}", " ", question)).strip()
+    node.question = question or node.question
+
+
+def _topological(nodes: List[SubQuery]) -> List[SubQuery]:
+    """
+    Order `nodes` so prerequisites come first. Unknown dependencies are dropped,
+    and a cycle is broken by running one of its nodes without its prerequisites.
+    """
+    by_id = {node.id: node for node in nodes}
+    for node in nodes:
+        # A placeholder in the question is a dependency even if the model did not list it
+        for ref in re.findall(r"\{([^{}\s]+)\}", node.question):
+            if ref not in node.depends_on:
+                node.depends_on.append(ref)
+        _drop_dependencies(node, {d for d in by_id if d != node.id})
+
+    ordered, placed = [], set()
+    remaining = list(nodes)
+    while remaining:
+        ready = [n for n in remaining if all(d in placed for d in n.depends_on)]
+        if not ready:
+            node = remaining[0]
+            log.warning(f"⚠️ Cyclic sub-query dependencies; running {node.id} without {node.depends_on}")
+            _drop_dependencies(node, placed)
+            continue
+        for node in ready:
+            ordered.append(node)
+            placed.add(node.id)
+        remaining = [n for n in remaining if n.id not in placed]
+    return ordered
+
+
+def _parse_plan(question: str, text: str, max_subqueries: int) -> QueryPlan:
+    """QueryPlan from the model's JSON reply; the question itself if the reply is unusable."""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    try:
+        items = json.loads(match.group(0))["subqueries"] if match else []
+    except (ValueError, KeyError, TypeError):
+        items = []
+    if not isinstance(items, list):
+        items = []
+
+    nodes, seen = [], set()
+    for i, item in enumerate(items[:max_subqueries]):
+        if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+            continue
+        node_id = str(item.get("id") or f"q{i + 1}")
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        deps = item.get("depends_on") or []
+        nodes.append(SubQuery(node_id, str(item["question"]).strip(), [str(d) for d in deps] if isinstance(deps, list) else []))
+    return QueryPlan(question, nodes or [SubQuery("q1", question)])
+
+
+def _dedupe_sources(outcomes: List[Outcome]) -> list:
+    sources, seen = [], set()
+    for outcome in outcomes:
+        for doc in outcome.sources:
+            md = getattr(doc, "metadata", None) or {}
+            key = (md.get("source"), md.get("page"), getattr(doc, "page_content", "")[:80])
+            if key not in seen:
+                seen.add(key)
+                sources.append(doc)
+    return sources
+
 
 class Planner:
     """
-    Simple Planner to manage multi-step workflows or tasks.
-    Designed for extensibility.
+    Plans and answers questions (see the module comment), and keeps a task queue
+    for multi-step workflows.
     """
 
-    def __init__(self):
-        self.task_queue: List[Dict] = []
-        self.completed_tasks: List[Dict] = []
+    def __init__(self, model_name: Optional[str] = None, enabled: bool = PLANNER_ENABLED,
+                 max_subqueries: int = PLANNER_MAX_SUBQUERIES):
+        self.model_name = model_name or OPENAI_MODEL_PLANNER
+        self.enabled = enabled
+        self.max_subqueries = max_subqueries
+        self._llm = None
+        # Task store: pending tasks by name (FIFO per name), and a deque per status
+        self._by_name: Dict[str, deque] = {}
+        self._by_status: Dict[str, deque] = {PENDING: deque(), COMPLETED: deque()}
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_chat_model(self.model_name, TEMP_PLANNER)
+        return self._llm
+
+    # ── Planning ──
+
+    def _single(self, question: str) -> QueryPlan:
+        return QueryPlan(question, [SubQuery("q1", question)])
+
+    def _decompose_prompt(self, question: str) -> str:
+        return DECOMPOSE_PROMPT.strip().format(max_subqueries=self.max_subqueries, question=question)
+
+    def plan(self, question: str) -> QueryPlan:
+        """Sub-query DAG for `question` (one LLM call, only for questions that look compound)."""
+        if not self.enabled or not _COMPOUND.search(question):
+            return self._single(question)
+        with span("plan.decompose", model=self.model_name):
+            try:
+                reply = self.llm.invoke(self._decompose_prompt(question))
+            except Exception as e:
+                annotate(error=str(e))
+                log.warning(f"Query decomposition failed: {e}")
+                return self._single(question)
+            plan = _parse_plan(question, getattr(reply, "content", ""), self.max_subqueries)
+            annotate(subqueries=len(plan))
+            return plan
+
+    async def aplan(self, question: str) -> QueryPlan:
+        if not self.enabled or not _COMPOUND.search(question):
+            return self._single(question)
+        with span("plan.decompose", model=self.model_name):
+            try:
+                reply = await self.llm.ainvoke(self._decompose_prompt(question))
+            except Exception as e:
+                annotate(error=str(e))
+                log.warning(f"Query decomposition failed: {e}")
+                return self._single(question)
+            plan = _parse_plan(question, getattr(reply, "content", ""), self.max_subqueries)
+            annotate(subqueries=len(plan))
+            return plan
+
+    # ── Execution ──
+
+    async def _arun_subqueries(self, plan: QueryPlan, orchestrator: AnswerOrchestrator,
+                               max_tokens: Optional[int], use_fallback: bool):
+        """Answer every node; each starts as soon as its prerequisites have answers."""
+        tasks: Dict[str, asyncio.Future] = {}
+
+        async def run(node: SubQuery):
+            if node.depends_on:
+                await asyncio.gather(*(tasks[d] for d in node.depends_on))
+            question = node.question
+            for dep in node.depends_on:
+                answer = tasks[dep].result().answer.strip() or "(unknown)"
+                question = question.replace(f"{{{dep}}}", truncate_tokens(answer, PLANNER_DEP_TOKENS, self.model_name))
+            with span("plan.subquery", id=node.id, depends_on=len(node.depends_on)):
+                node.outcome = await orchestrator.aanswer(question, max_tokens, use_fallback)
+                annotate(provenance=node.outcome.provenance)
+            return node.outcome
+
+        # Nodes are in topological order, so every prerequisite task exists first
+        for node in plan.nodes:
+            tasks[node.id] = asyncio.ensure_future(run(node))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+    def _synthesis(self, plan: QueryPlan, max_tokens: Optional[int]) -> tuple[Optional[str], str, list]:
+        """(synthesis prompt or None if nothing was answered, provenance, sources)."""
+        outcomes = [node.outcome for node in plan.nodes]
+        provenances = {o.provenance for o in outcomes}
+        if provenances <= {"NONE"}:
+            return None, "NONE", []
+        parts = "\n\n".join(
+            f"Part {i}: {node.question}\nAnswer: {node.outcome.answer.strip() or '(no answer found)'}"
+            for i, node in enumerate(plan.nodes, start=1)
+        )
+        prompt = SYNTHESIS_PROMPT.strip().format(
+            length=length_instruction(max_tokens), question=plan.question, parts=parts
+        )
+        provenance = "RAG" if "RAG" in provenances else "GPT"
+        return prompt, provenance, _dedupe_sources(outcomes)
+
+    async def aanswer(self, plan: QueryPlan, orchestrator: AnswerOrchestrator,
+                      max_tokens: Optional[int] = None, use_fallback: bool = True) -> Outcome:
+        """Answer a plan: single questions go straight to the orchestrator."""
+        if not plan.compound:
+            return await orchestrator.aanswer(plan.question, max_tokens, use_fallback)
+        with span("plan.execute", subqueries=len(plan)):
+            await self._arun_subqueries(plan, orchestrator, max_tokens, use_fallback)
+            prompt, provenance, sources = self._synthesis(plan, max_tokens)
+            if prompt is None:
+                return Outcome("", [], "NONE", "plan")
+            with span("plan.synthesize", model=self.model_name):
+                try:
+                    reply = await self.llm.ainvoke(prompt)
+                    answer = str(getattr(reply, "content", "") or "").strip()
+                except Exception as e:
+                    annotate(error=str(e))
+                    log.warning(f"Synthesis failed: {e}")
+                    # Still useful: the partial answers, one per part
+                    answer = "\n\n".join(n.outcome.answer.strip() for n in plan.nodes if n.outcome.answer.strip())
+            return Outcome(answer, sources, provenance, "plan")
+
+    def answer(self, plan: QueryPlan, orchestrator: AnswerOrchestrator,
+               max_tokens: Optional[int] = None, use_fallback: bool = True) -> Outcome:
+        """Blocking `aanswer` (runs on the orchestrator's event loop thread)."""
+        future = asyncio.run_coroutine_threadsafe(
+            self.aanswer(plan, orchestrator, max_tokens, use_fallback), _background_loop()
+        )
+        return future.result()
+
+    def stream(self, plan: QueryPlan, orchestrator: AnswerOrchestrator,
+               max_tokens: Optional[int] = None, use_fallback: bool = True) -> StreamedOutcome:
+        """
+        Streaming answer. Single questions stream straight from the orchestrator;
+        for compound ones the sub-queries are answered now (concurrently) and the
+        synthesis streams.
+        """
+        if not plan.compound:
+            return orchestrator.stream(plan.question, max_tokens, use_fallback)
+
+        with span("plan.execute", subqueries=len(plan)):
+            asyncio.run_coroutine_threadsafe(
+                self._arun_subqueries(plan, orchestrator, max_tokens, use_fallback), _background_loop()
+            ).result()
+        prompt, provenance, sources = self._synthesis(plan, max_tokens)
+
+        def tokens(out: StreamedOutcome) -> Iterator[str]:
+            if prompt is None:
+                out.provenance = "NONE"
+                return
+            # Recorded as `plan.synthesize` like `aanswer`; timed by hand because a
+            # span cannot stay open across the yields of a generator
+            started = time.perf_counter()
+            first_token_ms, error = None, None
+            try:
+                for chunk in self.llm.stream(prompt):
+                    content = getattr(chunk, "content", None)
+                    if isinstance(content, str) and content:
+                        if out.provenance is None:
+                            first_token_ms = round((time.perf_counter() - started) * 1000.0, 1)
+                            out.provenance, out.sources = provenance, sources
+                        yield content
+            except Exception as e:
+                error = str(e)
+                log.warning(f"Synthesis failed: {e}")
+                if out.provenance is None:
+                    out.provenance, out.sources = provenance, sources
+                yield "\n\n".join(n.outcome.answer.strip() for n in plan.nodes if n.outcome.answer.strip())
+            finally:
+                attrs = {"error": error} if error else {}
+                get_tracer().record(
+                    "plan.synthesize",
+                    (time.perf_counter() - started) * 1000.0,
+                    model=self.model_name,
+                    streamed=True,
+                    first_token_ms=first_token_ms,
+                    **attrs,
+                )
+
+        return StreamedOutcome("plan", tokens)
+
+    # ── Task queue ──
+
+    @property
+    def task_queue(self) -> List[Dict]:
+        return list(self._live(PENDING))
+
+    @property
+    def completed_tasks(self) -> List[Dict]:
+        return list(self._by_status[COMPLETED])
 
-    def plan (self, question: str):
-        # Dummy plan logic - you can improve it later
-        return [
-            f"Step 1: Understand the question '{question}'.",
-            "Step 2: Search relevant documents.",
-            "Step 3: Summarize findings.",
-            "Step 4: Provide final answer."
-        ]
+    def _live(self, status: str) -> Iterator[Dict]:
+        # Completed tasks are left in the pending deque and skipped (removed lazily)
+        return (t for t in self._by_status[status] if t["status"] == status)
 
     def add_task(self, task_name: str, params: Dict = None):
         """
@@ -28,43 +386,46 @@ class Planner:
         """
         if params is None:
             params = {}
-        task = {"name": task_name, "params": params, "status": "pending"}
-        self.task_queue.append(task)
+        task = {"name": task_name, "params": params, "status": PENDING}
+        self._by_status[PENDING].append(task)
+        self._by_name.setdefault(task_name, deque()).append(task)
 
     def get_next_task(self):
         """
         Retrieve the next pending task.
         """
-        for task in self.task_queue:
-            if task["status"] == "pending":
-                return task
-        return None
+        pending = self._by_status[PENDING]
+        while pending and pending[0]["status"] != PENDING:
+            pending.popleft()
+        return pending[0] if pending else None
 
     def mark_task_completed(self, task_name: str):
         """
-        Mark task as completed and move to completed list.
+        Mark the oldest pending task called `task_name` as completed.
         """
-        for task in self.task_queue:
-            if task["name"] == task_name and task["status"] == "pending":
-                task["status"] = "completed"
-                self.completed_tasks.append(task)
-                self.task_queue.remove(task)
-                return True
-        return False
+        tasks = self._by_name.get(task_name)
+        if not tasks:
+            return False
+        task = tasks.popleft()
+        if not tasks:
+            del self._by_name[task_name]
+        task["status"] = COMPLETED
+        self._by_status[COMPLETED].append(task)
+        return True
 
     def reset(self):
         """
         Reset planner state.
         """
-        self.task_queue.clear()
-        self.completed_tasks.clear()
+        self._by_name.clear()
+        for tasks in self._by_status.values():
+            tasks.clear()
 
     def get_status(self):
         """
         Get current planner status.
         """
         return {
-            "pending_tasks": [t for t in self.task_queue if t["status"] == "pending"],
+            "pending_tasks": self.task_queue,
             "completed_tasks": self.completed_tasks,
         }
-    
@@ -1,31 +1,78 @@
 # modules/rag_ingest.py
 
 import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import random
 import shutil
+import hashlib
 import logging
-from typing import List, Optional
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# Project root on sys.path so `python modules/rag_ingest.py` can import `modules.*`
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
 # LangChain loaders & vector store
 from langchain_community.document_loaders import (
-    PlaywrightURLLoader,
     WebBaseLoader,
     PyPDFLoader,
 )
+from langchain_community.document_loaders.url_playwright import UnstructuredHtmlEvaluator
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from modules.generation import (
+    bump_generation,
+    stage_generation,
+    publish_generation,
+    abandon_generation,
+    discard_generation,
+)
+from modules.store_registry import close_chroma, get_registry
+from modules.tokens import count_tokens
+from modules.tracing import span, annotate
+from modules.sparse_index import SparseIndex, SPARSE_INDEX_FILE
+from modules.compact_index import CompactIndex, COMPACT_DIR
+from modules.embeddings import get_embeddings, backend_id, read_embedding_info, write_embedding_info
 
 # Project config (single source of truth)
 try:
-    from modules.config import PERSIST_DIR
+    from modules.config import (
+        BASE_DIR, DOCS_DIR, URL_FILE, PERSIST_DIR, OPENAI_MODEL_EMBED, VECTOR_INDEX,
+        EMBED_BATCH_TOKENS, EMBED_BATCH_MAX_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+        INGEST_URL_CONCURRENCY, INGEST_PDF_WORKERS, INGEST_SOURCE_TIMEOUT, INGEST_QUEUE_SIZE,
+    )
 except Exception:
     # Fallback: vectorstore at project root if config import fails
-    PERSIST_DIR = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), "..", "vectorstore")
-    )
+    BASE_DIR = _ROOT
+    DOCS_DIR = os.path.join(_ROOT, "documents")
+    URL_FILE = os.path.join(DOCS_DIR, "urls.txt")
+    PERSIST_DIR = os.path.join(_ROOT, "vectorstore")
+    OPENAI_MODEL_EMBED = "text-embedding-ada-002"
+    VECTOR_INDEX = "chroma"
+    EMBED_BATCH_TOKENS, EMBED_BATCH_MAX_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES = 20000, 512, 4, 6
+    INGEST_URL_CONCURRENCY, INGEST_PDF_WORKERS, INGEST_SOURCE_TIMEOUT, INGEST_QUEUE_SIZE = 8, 4, 120.0, 4
+
+# Per-store record of source → content hash → chunk ids (drives incremental ingestion)
+MANIFEST_FILE = "ingest_manifest.json"
 
 # ─── Logging ───
 logging.basicConfig(level=logging.INFO, format="%(message)s")
@@ -53,57 +100,580 @@ def _load_pdfs(directory: str) -> List[str]:
     return pdfs
 
 
-def _ingest_url(url: str) -> List:
+USER_AGENT = os.getenv(
+    "USER_AGENT",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+REMOVE_SELECTORS = ["header", "footer", "nav"]
+
+# (source, content_hash, docs): docs is None when the source is unchanged and was not parsed
+LoadedSource = Tuple[str, str, Optional[List]]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Loader stage (URLs and PDFs concurrently)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class _Progress:
+    """Counts finished sources, logs `[done/total]` and forwards to an optional callback."""
+
+    def __init__(self, stage: str, total: int, callback: Optional[Callable[[Dict], None]] = None):
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self.callback = callback
+
+    def step(self, source: str, status: str, detail: str = ""):
+        self.done += 1
+        icon = {"loaded": "✔", "unchanged": "⏭ ", "failed": "❌"}.get(status, "•")
+        log.info(f"   [{self.done}/{self.total}] {icon} {source}{f' → {detail}' if detail else ''}")
+        if self.callback:
+            self.callback({
+                "stage": self.stage, "source": source, "status": status,
+                "done": self.done, "total": self.total,
+            })
+
+
+def _http_session(pool_size: int) -> requests.Session:
+    # One pooled keep-alive session shared by every URL fallback fetch
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+async def _open_browser():
+    """Launch one shared headless Chromium context, or return (None, None) if unavailable."""
+    try:
+        from playwright.async_api import async_playwright
+
+        pw = await async_playwright().start()
+        try:
+            browser = await pw.chromium.launch(headless=True)
+            return pw, await browser.new_context(user_agent=USER_AGENT)
+        except Exception:
+            await pw.stop()
+            raise
+    except Exception as e:
+        log.warning(f"   ⚠️ Playwright unavailable, using WebBaseLoader only: {e}")
+        return None, None
+
+
+async def _fetch_url(url: str, context, session: requests.Session, timeout: float) -> List:
+    """
+    Try Playwright first (DOM-aware, shared browser context), then fall back to
+    WebBaseLoader (requests + bs4) on the pooled session if Playwright isn't
+    available/blocked.
+    """
+    if context is not None:
+        page = await context.new_page()
+        try:
+            response = await page.goto(url, timeout=timeout * 1000)
+            # Same extraction PlaywrightURLLoader used, so content hashes stay stable
+            text = await UnstructuredHtmlEvaluator(REMOVE_SELECTORS).evaluate_async(
+                page, context.browser, response
+            )
+            if text:
+                return [Document(page_content=text, metadata={"source": url})]
+        except Exception as e:
+            log.warning(f"   ⚠️ Playwright failed for {url}: {e}")
+        finally:
+            await page.close()
+
+    loader = WebBaseLoader(url, session=session, requests_kwargs={"timeout": timeout})
+    docs = await asyncio.to_thread(loader.load)
+    if not docs:
+        log.warning(f"   ⚠️ No content parsed from {url} via WebBaseLoader")
+    return docs
+
+
+def _parse_pdf(path: str, source: str) -> List:
+    # Runs in a worker process: top-level so it pickles
+    docs = PyPDFLoader(path).load()
+    for doc in docs:
+        doc.metadata["source"] = source
+    return docs
+
+
+async def _load_sources_async(
+    urls: List[str],
+    pdfs: List[str],
+    is_current: Callable[[str, str], bool],
+    progress: _Progress,
+    timeout: float,
+    emit: Callable[[LoadedSource], None],
+):
     """
-    Try Playwright first (DOM-aware), then fallback to WebBaseLoader (requests + bs4)
-    if Playwright isn't available/blocked. Keeps logs clean across versions.
+    Load every source concurrently and hand each one to `emit` as soon as it is
+    ready. `emit` may block (bounded queue); a source holds its semaphore slot
+    until it has been handed over, so at most `concurrency` loaded sources wait.
     """
-    docs = []
-    # 1) Playwright attempt (no goto_options to keep compat across versions)
+
+    async def hand_over(item: LoadedSource):
+        await asyncio.to_thread(emit, item)
+
+    async def load_url(url: str, context, session, sem: asyncio.Semaphore):
+        async with sem:
+            try:
+                docs = await asyncio.wait_for(_fetch_url(url, context, session, timeout), timeout)
+            except Exception as e:
+                # Keep whatever we had for this URL; it is still listed
+                progress.step(url, "failed", f"{type(e).__name__}: {e}")
+                return
+            if not docs:
+                progress.step(url, "failed", "no content")
+                return
+            content_hash = _docs_hash(docs)
+            if is_current(url, content_hash):
+                progress.step(url, "unchanged")
+                await hand_over((url, content_hash, None))
+            else:
+                progress.step(url, "loaded", f"{len(docs)} doc(s)")
+                await hand_over((url, content_hash, docs))
+
+    async def load_pdf(path: str, pool: ProcessPoolExecutor, sem: asyncio.Semaphore):
+        source = _pdf_source_key(path)
+        loop = asyncio.get_running_loop()
+        async with sem:
+            try:
+                # File hash first, so unchanged files are never parsed
+                content_hash = await asyncio.to_thread(_file_hash, path)
+                if is_current(source, content_hash):
+                    progress.step(source, "unchanged")
+                    await hand_over((source, content_hash, None))
+                    return
+                docs = await asyncio.wait_for(loop.run_in_executor(pool, _parse_pdf, path, source), timeout)
+            except Exception as e:
+                progress.step(source, "failed", f"{type(e).__name__}: {e}")
+                return
+            progress.step(source, "loaded", f"{len(docs)} page(s)")
+            await hand_over((source, content_hash, docs))
+
+    session = _http_session(INGEST_URL_CONCURRENCY)
+    pw, context = await _open_browser() if urls else (None, None)
+    pdf_workers = max(1, min(INGEST_PDF_WORKERS, len(pdfs) or 1))
+    # spawn: forking a threaded process (e.g. Streamlit) can deadlock the children
+    pool = ProcessPoolExecutor(max_workers=pdf_workers, mp_context=multiprocessing.get_context("spawn"))
     try:
-        pw_loader = PlaywrightURLLoader(
-            urls=[url],
-            remove_selectors=["header", "footer", "nav"],
+        url_sem = asyncio.Semaphore(INGEST_URL_CONCURRENCY)
+        pdf_sem = asyncio.Semaphore(pdf_workers)
+        await asyncio.gather(
+            *(load_url(url, context, session, url_sem) for url in urls),
+            *(load_pdf(path, pool, pdf_sem) for path in pdfs),
         )
-        docs = pw_loader.load()
-        if docs:
-            log.info(f"   ✔ (Playwright) {url} → {len(docs)} doc(s)")
-            return docs
-    except Exception as e:
-        log.warning(f"   ⚠️ Playwright failed for {url}: {e}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+        if context is not None:
+            await context.browser.close()
+            await pw.stop()
+
+
+_DONE = object()
+
 
-    # 2) Fallback: WebBaseLoader with User-Agent
+class _LoaderFailed:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _iter_sources(
+    urls: List[str],
+    pdfs: List[str],
+    is_current: Callable[[str, str], bool],
+    progress: Optional[Callable[[Dict], None]] = None,
+    timeout: float = INGEST_SOURCE_TIMEOUT,
+    maxsize: int = INGEST_QUEUE_SIZE,
+) -> Iterator[LoadedSource]:
+    """
+    Load stage: fetch URLs (shared browser, pooled HTTP) and parse PDFs (process
+    pool) concurrently on a background thread, yielding sources as they finish
+    through a bounded queue.
+    """
+    log.info(f"🔗📄 Loading {len(urls)} URL(s) and {len(pdfs)} PDF(s)...")
+    tracker = _Progress("load", len(urls) + len(pdfs), progress)
+    out: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def emit(item):
+        # Blocks while the downstream stages are busy; gives up once the consumer is gone
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            asyncio.run(_load_sources_async(urls, pdfs, is_current, tracker, timeout, emit))
+        except BaseException as e:
+            emit(_LoaderFailed(e))
+        finally:
+            emit(_DONE)
+
+    threading.Thread(target=run, name="ingest-loader", daemon=True).start()
     try:
-        ua = os.getenv(
-            "USER_AGENT",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
-        )
-        wb_loader = WebBaseLoader(
-            url,
-            requests_kwargs={"headers": {"User-Agent": ua}},
+        while True:
+            item = out.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _LoaderFailed):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Embedding stage (token-budgeted batches, bounded concurrency, 429 backoff)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _is_rate_limited(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _AdaptiveBackoff:
+    """
+    Delay shared by all embedding workers: doubles on every 429 (or follows
+    Retry-After), halves on every success, so the whole pool slows down together
+    instead of each worker hammering the API independently.
+    """
+
+    def __init__(self, base: float = 1.0, ceiling: float = 60.0):
+        self.base = base
+        self.ceiling = ceiling
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.delay
+        if delay:
+            time.sleep(delay * (0.5 + random.random() / 2))  # jitter
+
+    def throttled(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self.delay = min(self.ceiling, max(self.base, retry_after or 0, self.delay * 2))
+
+    def succeeded(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base / 8 else 0.0
+
+
+def _token_batches(items: Iterator[Tuple], max_tokens: int, max_items: int) -> Iterator[List[Tuple]]:
+    """Group (..., chunk_id, chunk) items into batches under a token budget and item cap."""
+    batch, tokens = [], 0
+    for item in items:
+        n = count_tokens(item[-1].page_content, OPENAI_MODEL_EMBED)
+        if batch and (tokens + n > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += n
+    if batch:
+        yield batch
+
+
+class _EmbeddingStage:
+    """
+    Embeds chunks in token-budgeted batches with up to `concurrency` requests in
+    flight and writes every batch to Chroma as soon as it completes, so chunks
+    become searchable while the rest of the corpus is still being processed.
+    `client` is any LangChain `Embeddings` (OpenAI by default; set OPENAI_BASE_URL
+    to point it at a local fake server).
+    """
+
+    def __init__(
+        self,
+        vectordb,
+        client: Embeddings,
+        max_tokens: int = EMBED_BATCH_TOKENS,
+        max_items: int = EMBED_BATCH_MAX_ITEMS,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+    ):
+        self.vectordb = vectordb
+        self.client = client
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = _AdaptiveBackoff()
+
+    def _embed(self, batch: List[Tuple]) -> List[List[float]]:
+        texts = [item[-1].page_content for item in batch]
+        for attempt in range(self.max_retries + 1):
+            self.backoff.wait()
+            try:
+                vectors = self.client.embed_documents(texts)
+                self.backoff.succeeded()
+                return vectors
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                self.backoff.throttled(_retry_after(e))
+                log.warning(f"   ⏳ Rate limited; backing off {self.backoff.delay:.1f}s")
+
+    def _commit(self, batch: List[Tuple], vectors: List[List[float]]):
+        # Single writer (the consuming thread); Chroma writes are not shared across workers
+        self.vectordb._collection.upsert(
+            ids=[item[-2] for item in batch],
+            embeddings=vectors,
+            documents=[item[-1].page_content for item in batch],
+            metadatas=[item[-1].metadata or None for item in batch],
         )
-        docs = wb_loader.load()
-        if docs:
-            log.info(f"   ✔ (WebBaseLoader) {url} → {len(docs)} doc(s)")
-            return docs
-        else:
-            log.warning(f"   ⚠️ No content parsed from {url} via WebBaseLoader")
-    except Exception as e:
-        log.warning(f"   ❌ WebBaseLoader failed for {url}: {e}")
 
-    return []
+    def _drain(self, in_flight: Dict) -> Iterator[List[Tuple]]:
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            batch = in_flight.pop(fut)
+            self._commit(batch, fut.result())
+            yield batch
+
+    def stream(self, items: Iterator[Tuple]) -> Iterator[List[Tuple]]:
+        """
+        Pull (..., chunk_id, chunk) items lazily, embed + upsert them, and yield
+        each batch once it is committed. At most `concurrency` batches are held
+        in memory, so upstream stages are only drained as fast as we embed.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = {}
+            for batch in _token_batches(items, self.max_tokens, self.max_items):
+                in_flight[pool.submit(self._embed, batch)] = batch
+                while len(in_flight) >= self.concurrency:
+                    yield from self._drain(in_flight)
+            while in_flight:
+                yield from self._drain(in_flight)
+
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Public API
+# Manifest (incremental ingestion)
 # ──────────────────────────────────────────────────────────────────────────────
 
-def ingest_documents(force_reload: bool = True, output_dir: Optional[str] = None) -> bool:
+def _load_manifest(persist_dir: str) -> Dict:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("sources"), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": 1, "sources": {}}
+
+
+def _save_manifest(persist_dir: str, manifest: Dict):
+    # Write-then-rename so a crash never leaves a half-written manifest
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _docs_hash(docs: List) -> str:
+    h = hashlib.sha256()
+    for doc in docs:
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _chunk_ids(source: str, content_hash: str, count: int) -> List[str]:
+    # Deterministic ids: same source + same content → same ids
+    prefix = f"{_sha256(source.encode('utf-8'))[:12]}-{content_hash[:12]}"
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def _pdf_source_key(path: str) -> str:
+    # Project-relative path (e.g. "documents/x.pdf"), stable across checkouts; a
+    # DOCS_DIR outside the project keys by absolute path instead of "../../…"
+    path = os.path.abspath(path)
+    base = os.path.abspath(BASE_DIR)
+    if os.path.commonpath([path, base]) == base:
+        return os.path.relpath(path, base)
+    return path
+
+
+class _PendingSource:
+    """A changed source whose new chunks are still being embedded."""
+
+    __slots__ = ("source", "content_hash", "ids", "existed", "remaining")
+
+    def __init__(self, source: str, content_hash: str, ids: List[str], existed: bool, remaining: int):
+        self.source = source
+        self.content_hash = content_hash
+        self.ids = ids
+        self.existed = existed
+        self.remaining = remaining
+
+
+class _SourceSync:
     """
-    Build embeddings and a Chroma vectorstore at `output_dir` (or PERSIST_DIR).
-    Returns True on success (exceptions bubble up to caller).
+    Applies per-source changes to a Chroma store and keeps the manifest (and the
+    BM25 index) in step. A source is recorded in the manifest (and the manifest
+    saved) only once all of its chunks are committed, so an interrupted run
+    resumes cleanly.
     """
-    persist_dir = output_dir or PERSIST_DIR
 
+    def __init__(self, vectordb, persist_dir: str, manifest: Dict, splitter):
+        self.vectordb = vectordb
+        self.persist_dir = persist_dir
+        self.manifest = manifest
+        self.splitter = splitter
+        self.index = SparseIndex.load(persist_dir) or SparseIndex()
+        self.changed = False
+        self.stats = {"unchanged": 0, "updated": 0, "added": 0, "purged": 0, "queued": 0, "chunks": 0}
+
+    def is_current(self, source: str, content_hash: str) -> bool:
+        entry = self.manifest["sources"].get(source)
+        return bool(entry) and entry.get("hash") == content_hash
+
+    def skip(self, source: str):
+        self.stats["unchanged"] += 1
+
+    def _delete(self, source: str):
+        entry = self.manifest["sources"].get(source)
+        if entry and entry.get("ids"):
+            self.vectordb.delete(ids=entry["ids"])
+            self.index.remove(entry["ids"])
+            self.changed = True
+
+    def _existing_ids(self, ids: List[str]) -> set:
+        found = set()
+        for i in range(0, len(ids), 1000):
+            found.update(self.vectordb._collection.get(ids=ids[i:i + 1000], include=[])["ids"])
+        return found
+
+    def split(self, loaded: Iterator[LoadedSource]) -> Iterator[Tuple[_PendingSource, str, Document]]:
+        """
+        Split stage: turn each changed source into (pending, chunk_id, chunk) items.
+        Chunk ids are deterministic, so ids already in the store (from a crashed
+        run) are not embedded again.
+        """
+        for source, content_hash, docs in loaded:
+            if docs is None or self.is_current(source, content_hash):
+                self.skip(source)
+                continue
+            try:
+                existed = source in self.manifest["sources"]
+                # Delete first: if we crash before the manifest is saved, the old hash
+                # is still recorded and the next run redoes this source from scratch.
+                self._delete(source)
+
+                chunks = self.splitter.split_documents(docs)
+                ids = _chunk_ids(source, content_hash, len(chunks))
+                done = self._existing_ids(ids)
+            except Exception as e:
+                log.warning(f"   ❌ Error splitting {source}: {e}")
+                continue
+            del docs
+            if done:
+                log.info(f"   ↻ Resuming {source}: {len(done)} chunk(s) already stored")
+
+            pending = _PendingSource(source, content_hash, ids, existed, len(ids) - len(done))
+            if chunks:
+                self.changed = True
+            if pending.remaining == 0:
+                self._finish(pending)
+                continue
+            for chunk_id, chunk in zip(ids, chunks):
+                if chunk_id not in done:
+                    self.stats["queued"] += 1
+                    yield pending, chunk_id, chunk
+
+    def committed(self, batch: List[Tuple]):
+        """Called after each upserted batch; records sources whose chunks are all stored."""
+        self.stats["chunks"] += len(batch)
+        for _, chunk_id, chunk in batch:
+            self.index.add(chunk_id, chunk.page_content)
+        for pending, _, _ in batch:
+            pending.remaining -= 1
+            if pending.remaining == 0:
+                self._finish(pending)
+
+    def _finish(self, pending: _PendingSource):
+        self.manifest["sources"][pending.source] = {"hash": pending.content_hash, "ids": pending.ids}
+        _save_manifest(self.persist_dir, self.manifest)
+        self.stats["updated" if pending.existed else "added"] += 1
+        log.info(f"   ✔ {'Updated' if pending.existed else 'Added'}: {pending.source} → {len(pending.ids)} chunk(s)")
+
+    def purge_missing(self, listed: set):
+        for source in sorted(set(self.manifest["sources"]) - listed):
+            self._delete(source)
+            del self.manifest["sources"][source]
+            _save_manifest(self.persist_dir, self.manifest)
+            self.stats["purged"] += 1
+            log.info(f"   🗑  Purged: {source}")
+
+    def save_index(self):
+        """Bring the BM25 index in line with the manifest (chunks stored by an
+        interrupted run are read back from Chroma) and persist it."""
+        expected = [i for entry in self.manifest["sources"].values() for i in entry.get("ids", [])]
+
+        def fetch(ids: List[str]) -> Dict[str, str]:
+            got = self.vectordb._collection.get(ids=ids, include=["documents"])
+            return dict(zip(got["ids"], got["documents"]))
+
+        if self.index.reconcile(expected, fetch) or not os.path.exists(
+            os.path.join(self.persist_dir, SPARSE_INDEX_FILE)
+        ):
+            self.changed = True
+        self.index.save(self.persist_dir)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────────────────────────────────────
+
+class IngestCancelled(Exception):
+    """Raised inside the pipeline when a caller sets the cancel event."""
+
+
+def _until_cancelled(items: Iterator, cancel: Optional[threading.Event]) -> Iterator:
+    # Checked between sources, so a cancel takes effect without waiting for the whole corpus
+    try:
+        for item in items:
+            if cancel is not None and cancel.is_set():
+                raise IngestCancelled("Ingestion cancelled")
+            yield item
+    finally:
+        items.close()
+
+
+def _ingest_into(
+    persist_dir: str,
+    force_reload: bool,
+    embeddings: Optional[Embeddings],
+    progress: Optional[Callable[[Dict], None]],
+    cancel: Optional[threading.Event] = None,
+) -> bool:
+    """Build or update the store at `persist_dir` in place; returns True if anything changed."""
     # Clean target if asked
     if force_reload and os.path.exists(persist_dir):
         shutil.rmtree(persist_dir)
@@ -115,60 +685,323 @@ def ingest_documents(force_reload: bool = True, output_dir: Optional[str] = None
     except Exception:
         pass
 
-    documents = []
-
     log.info("📦 Starting ingestion pipeline...")
 
-    # ── URLs (resilient path)
-    url_file = os.path.join("documents", "urls.txt")
-    urls = _load_urls(url_file)
-    if urls:
-        log.info("🔗 Loading web documents...")
-        total = 0
-        for url in urls:
+    # Chroma 0.4+ persists automatically when persist_directory is set
+    embeddings = embeddings or get_embeddings()
+    backend = backend_id(embeddings)
+    vectordb = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+    try:
+        info = read_embedding_info(persist_dir)
+        if info and info.get("backend") != backend and vectordb._collection.count() > 0:
+            # Vectors of another model/dimension cannot be mixed in: re-embed everything
+            log.info(f"🧹 Store was embedded with {info.get('backend')}; rebuilding it with {backend}.")
+            vectordb.delete_collection()
+            vectordb = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+            _save_manifest(persist_dir, {"version": 1, "sources": {}})
+
+        if not os.path.exists(os.path.join(persist_dir, MANIFEST_FILE)):
+            if vectordb._collection.count() > 0:
+                # Store built before manifests existed: chunk ids are unknown, start clean once
+                log.info("🧹 Existing store has no ingest manifest — rebuilding it from scratch.")
+                vectordb.delete_collection()
+                vectordb = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+            # From here on the store is manifest-managed, even if this run is interrupted
+            _save_manifest(persist_dir, _load_manifest(persist_dir))
+        manifest = _load_manifest(persist_dir)
+
+        # start_index lets the context packer merge neighbouring chunks of a page
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, add_start_index=True)
+        sync = _SourceSync(vectordb, persist_dir, manifest, splitter)
+        stage = _EmbeddingStage(vectordb, embeddings)
+
+        # Sources are listed once, here: a change made after this needs another run
+        if progress:
+            progress({"stage": "list"})
+        urls = _load_urls(URL_FILE)
+        pdfs = _load_pdfs(DOCS_DIR)
+        listed = set(urls) | {_pdf_source_key(pdf) for pdf in pdfs}
+
+        # ── Streaming pipeline: load → split → embed → upsert
+        # Each stage pulls lazily from the previous one (the loader runs ahead by at
+        # most INGEST_QUEUE_SIZE sources), so memory stays flat regardless of corpus size.
+        with span("ingest.pipeline", sources=len(listed)):
+            loaded = _until_cancelled(_iter_sources(urls, pdfs, sync.is_current, progress), cancel)
+            for batch in stage.stream(sync.split(loaded)):
+                if cancel is not None and cancel.is_set():
+                    raise IngestCancelled("Ingestion cancelled")
+                sync.committed(batch)
+                if progress:
+                    progress({"stage": "embed", "chunks": sync.stats["chunks"], "queued": sync.stats["queued"]})
+            annotate(**{k: sync.stats[k] for k in ("added", "updated", "unchanged", "chunks")})
+
+        # ── Sources no longer listed
+        sync.purge_missing(listed)
+
+        # ── BM25 index next to the vectors
+        with span("ingest.sparse_index"):
+            sync.save_index()
+
+        # ── Which backend (and dimension) the vectors came from
+        sample = vectordb._collection.get(limit=1, include=["embeddings"])["embeddings"]
+        dim = len(sample[0]) if sample is not None and len(sample) else None
+        if info != {"backend": backend, "dim": dim}:
+            write_embedding_info(persist_dir, backend, dim)
+            sync.changed = True
+
+        # ── Compact int8 index (VECTOR_INDEX=compact), rebuilt whenever vectors changed
+        if VECTOR_INDEX == "compact" and (sync.changed or not os.path.isdir(os.path.join(persist_dir, COMPACT_DIR))):
+            with span("ingest.compact"):
+                count = CompactIndex.build(persist_dir, vectordb._collection)
+                annotate(vectors=count)
+            log.info(f"🗜️  Compact index built: {count} vector(s)")
+            sync.changed = True
+    finally:
+        # Release the writer's files (readers open their own handle)
+        close_chroma(vectordb)
+
+    st = sync.stats
+    log.info(
+        f"   → {st['added']} added, {st['updated']} updated, {st['unchanged']} unchanged, "
+        f"{st['purged']} purged; {st['chunks']} chunk(s) embedded."
+    )
+    return sync.changed or force_reload
+
+
+def ingest_documents(
+    force_reload: bool = True,
+    output_dir: Optional[str] = None,
+    embeddings: Optional[Embeddings] = None,
+    progress: Optional[Callable[[Dict], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> bool:
+    """
+    Build or incrementally update the Chroma vectorstore.
+    - Without `output_dir`, a new generation is built under PERSIST_DIR (starting
+      from a copy of the live one) and published by an atomic pointer swap, so
+      queries keep running on the old generation until the new one is complete
+    - With `output_dir`, that directory is updated in place
+    - force_reload=True re-embeds every source from scratch
+    - force_reload=False only embeds new/changed sources (by content hash),
+      replaces the chunks of changed ones and purges sources no longer listed
+    - `embeddings` overrides the embedding client (defaults to EMBED_BACKEND);
+      a store embedded by another backend is rebuilt
+    - `progress` receives one event dict per loaded source and per embedded batch
+    - setting `cancel` stops the run between sources/batches (IngestCancelled);
+      a cancelled generation build is resumed by the next refresh
+    Returns True on success (exceptions bubble up to caller).
+    """
+    with span("ingest", force_reload=force_reload, in_place=bool(output_dir)):
+        if output_dir:
+            if _ingest_into(output_dir, force_reload, embeddings, progress, cancel):
+                # New generation id → cached answers built on the old store stop matching
+                bump_generation(output_dir)
+            log.info(f"💾 Vectorstore saved at: {output_dir}")
+            log.info("✅ Ingestion completed successfully.")
+            return True
+
+        os.makedirs(PERSIST_DIR, exist_ok=True)
+        staged, resumed = stage_generation(PERSIST_DIR, copy_current=not force_reload)
+        if resumed:
+            log.info(f"↩️  Resuming unfinished build: {staged}")
+        try:
+            changed = _ingest_into(staged, False, embeddings, progress, cancel)
+        except BaseException:
+            # Keep what was embedded; the next refresh picks this build up again
+            abandon_generation(staged)
+            raise
+
+        if changed or resumed or force_reload:
+            with span("ingest.publish"):
+                generation = publish_generation(PERSIST_DIR, staged)
+                log.info(f"💾 Vectorstore generation {generation} published at: {staged}")
+                get_registry(PERSIST_DIR).collect()
+        else:
+            discard_generation(staged)
+            log.info("💾 Vectorstore already up to date; live generation kept.")
+        log.info("✅ Ingestion completed successfully.")
+        return True
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Background jobs (UI / CLI submit a refresh and poll it instead of blocking)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class IngestJob:
+    """One queued/running refresh and its progress counters."""
+
+    def __init__(self, force_reload: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.force_reload = force_reload
+        self.status = "queued"  # queued → running → done | failed | cancelled
+        self.error: Optional[str] = None
+        self.cancel = threading.Event()
+        self.listed = False  # True once the run has read the source list
+        self.sources_done = 0
+        self.sources_total = 0
+        self.chunks_embedded = 0
+        self.chunks_queued = 0
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def on_progress(self, event: Dict):
+        if event.get("stage") == "list":
+            self.listed = True
+        elif event.get("stage") == "load":
+            self.sources_done = event["done"]
+            self.sources_total = event["total"]
+        elif event.get("stage") == "embed":
+            self.chunks_embedded = event["chunks"]
+            self.chunks_queued = event["queued"]
+
+    def eta(self) -> Optional[float]:
+        # Seconds left: extrapolated from loading while sources are still coming in,
+        # then from the embedding rate over the chunks already split
+        if self.status != "running" or not self.started_at:
+            return None
+        elapsed = time.time() - self.started_at
+        if self.sources_done and self.sources_done < self.sources_total:
+            return elapsed / self.sources_done * (self.sources_total - self.sources_done)
+        if self.chunks_embedded and self.sources_done == self.sources_total:
+            return elapsed / self.chunks_embedded * (self.chunks_queued - self.chunks_embedded)
+        return None
+
+    def snapshot(self) -> Dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "force_reload": self.force_reload,
+            "sources_done": self.sources_done,
+            "sources_total": self.sources_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_queued": self.chunks_queued,
+            "eta": self.eta(),
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestWorker:
+    """
+    Single background thread running queued ingestion jobs one at a time
+    (one writer per store). Refreshes are coalesced; `submit` returns:
+    - the queued job, if one is waiting (upgraded to a full rebuild if asked for)
+    - the running job, if it covers the request and has not listed its sources yet
+    - otherwise one new job; while a job runs, that is an incremental follow-up
+      (enough to pick up what changed after the running job listed its sources)
+      unless a full rebuild is asked for and the running job is incremental
+    """
+
+    def __init__(self, history: int = 20):
+        self.history = history
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue()
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, force_reload: bool = False) -> str:
+        with self._lock:
+            running = next((j for j in self._jobs.values() if j.status == "running" and not j.cancel.is_set()), None)
+            queued = next((j for j in self._jobs.values() if j.status == "queued"), None)
+            if running is not None and (running.force_reload or not force_reload):
+                if not running.listed:
+                    return running.id
+                force_reload = False  # the running job rebuilds; the follow-up only catches up
+            if queued is not None:
+                queued.force_reload = queued.force_reload or force_reload
+                return queued.id
+            job = IngestJob(force_reload)
+            self._jobs[job.id] = job
+            self._trim()
+            self._queue.put(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+                self._thread.start()
+            return job.id
+
+    def _trim(self):
+        # Forget the oldest finished jobs beyond `history`
+        finished = [j.id for j in self._jobs.values() if j.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished_at is not None:
+                return False
+            job.cancel.set()
+            if job.status == "queued":
+                job.status, job.finished_at = "cancelled", time.time()
+            return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != "queued":
+                    continue  # cancelled while waiting
+                job.status, job.started_at = "running", time.time()
+            log.info(f"🧵 Ingest job {job.id} started (force_reload={job.force_reload})")
             try:
-                docs = _ingest_url(url)
-                if docs:
-                    documents.extend(docs)
-                    total += len(docs)
+                ingest_documents(
+                    force_reload=job.force_reload, progress=job.on_progress, cancel=job.cancel
+                )
+                status, error = "done", None
+            except IngestCancelled:
+                status, error = "cancelled", None
             except Exception as e:
-                log.warning(f"   ❌ Error fetching or processing {url}: {e}")
-        log.info(f"   → URL ingestion complete. Loaded {total} document(s) total.")
+                log.exception(f"❌ Ingest job {job.id} failed")
+                status, error = "failed", f"{type(e).__name__}: {e}"
+            with self._lock:
+                job.status, job.error, job.finished_at = status, error, time.time()
+            log.info(f"🧵 Ingest job {job.id} {status}")
 
-    # ── PDFs
-    log.info("📄 Loading PDF documents...")
-    pdfs = _load_pdfs("documents")
-    for pdf in pdfs:
-        try:
-            log.info(f"   → Reading: {pdf}")
-            loader = PyPDFLoader(pdf)
-            docs = loader.load()
-            documents.extend(docs)
-            log.info(f"     ✔ Loaded {len(docs)} pages.")
-        except Exception as e:
-            log.warning(f"     ❌ Error loading PDF {pdf}: {e}")
 
-    # ── Chunk
-    log.info("✂️ Splitting documents into chunks...")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(documents)
-    log.info(f"   → Total chunks created: {len(chunks)}")
+_worker: Optional[IngestWorker] = None
+_worker_lock = threading.Lock()
 
-    # ── Vectorstore
-    log.info("🧠 Generating embeddings and building vectorstore...")
-    embeddings = OpenAIEmbeddings()
 
-    # Chroma 0.4+ persists automatically when persist_directory is set
-    Chroma.from_documents(
-        chunks,
-        embedding=embeddings,
-        persist_directory=persist_dir,
-    )
+def get_worker() -> IngestWorker:
+    """Process-wide ingestion worker."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = IngestWorker()
+        return _worker
+
+
+def submit_ingest(force_reload: bool = False) -> str:
+    """Queue a refresh of PERSIST_DIR in the background; returns the job id."""
+    return get_worker().submit(force_reload)
 
-    log.info(f"💾 Vectorstore saved at: {persist_dir}")
-    log.info("✅ Ingestion completed successfully.")
-    return True
+
+def job_status(job_id: str) -> Optional[Dict]:
+    """Snapshot of a job (status, sources_done/total, chunks_embedded/queued, eta, error) or None."""
+    return get_worker().status(job_id)
+
+
+def cancel_job(job_id: str) -> bool:
+    """Ask a queued or running job to stop; returns False if it already finished."""
+    return get_worker().cancel(job_id)
 
 
 if __name__ == "__main__":
-    ingest_documents(force_reload=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest documents into the vectorstore")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Wipe the store and re-embed everything instead of updating incrementally"
+    )
+    args = parser.parse_args()
+    ingest_documents(force_reload=args.full)
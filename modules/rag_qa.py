@@ -1,20 +1,41 @@
 import os
+import time
+import asyncio
+import logging
+from typing import Iterator
+
 from dotenv import load_dotenv
 
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.chains import RetrievalQA
+from langchain_core.prompts import ChatPromptTemplate
+from langchain.chains.combine_documents import create_stuff_documents_chain
 
 from modules.config import (
-    PERSIST_DIR,
     OPENAI_MODEL_CHAT,
     TEMP_CHAT,
     RETRIEVER_K,
     SIMILARITY_THRESHOLD,
+    HYBRID_ENABLED,
+    SPARSE_K,
+    BM25_MIN_SCORE,
+    RRF_K,
+    RERANK_ENABLED,
+    RERANK_CANDIDATES,
+    CONTEXT_TOKEN_BUDGET,
+    ANSWER_CACHE_ENABLED,
 )
+from modules.answer_cache import get_answer_cache
+from modules.llm_pool import get_chat_model
+from modules.store_registry import StoreRegistry, StoreHandle, get_registry
+from modules.sparse_index import reciprocal_rank_fusion
+from modules.reranker import get_reranker
+from modules.context_packer import pack_context
+from modules.tokens import count_tokens, length_instruction
+from modules.tracing import span, annotate, get_tracer
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 # Heuristics for detecting “polite non-answers”
 NON_ANSWER_PHRASES = (
     "does not include information",
@@ -29,6 +50,25 @@ NON_ANSWER_PHRASES = (
     "the given context does not",
 )
 
+# Same wording as the default "stuff" QA prompt RetrievalQA used for chat models
+# `{length_hint}` is empty unless the caller asks for a length-bounded answer
+QA_SYSTEM = (
+    "Use the following pieces of context to answer the user's question. \n"
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n"
+    "{length_hint}"
+    "----------------\n"
+    "{context}"
+)
+
+QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", QA_SYSTEM),
+    ("human", "{question}"),
+])
+
+# Streamed answers are held back until this many characters have arrived, so a
+# polite non-answer is caught before anything reaches the user
+NON_ANSWER_PREFIX_CHARS = 160
+
 def _looks_like_non_answer(text: str) -> bool:
     if not isinstance(text, str):
         return False
@@ -36,114 +76,335 @@ def _looks_like_non_answer(text: str) -> bool:
     return any(p in t for p in NON_ANSWER_PHRASES)
 
 
+class Retrieval:
+    """Outcome of `RAGQA.retrieve`: the packed sources (or a cached answer) and the best dense score."""
+
+    __slots__ = ("vector", "generation", "sources", "confidence", "cached")
+
+    def __init__(self, vector: list, generation: str, sources: list,
+                 confidence: float | None = None, cached: str | None = None):
+        self.vector = vector
+        self.generation = generation
+        self.sources = sources
+        self.confidence = confidence
+        self.cached = cached
+
+
 class RAGQA:
     """
     RAG pipeline wrapper.
-    - Loads persisted Chroma DB from PERSIST_DIR
-    - Uses a score-gated retriever to avoid weak matches blocking fallback
+    - Borrows the persisted Chroma DB under PERSIST_DIR from the process-wide
+      store registry (one shared index per store generation)
+    - Embeds the question once; fuses one dense search with a BM25 lookup
+    - Serves paraphrased repeats from the shared semantic answer cache
+    - Score-gates the hits to avoid weak matches blocking fallback
+    - Reranks a wide candidate set down to `retriever_k` chunks on the CPU
+    - Packs the chunks into a token budget and stuffs them into the answer chain
     - Returns (answer, sources) where answer is always a string
+    - Times every stage (embed, dense, sparse, rerank, pack, llm) as tracing spans
     """
 
-    def __init__(self, force_reload: bool = False, temperature: float | None = None, retriever_k: int | None = None):
+    def __init__(
+        self,
+        force_reload: bool = False,
+        temperature: float | None = None,
+        retriever_k: int | None = None,
+        registry: StoreRegistry | None = None,
+    ):
         self.temperature = TEMP_CHAT if temperature is None else temperature
         self.retriever_k = RETRIEVER_K if retriever_k is None else retriever_k
-        self.embeddings = OpenAIEmbeddings()
-        self.vectordb = None
-        self.retriever = None
+        self.registry = registry or get_registry()
+        self.embeddings = self.registry.embeddings
         self.qa = None
+        self.answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+        self.reranker = get_reranker() if RERANK_ENABLED else None
 
-        if not os.path.exists(PERSIST_DIR):
+        if not os.path.exists(self.registry.persist_dir):
             raise FileNotFoundError(
-                f"❌ Vector store not found at {PERSIST_DIR}. Please run ingestion first."
+                f"❌ Vector store not found at {self.registry.persist_dir}. Please run ingestion first."
             )
 
         self._load_vectorstore()
         self._build_chain()
 
     def _load_vectorstore(self):
-        self.vectordb = Chroma(
-            persist_directory=PERSIST_DIR,
-            embedding_function=self.embeddings,
-        )
-
-        # Score-gated retriever to reject weak/irrelevant matches
-        self.retriever = self.vectordb.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={
-                "k": self.retriever_k,
-                "score_threshold": SIMILARITY_THRESHOLD,  # e.g., 0.2–0.4
-            },
-        )
+        # Opens (or reuses) the shared handle for the current generation
+        self.registry.current()
 
     def _build_chain(self):
-        llm = ChatOpenAI(temperature=self.temperature, model_name=OPENAI_MODEL_CHAT)
-        self.qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=self.retriever,
-            return_source_documents=True,
-        )
+        llm = get_chat_model(OPENAI_MODEL_CHAT, self.temperature)
+        # "stuff" step only: retrieval happens once in `_retrieve`, not inside the chain
+        self.qa = create_stuff_documents_chain(llm, QA_PROMPT)
 
     def update_model_settings(self, temperature: float | None = None, retriever_k: int | None = None):
-        if temperature is not None:
-            self.temperature = temperature
         if retriever_k is not None:
             self.retriever_k = retriever_k
+        # k is read per query; only a new temperature needs a different model
+        if temperature is not None and temperature != self.temperature:
+            self.temperature = temperature
+            self._build_chain()
 
-        if self.vectordb:
-            self.retriever = self.vectordb.as_retriever(
-                search_type="similarity_score_threshold",
-                search_kwargs={
-                    "k": self.retriever_k,
-                    "score_threshold": SIMILARITY_THRESHOLD,
-                },
-            )
-        self._build_chain()
+    def _retrieve(self, store: StoreHandle, vector: list, question: str) -> tuple[list, float | None]:
+        """
+        Hybrid retrieval for an already-embedded question:
+        - dense hits at or above SIMILARITY_THRESHOLD
+        - BM25 hits covering at least BM25_MIN_SCORE of the query (exact codes,
+          clause ids, policy numbers that embed poorly)
+        Both lists are fused by reciprocal rank. With reranking on, up to
+        RERANK_CANDIDATES fused hits are reranked down to `retriever_k`, which
+        are then packed (neighbours merged, overlap dropped) into CONTEXT_TOKEN_BUDGET.
+        Returns (packed docs, best dense relevance score or None).
+        """
+        limit = RERANK_CANDIDATES if self.reranker is not None else self.retriever_k
+        limit = max(limit, self.retriever_k)
+
+        if HYBRID_ENABLED:
+            candidates = max(limit, SPARSE_K)
+            with span("rag.dense", k=candidates):
+                hits = store.search(vector, k=candidates)
+                dense = [doc for (doc, score) in hits if score >= SIMILARITY_THRESHOLD]
+                annotate(scores=[round(score, 4) for _, score in hits], kept=len(dense))
+            confidence = max((score for _, score in hits), default=None)
+            with span("rag.sparse", k=candidates):
+                hits = store.sparse_search(question, k=candidates)
+                sparse = [doc for (doc, cov) in hits if cov >= BM25_MIN_SCORE]
+                annotate(scores=[round(cov, 4) for _, cov in hits], kept=len(sparse))
+            docs = reciprocal_rank_fusion([dense, sparse], limit, k=RRF_K)
+        else:
+            with span("rag.dense", k=limit):
+                hits = store.search(vector, k=limit)
+                docs = [doc for (doc, score) in hits if score >= SIMILARITY_THRESHOLD]
+                annotate(scores=[round(score, 4) for _, score in hits], kept=len(docs))
+            confidence = max((score for _, score in hits), default=None)
+
+        if self.reranker is not None and len(docs) > self.retriever_k:
+            with span("rag.rerank", backend=type(self.reranker).__name__, candidates=len(docs)):
+                vectors = store.vectors([d.id for d in docs]) if self.reranker.uses_vectors else None
+                docs = self.reranker.rerank(question, vector, docs, self.retriever_k, vectors)
+        with span("rag.pack", budget=CONTEXT_TOKEN_BUDGET):
+            packed = pack_context(docs[:self.retriever_k], CONTEXT_TOKEN_BUDGET, OPENAI_MODEL_CHAT)
+            annotate(chunks=len(docs[:self.retriever_k]), packed=len(packed),
+                     context_tokens=sum(count_tokens(d.page_content, OPENAI_MODEL_CHAT) for d in packed))
+        return packed, confidence
+
+    def _cache_namespace(self, max_tokens: int | None = None) -> tuple:
+        # Cached answers are only valid for the settings that produced them
+        return (OPENAI_MODEL_CHAT, self.temperature, self.retriever_k, max_tokens)
+
+    @staticmethod
+    def _chain_input(question: str, sources: list, max_tokens: int | None) -> dict:
+        hint = length_instruction(max_tokens)
+        return {"context": sources, "question": question, "length_hint": f"{hint}\n" if hint else ""}
+
+    def _cached(self, question: str, vector: list, generation: str, max_tokens: int | None):
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.lookup(vector, generation, self._cache_namespace(max_tokens), question)
+        annotate(generation=generation, answer_cache_hit=cached is not None)
+        return cached
+
+    def _finish(
+        self, answer, question: str, sources: list, vector: list, generation: str, max_tokens: int | None
+    ) -> tuple[str, list]:
+        if callable(answer):
+            answer = "[Invalid result: received a function instead of string]"
+
+        answer = answer or ""
+        if _looks_like_non_answer(answer):
+            return "", []
+
+        answer = str(answer).strip()
+        if self.answer_cache is not None and answer:
+            self.answer_cache.store(vector, answer, sources, generation, self._cache_namespace(max_tokens), question)
+        return answer, sources
+
+    # ── Retrieval and answering as separate steps (used by the orchestrator) ──
+
+    def retrieve(self, question: str, max_tokens: int | None = None) -> "Retrieval":
+        """Embed, check the answer cache and retrieve; no LLM call."""
+        with span("rag.embed"):
+            vector = self.embeddings.embed_query(question)
 
-    def query(self, question: str) -> tuple[str, list]:
+        with self.registry.acquire() as store:
+            generation = store.generation
+            cached = self._cached(question, vector, generation, max_tokens)
+            if cached is not None:
+                return Retrieval(vector, generation, cached[1], cached=cached[0])
+            sources, confidence = self._retrieve(store, vector, question)
+        annotate(confidence=confidence)
+        return Retrieval(vector, generation, sources, confidence)
+
+    async def aretrieve(self, question: str, max_tokens: int | None = None) -> "Retrieval":
+        """Async `retrieve`; the Chroma search runs in a worker thread."""
+        with span("rag.embed"):
+            vector = await self.embeddings.aembed_query(question)
+
+        with self.registry.acquire() as store:
+            generation = store.generation
+            cached = self._cached(question, vector, generation, max_tokens)
+            if cached is not None:
+                return Retrieval(vector, generation, cached[1], cached=cached[0])
+            # to_thread copies the context, so the retrieval spans nest here
+            sources, confidence = await asyncio.to_thread(self._retrieve, store, vector, question)
+        annotate(confidence=confidence)
+        return Retrieval(vector, generation, sources, confidence)
+
+    def answer(self, question: str, retrieval: "Retrieval", max_tokens: int | None = None) -> tuple[str, list]:
+        """LLM answer over `retrieval` → (answer, sources); ('', []) for no context or a non-answer."""
+        if retrieval.cached is not None:
+            return retrieval.cached, retrieval.sources
+        if not retrieval.sources:
+            return "", []
+        with span("rag.llm", model=OPENAI_MODEL_CHAT):
+            answer = self.qa.invoke(self._chain_input(question, retrieval.sources, max_tokens))
+            annotate(answer_tokens=count_tokens(str(answer), OPENAI_MODEL_CHAT))
+        return self._finish(answer, question, retrieval.sources, retrieval.vector, retrieval.generation, max_tokens)
+
+    async def aanswer(self, question: str, retrieval: "Retrieval", max_tokens: int | None = None) -> tuple[str, list]:
+        """Async `answer` (cancellable: the LLM request is dropped with the task)."""
+        if retrieval.cached is not None:
+            return retrieval.cached, retrieval.sources
+        if not retrieval.sources:
+            return "", []
+        with span("rag.llm", model=OPENAI_MODEL_CHAT):
+            answer = await self.qa.ainvoke(self._chain_input(question, retrieval.sources, max_tokens))
+            annotate(answer_tokens=count_tokens(str(answer), OPENAI_MODEL_CHAT))
+        return self._finish(answer, question, retrieval.sources, retrieval.vector, retrieval.generation, max_tokens)
+
+    def stream_answer(self, question: str, retrieval: "Retrieval", max_tokens: int | None = None) -> Iterator[str]:
+        """Streamed `answer`; yields nothing for no context or a non-answer."""
+        if retrieval.cached is not None:
+            return iter([retrieval.cached])
+        if not retrieval.sources:
+            return iter(())
+        return self._stream_answer(question, retrieval.sources, retrieval.vector, retrieval.generation, max_tokens)
+
+    # ── One-call entry points ──
+
+    def query(self, question: str, max_tokens: int | None = None) -> tuple[str, list]:
         """
         Return (answer, sources). If no sufficiently relevant docs or the chain
         produces a "polite non-answer", return ('', []) so the UI can trigger fallback.
+        `max_tokens` asks the model for an answer of at most that length.
         """
         if not question:
             return "", []
 
+        with span("rag.query", question_tokens=count_tokens(question, OPENAI_MODEL_CHAT)):
+            try:
+                retrieval = self.retrieve(question, max_tokens)
+                if retrieval.cached is None and not retrieval.sources:
+                    annotate(outcome="no_context")
+                return self.answer(question, retrieval, max_tokens)
+            except Exception as e:
+                annotate(outcome="error", error=str(e))
+                return f"[RAG Query Error: {e}]", []
+
+    async def aquery(self, question: str, max_tokens: int | None = None) -> tuple[str, list]:
+        """Async `query`: same contract; the Chroma search runs in a worker thread."""
+        if not question:
+            return "", []
+
+        with span("rag.query", question_tokens=count_tokens(question, OPENAI_MODEL_CHAT)):
+            try:
+                retrieval = await self.aretrieve(question, max_tokens)
+                if retrieval.cached is None and not retrieval.sources:
+                    annotate(outcome="no_context")
+                return await self.aanswer(question, retrieval, max_tokens)
+            except Exception as e:
+                annotate(outcome="error", error=str(e))
+                return f"[RAG Query Error: {e}]", []
+
+    def stream(self, question: str, max_tokens: int | None = None) -> tuple[list, Iterator[str]]:
+        """
+        Streaming variant of `query`: return (sources, tokens) as soon as retrieval
+        is done, where `tokens` yields the answer incrementally. An empty `sources`
+        list or a `tokens` iterator that yields nothing means "no RAG answer" and
+        the caller should fall back, exactly like `query` returning ('', []).
+        """
+        if not question:
+            return [], iter(())
+
+        # The answer tokens are timed separately ("rag.llm"), as the caller pulls them
+        with span("rag.stream", question_tokens=count_tokens(question, OPENAI_MODEL_CHAT)):
+            try:
+                retrieval = self.retrieve(question, max_tokens)
+            except Exception as e:
+                annotate(outcome="error", error=str(e))
+                log.warning(f"RAG retrieval failed: {e}")
+                return [], iter(())
+
+        return retrieval.sources, self.stream_answer(question, retrieval, max_tokens)
+
+    def _stream_answer(
+        self, question: str, sources: list, vector: list, generation: str, max_tokens: int | None
+    ) -> Iterator[str]:
+        # Timed from the first pull to the last token; first_token_ms is what the user waits
+        started = time.perf_counter()
+        first_token_ms = None
+        shown: list[str] = []
         try:
-            # Pre-check with explicit scored similarity to guard further
-            scored = self.vectordb.similarity_search_with_relevance_scores(
-                question, k=self.retriever_k
+            for token in self._answer_tokens(question, sources, vector, generation, max_tokens):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000.0, 1)
+                shown.append(token)
+                yield token
+        finally:
+            get_tracer().record(
+                "rag.llm",
+                (time.perf_counter() - started) * 1000.0,
+                model=OPENAI_MODEL_CHAT,
+                streamed=True,
+                first_token_ms=first_token_ms,
+                answer_tokens=count_tokens("".join(shown), OPENAI_MODEL_CHAT),
             )
-            prelim_docs = [doc for (doc, score) in scored if (score or 0) >= SIMILARITY_THRESHOLD]
 
-            if not prelim_docs:
-                return "", []
-
-            result = self.qa.invoke({"query": question})
+    def _answer_tokens(
+        self, question: str, sources: list, vector: list, generation: str, max_tokens: int | None
+    ) -> Iterator[str]:
+        parts: list[str] = []
+        released = False
+        try:
+            for token in self.qa.stream(self._chain_input(question, sources, max_tokens)):
+                parts.append(token)
+                if released:
+                    yield token
+                    continue
+                head = "".join(parts)
+                if len(head) >= NON_ANSWER_PREFIX_CHARS:
+                    if _looks_like_non_answer(head):
+                        return
+                    released = True
+                    yield head
         except Exception as e:
-            return f"[RAG Query Error: {e}]", []
-
-        if isinstance(result, dict):
-            answer = result.get("result", "") or ""
-            sources = result.get("source_documents", []) or prelim_docs
-        else:
-            answer = result or ""
-            sources = prelim_docs
+            if not released:
+                # Nothing shown yet: behave like a miss so the caller can fall back
+                log.warning(f"RAG answer stream failed: {e}")
+                return
+            yield f"\n\n[RAG Query Error: {e}]"
+            return
 
+        answer = "".join(parts)
         if _looks_like_non_answer(answer):
-            return "", []
-
-        if callable(answer):
-            answer = "[Invalid result: received a function instead of string]"
+            return
+        if not released and answer.strip():
+            yield answer
 
-        return str(answer).strip(), sources
+        answer = answer.strip()
+        if self.answer_cache is not None and answer:
+            self.answer_cache.store(vector, answer, sources, generation, self._cache_namespace(max_tokens), question)
 
 
-def reload_vectorstore():
-    # Kept for compatibility; UI handles rebuild using rag_ingest
+def reload_vectorstore(force_reload: bool = False):
+    """
+    Rebuild the vectorstore as a new generation and publish it atomically.
+    Queries keep running on the current generation meanwhile; the old one is
+    removed once no reader holds it.
+    """
     try:
-        import shutil
-        if os.path.exists(PERSIST_DIR):
-            shutil.rmtree(PERSIST_DIR)
-        return True, "Vector store directory cleared. Re-ingest to rebuild."
+        from modules.rag_ingest import ingest_documents
+
+        ingest_documents(force_reload=force_reload)
+        return True, "Vector store rebuilt. New queries use the new generation."
     except Exception as e:
         return False, str(e)
@@ -0,0 +1,135 @@
+# modules/reranker.py
+# CPU-only reranking between retrieval and the LLM: many candidates in, a few out,
+# so the stuffed prompt stays small.
+
+import time
+import logging
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from modules.config import (
+    RERANK_BACKEND,
+    RERANK_MODEL,
+    RERANK_TIME_BUDGET_MS,
+    RERANK_BATCH,
+    RERANK_MMR_LAMBDA,
+)
+from modules.sparse_index import tokenize
+
+log = logging.getLogger(__name__)
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class MMRReranker:
+    """
+    Lexical overlap + maximal marginal relevance, all NumPy.
+    - relevance: mean of cosine(query, chunk) and the share of query terms the chunk contains
+    - selection: greedily picks the chunk with the best
+      λ·relevance − (1−λ)·max cosine to the chunks already picked,
+      so near-duplicate chunks do not crowd the prompt
+    """
+
+    uses_vectors = True
+
+    def __init__(self, mmr_lambda: float = RERANK_MMR_LAMBDA, time_budget_ms: float = RERANK_TIME_BUDGET_MS):
+        self.mmr_lambda = mmr_lambda
+        self.time_budget = time_budget_ms / 1000.0
+
+    @staticmethod
+    def _overlap(question: str, docs: List) -> np.ndarray:
+        terms = set(tokenize(question))
+        if not terms:
+            return np.zeros(len(docs), dtype=np.float32)
+        return np.array(
+            [len(terms.intersection(tokenize(d.page_content))) / len(terms) for d in docs],
+            dtype=np.float32,
+        )
+
+    def rerank(self, question: str, query_vector, docs: List, k: int, vectors: Optional[np.ndarray] = None) -> List:
+        if len(docs) <= k:
+            return docs
+        deadline = time.monotonic() + self.time_budget
+        lexical = self._overlap(question, docs)
+        if vectors is None or len(vectors) != len(docs):
+            order = np.argsort(-lexical, kind="stable")[:k]
+            return [docs[i] for i in order]
+
+        matrix = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        query = _unit_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        relevance = 0.5 * (matrix @ query) + 0.5 * lexical
+        similarity = matrix @ matrix.T
+
+        picked = [int(np.argmax(relevance))]
+        max_sim = similarity[picked[0]].copy()
+        while len(picked) < k:
+            if time.monotonic() > deadline:
+                # Out of budget: fill up in plain relevance order
+                rest = [i for i in np.argsort(-relevance, kind="stable") if i not in picked]
+                picked.extend(int(i) for i in rest[:k - len(picked)])
+                break
+            score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_sim
+            score[picked] = -np.inf
+            best = int(np.argmax(score))
+            picked.append(best)
+            np.maximum(max_sim, similarity[best], out=max_sim)
+        return [docs[i] for i in picked]
+
+
+class CrossEncoderReranker:
+    """
+    Small local cross-encoder (sentence-transformers, CPU) scoring (question, chunk)
+    pairs in batches. Candidates not scored within the time budget keep their
+    retrieval order behind the scored ones.
+    """
+
+    uses_vectors = False
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH,
+                 time_budget_ms: float = RERANK_TIME_BUDGET_MS):
+        from sentence_transformers import CrossEncoder  # optional dependency
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = max(1, batch_size)
+        self.time_budget = time_budget_ms / 1000.0
+
+    def rerank(self, question: str, query_vector, docs: List, k: int, vectors: Optional[np.ndarray] = None) -> List:
+        if len(docs) <= k:
+            return docs
+        deadline = time.monotonic() + self.time_budget
+        scores = np.full(len(docs), -np.inf, dtype=np.float32)
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            scores[start:start + len(batch)] = self.model.predict(
+                [(question, d.page_content) for d in batch], batch_size=self.batch_size
+            )
+            if time.monotonic() > deadline:
+                log.info(f"⏱️ Rerank budget hit after {start + len(batch)}/{len(docs)} candidate(s)")
+                break
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [docs[i] for i in order]
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Process-wide reranker for RERANK_BACKEND ("mmr" or "cross-encoder")."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            if RERANK_BACKEND == "cross-encoder":
+                try:
+                    _reranker = CrossEncoderReranker()
+                except Exception as e:
+                    log.warning(f"⚠️ Cross-encoder unavailable ({e}); using MMR reranking.")
+            if _reranker is None:
+                _reranker = MMRReranker()
+        return _reranker
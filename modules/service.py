@@ -0,0 +1,226 @@
+# modules/service.py
+# Asyncio service layer: one process, one loaded vectorstore, many concurrent users.
+#
+#   python -m modules.service --port 8000
+#   curl -s localhost:8000/query -d '{"question": "What is covered under Home+?"}'
+
+import json
+import asyncio
+import logging
+import argparse
+from typing import Optional
+
+from modules.config import (
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_LLM_CONCURRENCY,
+    SERVICE_MAX_PENDING,
+    SERVICE_FALLBACK,
+    OPENAI_MODEL_FALLBACK,
+)
+from modules.rag_qa import RAGQA
+from modules.fallback import GPTFallback
+from modules.orchestrator import AnswerOrchestrator
+from modules.summarizer import Summarizer
+from modules.tracing import PrometheusSink, get_tracer
+
+log = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ServiceBusy(Exception):
+    """Raised when more than `max_pending` requests are already queued."""
+
+
+class BadRequest(Exception):
+    """Raised for a request whose framing cannot be parsed (→ 400)."""
+
+
+class BodyTooLarge(Exception):
+    """Raised when Content-Length exceeds MAX_BODY_BYTES (→ 413)."""
+
+
+class RAGService:
+    """
+    Async facade over RAGQA → GPTFallback → Summarizer (the Streamlit flow).
+    - RAG and fallback go through AnswerOrchestrator (races them on borderline retrievals)
+    - One RAGQA (one Chroma handle / HNSW index) shared by every request
+    - At most `max_concurrency` requests talk to the LLM at the same time
+    - More than `max_pending` waiting requests are rejected (ServiceBusy)
+    """
+
+    def __init__(
+        self,
+        rag: Optional[RAGQA] = None,
+        max_concurrency: int = SERVICE_LLM_CONCURRENCY,
+        max_pending: int = SERVICE_MAX_PENDING,
+        use_fallback: bool = SERVICE_FALLBACK,
+    ):
+        self.rag = rag or RAGQA()
+        self.fallback = GPTFallback()
+        self.orchestrator = AnswerOrchestrator(self.rag, self.fallback)
+        self.summarizer = Summarizer()
+        self.use_fallback = use_fallback
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def aquery(self, question: str, max_tokens: Optional[int] = None, use_fallback: Optional[bool] = None) -> dict:
+        if self._pending >= self.max_pending:
+            raise ServiceBusy(f"{self._pending} requests pending")
+        self._pending += 1
+        try:
+            async with self._slots:
+                return await self._answer(question, max_tokens, self.use_fallback if use_fallback is None else use_fallback)
+        finally:
+            self._pending -= 1
+
+    async def _answer(self, question: str, max_tokens: Optional[int], use_fallback: bool) -> dict:
+        outcome = await self.orchestrator.aanswer(question, max_tokens=max_tokens, use_fallback=use_fallback)
+        answer, sources, provenance = outcome.answer, outcome.sources, outcome.provenance
+
+        if max_tokens and answer:
+            answer = await self.summarizer.asummarize(answer, max_tokens=max_tokens)
+
+        return {
+            "answer": answer,
+            "provenance": provenance,
+            "model": OPENAI_MODEL_FALLBACK if provenance == "GPT" else None,
+            "sources": [_source_info(doc) for doc in sources],
+        }
+
+
+def _source_info(doc) -> dict:
+    md = getattr(doc, "metadata", None) or {}
+    info = {"source": md.get("source", "unknown")}
+    if "page" in md:
+        info["page"] = md["page"]
+    return info
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Minimal HTTP/1.1 front end (stdlib only)
+#   POST /query   {"question": str, "max_tokens"?: int, "fallback"?: bool}
+#   GET  /healthz
+#   GET  /metrics  per-stage latency (Prometheus text format)
+# ──────────────────────────────────────────────────────────────────────────────
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload, headers: Optional[dict] = None):
+    # dict → JSON; str → plain text (metrics)
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    head = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    method, path, _ = (request_line.split(" ", 2) + ["", ""])[:3]
+    length = 0
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            try:
+                length = int(value.strip() or 0)
+            except ValueError:
+                raise BadRequest(f"invalid Content-Length: {value.strip()!r}")
+            if length < 0:
+                raise BadRequest(f"invalid Content-Length: {length}")
+    if length > MAX_BODY_BYTES:
+        raise BodyTooLarge(f"body too large ({length} > {MAX_BODY_BYTES} bytes)")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, body
+
+
+def make_handler(service: RAGService):
+    tracer = get_tracer()
+    metrics = tracer.sink(PrometheusSink) or tracer.add_sink(PrometheusSink(tracer, port=0))
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+            except BadRequest as e:
+                await _respond(writer, 400, {"error": str(e)})
+                return
+            except BodyTooLarge as e:
+                await _respond(writer, 413, {"error": str(e)})
+                return
+
+            if method == "GET" and path == "/healthz":
+                await _respond(writer, 200, {"status": "ok", "pending": service.pending})
+                return
+            if method == "GET" and path == "/metrics":
+                await _respond(writer, 200, metrics.render())
+                return
+            if method != "POST" or path != "/query":
+                await _respond(writer, 404, {"error": "not found"})
+                return
+
+            try:
+                payload = json.loads(body or b"{}")
+                question = payload["question"]
+                if not isinstance(question, str) or not question.strip():
+                    raise ValueError("'question' must be a non-empty string")
+                question = question.strip()
+                max_tokens = payload.get("max_tokens")
+                max_tokens = int(max_tokens) if max_tokens is not None else None
+            except (ValueError, KeyError, TypeError) as e:
+                await _respond(writer, 400, {"error": f"invalid request: {e}"})
+                return
+
+            try:
+                result = await service.aquery(question, max_tokens=max_tokens, use_fallback=payload.get("fallback"))
+            except ServiceBusy as e:
+                await _respond(writer, 503, {"error": f"busy: {e}"}, {"Retry-After": "1"})
+                return
+            await _respond(writer, 200, result)
+        except Exception as e:
+            log.exception("request failed")
+            try:
+                await _respond(writer, 500, {"error": str(e)})
+            except Exception:
+                pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, service: Optional[RAGService] = None):
+    service = service or RAGService()
+    server = await asyncio.start_server(make_handler(service), host, port)
+    log.info(f"🚀 RAG service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async RAG service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(serve(args.host, args.port))
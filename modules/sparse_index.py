@@ -0,0 +1,182 @@
+# modules/sparse_index.py
+# Local BM25 inverted index kept next to the Chroma store. Exact policy numbers,
+# clause ids and product codes are matched lexically (no embedding call).
+
+import os
+import re
+import gzip
+import json
+import math
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SPARSE_INDEX_FILE = "bm25_index.json.gz"
+
+# Codes such as "HOMP-1598900-24" or "4.2.1" stay one token (and are also split into parts)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART_RE = re.compile(r"[-_./]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its "
+    "me my of on or our so than that the their them then there these they this to was "
+    "we were what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/code tokens without stopwords; compound codes also yield their parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(p for p in _PART_RE.split(token) if p and p not in STOPWORDS)
+    return tokens
+
+
+class SparseIndex:
+    """
+    Inverted index with BM25 scoring over chunk ids.
+    - postings: term → {chunk_id: term frequency}
+    - lengths: chunk_id → token count
+    Only ids and counts are stored; chunk text stays in Chroma.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    # ── Updates (ingestion) ──
+
+    def add(self, chunk_id: str, text: str):
+        with self._lock:
+            if chunk_id in self.lengths:
+                self._remove(chunk_id)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            self.lengths[chunk_id] = len(tokens)
+            self._total_length += len(tokens)
+
+    def _remove(self, chunk_id: str):
+        # Caller holds self._lock. Full postings scan; only hit when a chunk id is re-added.
+        length = self.lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in [t for t, docs in self.postings.items() if chunk_id in docs]:
+            docs = self.postings[term]
+            del docs[chunk_id]
+            if not docs:
+                del self.postings[term]
+
+    def remove(self, chunk_ids: Iterable[str]):
+        ids = {i for i in chunk_ids if i in self.lengths}
+        if not ids:
+            return
+        with self._lock:
+            for chunk_id in ids:
+                self._total_length -= self.lengths.pop(chunk_id)
+            for term in list(self.postings):
+                docs = self.postings[term]
+                for chunk_id in ids.intersection(docs):
+                    del docs[chunk_id]
+                if not docs:
+                    del self.postings[term]
+
+    def reconcile(self, expected_ids: Iterable[str], fetch: Callable[[List[str]], Dict[str, str]]) -> int:
+        """
+        Make the index cover exactly `expected_ids`: drop stale ids and add missing
+        ones, reading their text through `fetch(ids) → {id: text}` (e.g. from Chroma).
+        Returns the number of ids added or removed.
+        """
+        expected = set(expected_ids)
+        stale = set(self.lengths) - expected
+        self.remove(stale)
+        missing = sorted(expected - set(self.lengths))
+        for i in range(0, len(missing), 1000):
+            for chunk_id, text in fetch(missing[i:i + 1000]).items():
+                self.add(chunk_id, text)
+        return len(stale) + len(missing)
+
+    # ── Scoring ──
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float, float]]:
+        """
+        BM25 top-k → [(chunk_id, score, coverage)]. `coverage` is the score relative
+        to a chunk of average length containing every query term once (capped at 1),
+        so it is comparable across queries.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.lengths)
+            if not n or not terms:
+                return []
+            avg_len = self._total_length / n or 1.0
+            scores: Dict[str, float] = {}
+            best = 0.0
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    # Unknown term still counts toward a perfect match
+                    best += math.log(1 + (n + 0.5) / 0.5)
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                best += idf
+                for chunk_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_len)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(chunk_id, score, min(1.0, score / best) if best else 0.0) for chunk_id, score in top]
+
+    # ── Persistence ──
+
+    def save(self, persist_dir: str):
+        path = os.path.join(persist_dir, SPARSE_INDEX_FILE)
+        tmp = path + ".tmp"
+        with self._lock:
+            data = {"version": 1, "k1": self.k1, "b": self.b,
+                    "lengths": self.lengths, "postings": self.postings}
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> Optional["SparseIndex"]:
+        """Load the index stored in `persist_dir` (None if there is none)."""
+        path = os.path.join(persist_dir, SPARSE_INDEX_FILE)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        index = cls(k1=data.get("k1", 1.2), b=data.get("b", 0.75))
+        index.lengths = data["lengths"]
+        index.postings = data["postings"]
+        index._total_length = sum(index.lengths.values())
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List], limit: int, k: int = 60) -> List:
+    """
+    Fuse ranked lists of LangChain Documents (identified by `doc.id`) by reciprocal
+    rank: score = Σ 1 / (k + rank). Returns the top `limit` documents.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, object] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    order = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [docs[key] for key in order]
@@ -0,0 +1,266 @@
+# modules/store_registry.py
+# Process-wide, reference-counted vectorstore handles shared by every RAGQA
+# (all Streamlit sessions, the async service, CLI).
+
+import os
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from modules.config import (
+    PERSIST_DIR,
+    GENERATIONS_KEEP,
+    VECTOR_INDEX,
+    COMPACT_RESCORE,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MEMORY_ITEMS,
+    EMBED_CACHE_MAX_ENTRIES,
+)
+from modules.embedding_cache import CachedEmbeddings
+from modules.embeddings import get_embeddings, backend_id, check_store
+from modules.sparse_index import SparseIndex
+from modules.compact_index import CompactIndex, CompactVectorStore
+from modules.generation import resolve_store, has_store, collect_generations
+
+log = logging.getLogger(__name__)
+
+
+def make_query_embeddings():
+    """Embedding function for queries (behind the on-disk cache when enabled)."""
+    embeddings = get_embeddings()
+    if not EMBED_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        model_name=backend_id(embeddings),
+        path=EMBED_CACHE_PATH,
+        memory_items=EMBED_CACHE_MEMORY_ITEMS,
+        max_entries=EMBED_CACHE_MAX_ENTRIES,
+    )
+
+
+def _open_chroma(persist_dir: str, embeddings) -> Chroma:
+    # Chroma caches one System per path. Drop any cached one first so this handle
+    # gets its own (a store swapped in place must not reuse the old open files).
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        SharedSystemClient._identifier_to_system.pop(persist_dir, None)
+    except Exception:
+        pass
+    return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+
+def close_chroma(vectordb):
+    # Stop this handle's System and drop it from Chroma's cache so the files are released
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        client = vectordb._client
+        cache = SharedSystemClient._identifier_to_system
+        if cache.get(client._identifier) is client._system:
+            cache.pop(client._identifier, None)
+        client._system.stop()
+    except Exception as e:
+        log.debug(f"Chroma close skipped: {e}")
+
+
+class StoreHandle:
+    """
+    One opened, read-only store generation (`path` is its directory), with its
+    BM25 index if ingestion wrote one. With VECTOR_INDEX=compact, dense search
+    runs on the memory-mapped int8 index instead of Chroma's HNSW.
+    `refs` counts in-flight users; a retired handle is closed once the last of
+    them releases it.
+    """
+
+    def __init__(self, path: str, generation: str, embeddings):
+        self.path = path
+        self.generation = generation
+        check_store(path, embeddings)
+        self.chroma = _open_chroma(path, embeddings)
+        self.vectordb = self.chroma
+        self.compact = None
+        if VECTOR_INDEX == "compact":
+            self.compact = CompactIndex.load(path)
+            if self.compact is None:
+                log.warning(f"⚠️ No compact index in {path}; searching Chroma. Re-ingest to build it.")
+            else:
+                self.vectordb = CompactVectorStore(self.compact, self.chroma, embeddings, COMPACT_RESCORE)
+        self.sparse = SparseIndex.load(path)
+        # Chroma reports raw distances; this maps them to the [0, 1] relevance scale
+        self._relevance = self.chroma._select_relevance_score_fn()
+        self.refs = 0
+        self.retired = False
+
+    def search(self, vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Dense search by vector → [(doc, relevance)] (no embedding call); docs carry their chunk id."""
+        if self.compact is not None:
+            return [(doc, score or 0.0) for doc, score in
+                    self.vectordb.similarity_search_by_vector_with_relevance_scores(vector, k)]
+        res = self.chroma._collection.query(
+            query_embeddings=[vector], n_results=k, include=["documents", "metadatas", "distances"]
+        )
+        return [
+            (Document(id=i, page_content=text or "", metadata=meta or {}), self._relevance(dist) or 0.0)
+            for i, text, meta, dist in zip(
+                res["ids"][0], res["documents"][0], res["metadatas"][0], res["distances"][0]
+            )
+        ]
+
+    def vectors(self, ids: List[str]) -> np.ndarray:
+        """Stored embeddings for `ids`, in that order (local read, no embedding call)."""
+        if self.compact is not None:
+            return self.compact.vectors_for(ids)
+        got = self.chroma._collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(got["ids"], got["embeddings"]))
+        return np.asarray([by_id[i] for i in ids], dtype=np.float32)
+
+    def sparse_search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """BM25 search → [(doc, coverage)] where coverage is the 0..1 share of a perfect match."""
+        if self.sparse is None:
+            return []
+        hits = self.sparse.search(query, k)
+        if not hits:
+            return []
+        got = self.chroma._collection.get(ids=[h[0] for h in hits], include=["documents", "metadatas"])
+        docs = {
+            i: Document(id=i, page_content=text or "", metadata=meta or {})
+            for i, text, meta in zip(got["ids"], got["documents"], got["metadatas"])
+        }
+        return [(docs[chunk_id], coverage) for chunk_id, _, coverage in hits if chunk_id in docs]
+
+    def close(self):
+        close_chroma(self.chroma)
+
+
+class StoreRegistry:
+    """
+    Hands out the current store generation to readers.
+    - All sessions share one handle (one Chroma client / HNSW index) per generation
+    - When a refresh publishes a new generation, new `acquire()` calls get a fresh
+      handle while in-flight readers finish on the old one, which is then closed
+    - Generation directories nobody reads any more are garbage-collected
+    - One query-embedding client is shared as well
+    """
+
+    def __init__(self, persist_dir: str = PERSIST_DIR):
+        self.persist_dir = persist_dir
+        self._lock = threading.Lock()
+        self._current: Optional[StoreHandle] = None
+        self._draining: List[StoreHandle] = []  # retired, still referenced
+        self._embeddings = None
+
+    @property
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = make_query_embeddings()
+            return self._embeddings
+
+    def _retire(self, handle: StoreHandle) -> bool:
+        # Caller holds self._lock; True when the handle was closed right away
+        handle.retired = True
+        if handle.refs == 0:
+            handle.close()
+            return True
+        self._draining.append(handle)
+        return False
+
+    def _release(self, handle: StoreHandle) -> bool:
+        # Caller holds self._lock; True when this was the last reader of a retired handle
+        handle.refs -= 1
+        if handle.retired and handle.refs == 0:
+            self._draining.remove(handle)
+            handle.close()
+            return True
+        return False
+
+    def _current_handle(self) -> Tuple[StoreHandle, bool]:
+        # Caller holds self._lock; also reports whether an old handle was closed
+        generation, path = resolve_store(self.persist_dir)
+        current = self._current
+        closed = False
+        if current is None or (current.generation, current.path) != (generation, path):
+            if not has_store(self.persist_dir):
+                raise FileNotFoundError(
+                    f"❌ Vector store not found at {self.persist_dir}. Please run ingestion first."
+                )
+            if self._embeddings is None:
+                self._embeddings = make_query_embeddings()
+            self._current = StoreHandle(path, generation, self._embeddings)
+            if current is not None:
+                log.info(f"🔁 Vectorstore generation {current.generation or '-'} → {generation or '-'}")
+                closed = self._retire(current)
+        return self._current, closed
+
+    def collect(self) -> List[str]:
+        """Delete retired generation directories no reader in this process still holds."""
+        with self._lock:
+            in_use = [h.path for h in self._draining]
+            if self._current is not None:
+                in_use.append(self._current.path)
+        # Outside the lock: the live generation is never a candidate, so readers are not held up
+        removed = collect_generations(self.persist_dir, in_use, keep=GENERATIONS_KEEP)
+        for path in removed:
+            log.info(f"🧹 Removed retired vectorstore generation: {path}")
+        return removed
+
+    def current(self) -> StoreHandle:
+        """Current handle without taking a reference (for quick, non-critical reads)."""
+        with self._lock:
+            handle, closed = self._current_handle()
+        if closed:
+            self.collect()
+        return handle
+
+    @contextmanager
+    def acquire(self) -> Iterator[StoreHandle]:
+        """Borrow the current generation for the duration of a query."""
+        with self._lock:
+            handle, closed = self._current_handle()
+            handle.refs += 1
+        if closed:
+            self.collect()
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                closed = self._release(handle)
+            if closed:
+                self.collect()
+
+    def retire(self):
+        """Stop handing out the current handle (e.g. before its files are replaced)."""
+        with self._lock:
+            if self._current is not None:
+                self._retire(self._current)
+                self._current = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            current = self._current
+            return {
+                "generation": current.generation if current else None,
+                "in_flight": current.refs if current else 0,
+                "draining": len(self._draining),
+            }
+
+
+_registries: Dict[str, StoreRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(persist_dir: Optional[str] = None) -> StoreRegistry:
+    """Process-wide registry for `persist_dir` (defaults to PERSIST_DIR)."""
+    key = os.path.abspath(persist_dir or PERSIST_DIR)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = StoreRegistry(key)
+        return _registries[key]
@@ -1,21 +1,21 @@
-import os
+import time
+from typing import Iterator
+
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.schema import AIMessage
 from langchain.schema.runnable import RunnableSequence
 
 from modules.config import OPENAI_MODEL_SUMMARY, TEMP_SUMMARY
+from modules.llm_pool import get_chat_model
+from modules.tokens import count_tokens
+from modules.tracing import span, annotate, get_tracer
 
 load_dotenv()
 
-class Summarizer:
-    def __init__(self, temperature: float | None = None, model_name: str | None = None):
-        self.llm = ChatOpenAI(
-            temperature=TEMP_SUMMARY if temperature is None else temperature,
-            model_name=model_name or OPENAI_MODEL_SUMMARY,
-        )
-        template = """
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["text", "max_tokens"],
+    template="""
 Summarize the following text briefly but thoroughly.
 Keep the summary under {max_tokens} tokens.
 
@@ -23,25 +23,72 @@ Text:
 {text}
 
 Summary:
-"""
-        self.prompt = PromptTemplate(
-            input_variables=["text", "max_tokens"],
-            template=template.strip()
-        )
+""".strip(),
+)
+
+
+class Summarizer:
+    """
+    Summarization policy: text already within `max_tokens` is returned as-is
+    (no LLM call); only longer text goes through the model.
+    """
+
+    def __init__(self, temperature: float | None = None, model_name: str | None = None):
+        self.model_name = model_name or OPENAI_MODEL_SUMMARY
+        self.llm = get_chat_model(self.model_name, TEMP_SUMMARY if temperature is None else temperature)
+        self.prompt = SUMMARY_PROMPT
         self.chain = RunnableSequence(self.prompt, self.llm)
 
-    def summarize(self, text: str, max_tokens: int = 300) -> str:
+    @staticmethod
+    def _normalize_input(text) -> str:
         # Defensive normalization
         if callable(text):
-            text = "[Internal error: received a function instead of text]"
-        elif not isinstance(text, str):
-            text = str(text)
+            return "[Internal error: received a function instead of text]"
+        if not isinstance(text, str):
+            return str(text)
+        return text
 
-        try:
-            output = self.chain.invoke({"text": text, "max_tokens": max_tokens})
-        except Exception as e:
-            return f"[Summarizer Error: {e}]"
+    def needs_summary(self, text: str, max_tokens: int = 300) -> bool:
+        return count_tokens(self._normalize_input(text), self.model_name) > max_tokens
 
+    def _span(self, text: str, max_tokens: int):
+        return span("summarize", model=self.model_name, input_tokens=count_tokens(text, self.model_name),
+                    max_tokens=max_tokens)
+
+    def _traced(self, summary: str) -> str:
+        annotate(output_tokens=count_tokens(summary, self.model_name))
+        return summary
+
+    def summarize(self, text: str, max_tokens: int = 300) -> str:
+        text = self._normalize_input(text)
+        with self._span(text, max_tokens):
+            if not self.needs_summary(text, max_tokens):
+                annotate(skipped=True)
+                return text.strip()
+
+            try:
+                output = self.chain.invoke({"text": text, "max_tokens": max_tokens})
+            except Exception as e:
+                annotate(error=str(e))
+                return f"[Summarizer Error: {e}]"
+            return self._traced(self._normalize_output(output))
+
+    async def asummarize(self, text: str, max_tokens: int = 300) -> str:
+        text = self._normalize_input(text)
+        with self._span(text, max_tokens):
+            if not self.needs_summary(text, max_tokens):
+                annotate(skipped=True)
+                return text.strip()
+
+            try:
+                output = await self.chain.ainvoke({"text": text, "max_tokens": max_tokens})
+            except Exception as e:
+                annotate(error=str(e))
+                return f"[Summarizer Error: {e}]"
+            return self._traced(self._normalize_output(output))
+
+    @staticmethod
+    def _normalize_output(output) -> str:
         # Normalize outputs from LangChain
         if isinstance(output, AIMessage):
             content = getattr(output, "content", None)
@@ -60,6 +107,49 @@ Summary:
 
         return str(output).strip()
 
+    def stream(self, text: str, max_tokens: int = 300) -> Iterator[str]:
+        """Yield the summary token by token (errors are yielded as text, like `summarize`)."""
+        text = self._normalize_input(text)
+        # Recorded as the same `summarize` stage as `summarize`; timed by hand because a span
+        # cannot stay open across the yields of a generator
+        started = time.perf_counter()
+        attrs = {"model": self.model_name, "input_tokens": count_tokens(text, self.model_name),
+                 "max_tokens": max_tokens, "streamed": True}
+        shown: list[str] = []
+        try:
+            if not self.needs_summary(text, max_tokens):
+                attrs["skipped"] = True
+                yield text.strip()
+                return
+            for chunk in self.chain.stream({"text": text, "max_tokens": max_tokens}):
+                content = getattr(chunk, "content", None)
+                if isinstance(content, str) and content:
+                    if "first_token_ms" not in attrs:
+                        attrs["first_token_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+                    shown.append(content)
+                    yield content
+        except Exception as e:
+            attrs["error"] = str(e)
+            yield f"[Summarizer Error: {e}]"
+        finally:
+            if shown:
+                attrs["output_tokens"] = count_tokens("".join(shown), self.model_name)
+            get_tracer().record("summarize", (time.perf_counter() - started) * 1000.0, **attrs)
+
+
+_default: Summarizer | None = None
+
+
+def _default_summarizer() -> Summarizer:
+    global _default
+    if _default is None:
+        _default = Summarizer()
+    return _default
+
 
 def summarize_text(text: str, response_length: int = 300) -> str:
-    return Summarizer().summarize(text, max_tokens=response_length)
+    return _default_summarizer().summarize(text, max_tokens=response_length)
+
+
+def summarize_stream(text: str, response_length: int = 300) -> Iterator[str]:
+    return _default_summarizer().stream(text, max_tokens=response_length)
@@ -0,0 +1,57 @@
+# modules/tokens.py
+# Token counting shared by ingestion, summarization and context packing.
+
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is in requirements, but keep a rough fallback
+    tiktoken = None
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # BPE files are downloaded on first use; offline boxes fall back to chars/4
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Number of tokens `text` uses for `model` (≈ chars/4 without tiktoken)."""
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4", keep_end: bool = False) -> str:
+    """`text` cut to at most `max_tokens` tokens (the last ones with `keep_end`)."""
+    if not text or max_tokens <= 0:
+        return ""
+    enc = _encoding(model)
+    if enc is None:
+        limit = max_tokens * 4
+        return text[-limit:] if keep_end else text[:limit]
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+
+def length_instruction(max_tokens: int | None) -> str:
+    """Prompt sentence asking the model to answer within `max_tokens` ('' for no limit)."""
+    if not max_tokens:
+        return ""
+    return f"Keep the answer under {max_tokens} tokens."
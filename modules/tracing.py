@@ -0,0 +1,349 @@
+# modules/tracing.py
+# Per-stage latency tracing for the query and ingestion pipelines.
+#
+#   with span("rag.retrieve", k=3) as s:
+#       ...
+#       s.set(chunks=len(docs))
+#
+# Spans nest through a context variable (works across threads started with
+# asyncio.to_thread and inside asyncio tasks). When a root span ends, the whole
+# trace is handed to the configured sinks (TRACE_SINKS):
+#   jsonl      – one JSON line per trace in TRACE_JSONL_PATH
+#   prometheus – latency summaries in the Prometheus text format (GET /metrics of
+#                modules.service, or a standalone endpoint on TRACE_PROMETHEUS_PORT)
+#   otel       – re-emitted as OpenTelemetry spans (needs opentelemetry-sdk)
+# A rolling window of durations per stage feeds `stage_stats()` (p50/p95) for the UI.
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from modules.config import (
+    TRACE_ENABLED,
+    TRACE_SINKS,
+    TRACE_JSONL_PATH,
+    TRACE_PROMETHEUS_HOST,
+    TRACE_PROMETHEUS_PORT,
+    TRACE_WINDOW,
+)
+
+log = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed stage; `attrs` hold token counts, cache hits, scores…"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "_t0", "attrs", "error", "children")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = dict(attrs)
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        if self.end is None:
+            return (time.perf_counter() - self._t0) * 1000.0
+        return (self.end - self.start) * 1000.0
+
+    def finish(self):
+        self.end = self.start + (time.perf_counter() - self._t0)
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict:
+        out = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+        }
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Sinks (each gets every finished trace; failures are logged, never raised)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class JsonlSink:
+    """Appends one line per trace: {"trace_id", "name", "duration_ms", "spans": [...]}."""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, root: Span):
+        line = json.dumps({
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "start": root.start,
+            "duration_ms": round(root.duration_ms, 3),
+            "spans": [s.to_dict() for s in root.walk()],
+        }, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusSink:
+    """
+    Latency summaries per stage in the Prometheus text exposition format:
+    `rag_stage_latency_seconds{stage=…,quantile=…}` from the tracer's rolling window,
+    plus cumulative `_sum`/`_count` and `rag_stage_errors_total`.
+    """
+
+    def __init__(self, tracer: "Tracer", port: int = TRACE_PROMETHEUS_PORT, host: str = TRACE_PROMETHEUS_HOST):
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._sum: Dict[str, float] = {}
+        self._count: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        if port:
+            self._serve(host, port)
+
+    def export(self, root: Span):
+        with self._lock:
+            for s in root.walk():
+                self._sum[s.name] = self._sum.get(s.name, 0.0) + s.duration_ms / 1000.0
+                self._count[s.name] = self._count.get(s.name, 0) + 1
+                if s.error:
+                    self._errors[s.name] = self._errors.get(s.name, 0) + 1
+
+    def render(self) -> str:
+        stats = self.tracer.stage_stats()
+        lines = [
+            "# HELP rag_stage_latency_seconds Latency of each pipeline stage.",
+            "# TYPE rag_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            for stage in sorted(self._count):
+                label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                window = stats.get(stage)
+                if window:
+                    for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+                        lines.append(f'rag_stage_latency_seconds{{stage="{label}",quantile="{q}"}} {window[key] / 1000.0:.6f}')
+                lines.append(f'rag_stage_latency_seconds_sum{{stage="{label}"}} {self._sum[stage]:.6f}')
+                lines.append(f'rag_stage_latency_seconds_count{{stage="{label}"}} {self._count[stage]}')
+            lines += [
+                "# HELP rag_stage_errors_total Spans that ended with an exception.",
+                "# TYPE rag_stage_errors_total counter",
+            ]
+            for stage in sorted(self._errors):
+                lines.append(f'rag_stage_errors_total{{stage="{stage}"}} {self._errors[stage]}')
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, host: str, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode("utf-8")
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="trace-metrics", daemon=True).start()
+        log.info(f"📈 Prometheus metrics on http://{host}:{port}/metrics")
+
+
+class OpenTelemetrySink:
+    """Re-emits finished traces through the OpenTelemetry API (exporters are configured by the app)."""
+
+    def __init__(self):
+        from opentelemetry import trace  # optional dependency
+
+        self._trace = trace
+        self.tracer = trace.get_tracer("rag-ai-agent")
+
+    @staticmethod
+    def _attr(value):
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, (list, tuple)) and all(isinstance(v, (int, float)) for v in value):
+            return list(value)
+        return str(value)
+
+    def _emit(self, span: Span, parent_ctx):
+        otel = self.tracer.start_span(
+            span.name,
+            context=parent_ctx,
+            start_time=int(span.start * 1e9),
+            attributes={k: self._attr(v) for k, v in span.attrs.items() if v is not None},
+        )
+        if span.error:
+            otel.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        ctx = self._trace.set_span_in_context(otel)
+        for child in span.children:
+            self._emit(child, ctx)
+        otel.end(end_time=int((span.end or time.time()) * 1e9))
+
+    def export(self, root: Span):
+        self._emit(root, None)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Tracer
+# ──────────────────────────────────────────────────────────────────────────────
+
+class Tracer:
+    """Collects spans, keeps a rolling latency window per stage and feeds the sinks."""
+
+    def __init__(self, enabled: bool = TRACE_ENABLED, window: int = TRACE_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.sinks: list = []
+        self._durations: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def sink(self, kind: type):
+        """First configured sink of type `kind` (None if absent)."""
+        return next((s for s in self.sinks if isinstance(s, kind)), None)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Optional[Span]]:
+        if not self.enabled:
+            yield None
+            return
+        parent = _current.get()
+        current = Span(name, parent, attrs)
+        if parent is not None:
+            parent.children.append(current)
+        token = _current.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            current.finish()
+            self._finished(current)
+
+    def record(self, name: str, duration_ms: float, **attrs):
+        """Add a stage timed by the caller (e.g. across the yields of a generator)."""
+        if not self.enabled:
+            return
+        parent = _current.get()
+        span = Span(name, parent, attrs)
+        span.start = time.time() - duration_ms / 1000.0
+        span.end = span.start + duration_ms / 1000.0
+        if parent is not None:
+            parent.children.append(span)
+        self._finished(span)
+
+    def _finished(self, span: Span):
+        with self._lock:
+            window = self._durations.get(span.name)
+            if window is None:
+                window = self._durations[span.name] = deque(maxlen=self.window)
+            window.append(span.duration_ms)
+        if span.parent_id is not None:
+            return
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                log.warning(f"⚠️ Trace sink {type(sink).__name__} failed: {e}")
+
+    def stage_stats(self) -> Dict[str, dict]:
+        """{stage: {"count", "p50_ms", "p95_ms", "last_ms"}} over the rolling window."""
+        with self._lock:
+            windows = {name: np.fromiter(d, dtype=np.float64) for name, d in self._durations.items() if d}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "last_ms": float(values[-1]),
+            }
+            for name, values in windows.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+
+
+def _configure(tracer: Tracer):
+    for kind in (k.strip().lower() for k in TRACE_SINKS.split(",")):
+        if not kind:
+            continue
+        try:
+            if kind == "jsonl":
+                tracer.add_sink(JsonlSink())
+            elif kind == "prometheus":
+                tracer.add_sink(PrometheusSink(tracer))
+            elif kind in ("otel", "opentelemetry"):
+                tracer.add_sink(OpenTelemetrySink())
+            else:
+                log.warning(f"⚠️ Unknown trace sink: {kind!r} (expected jsonl, prometheus or otel)")
+        except Exception as e:
+            log.warning(f"⚠️ Trace sink {kind!r} unavailable: {e}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer with the sinks from TRACE_SINKS."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            _configure(_tracer)
+        return _tracer
+
+
+def span(name: str, **attrs):
+    """Time a stage: `with span("rag.llm", model=...) as s: ...` (s is None when tracing is off)."""
+    return get_tracer().span(name, **attrs)
+
+
+def annotate(**attrs):
+    """Attach attributes to the innermost open span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
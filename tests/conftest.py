@@ -0,0 +1,41 @@
+# tests/conftest.py
+# Config is read at import time, so the environment is pinned here, before any
+# `modules.*` import: scratch store and caches, the offline hashing embedder,
+# no trace sinks, and a dummy API key (LLM calls go to benchmarks/fake_openai.py).
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_SCRATCH = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.update({
+    "OPENAI_API_KEY": "sk-test",
+    "EMBED_BACKEND": "hashing",
+    "CHROMA_DB_DIR": os.path.join(_SCRATCH, "vectorstore"),
+    "DOCS_DIR": os.path.join(_SCRATCH, "documents"),
+    "CACHE_DIR": os.path.join(_SCRATCH, ".cache"),
+    "EMBED_CACHE_ENABLED": "false",
+    "ANSWER_CACHE_ENABLED": "false",
+    "TRACE_SINKS": "",
+    "ANONYMIZED_TELEMETRY": "False",
+})
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Local fake of the OpenAI API; pooled chat models are rebuilt to point at it."""
+    from benchmarks.fake_openai import FakeOpenAI
+    from modules import llm_pool
+
+    server = FakeOpenAI().start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    llm_pool.close_pool()
+    yield server
+    llm_pool.close_pool()
+    server.stop()
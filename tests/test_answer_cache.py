@@ -0,0 +1,68 @@
+import numpy as np
+
+from modules import answer_cache
+from modules.answer_cache import SemanticAnswerCache, key_terms
+
+
+def _vec(*values):
+    v = np.zeros(8, dtype=np.float32)
+    v[:len(values)] = values
+    return v
+
+
+def test_paraphrase_hits_within_the_distance():
+    cache = SemanticAnswerCache(max_distance=0.02, max_entries=8, ttl=60)
+    cache.store(_vec(1, 0.1), "Up to $500.", ["doc"], "g1", "ns", "How much is theft reimbursed?")
+
+    hit = cache.lookup(_vec(1, 0.12), "g1", "ns", "How much does theft reimburse?")
+    assert hit == ("Up to $500.", ["doc"])
+    assert cache.stats()["hits"] == 1
+
+
+def test_near_miss_on_distance_number_negation_or_settings():
+    cache = SemanticAnswerCache(max_distance=0.02, max_entries=8, ttl=60)
+    cache.store(_vec(1, 0.1), "Yes.", [], "g1", "ns", "Is claim 1234 covered?")
+
+    # Same embedding, but another claim number or the opposite question
+    assert cache.lookup(_vec(1, 0.1), "g1", "ns", "Is claim 1235 covered?") is None
+    assert cache.lookup(_vec(1, 0.1), "g1", "ns", "Is claim 1234 not covered?") is None
+    # Same terms, but too far apart, or other model settings
+    assert cache.lookup(_vec(1, 1), "g1", "ns", "Is claim 1234 covered?") is None
+    assert cache.lookup(_vec(1, 0.1), "g1", "other", "Is claim 1234 covered?") is None
+    assert cache.lookup(_vec(1, 0.1), "g1", "ns", "Was claim 1234 covered?") == ("Yes.", [])
+    assert cache.stats()["misses"] == 4
+
+
+def test_key_terms():
+    assert key_terms("Is claim 1234 covered?") == {"1234"}
+    assert key_terms("Is theft covered?") != key_terms("Is theft excluded?")
+    assert "homp-1598900-24" in key_terms("What does HOMP-1598900-24 cover?")
+    assert key_terms("What is covered?") == frozenset()
+
+
+def test_new_generation_and_ttl_invalidate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(max_distance=0.02, max_entries=8, ttl=60)
+    cache.store(_vec(1), "a", [], "g1", None, "q")
+    cache.store(_vec(0, 1), "b", [], "g1", None, "q")
+
+    # A lookup against another generation drops every entry of the old one
+    assert cache.lookup(_vec(1), "g2", None, "q") is None
+    assert cache.stats()["entries"] == 0
+
+    cache.store(_vec(1), "a", [], "g2", None, "q")
+    now[0] += 59
+    assert cache.lookup(_vec(1), "g2", None, "q") == ("a", [])
+    now[0] += 2
+    assert cache.lookup(_vec(1), "g2", None, "q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_bound():
+    cache = SemanticAnswerCache(max_distance=0.02, max_entries=2, ttl=60)
+    for i, answer in enumerate("abc"):
+        cache.store(_vec(*([0] * i + [1])), answer, [], "g1")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(_vec(1), "g1") is None  # oldest evicted
+    assert cache.lookup(_vec(0, 0, 1), "g1") == ("c", [])
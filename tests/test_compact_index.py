@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from modules.compact_index import CompactIndex, CompactVectorStore, ReadOnlyIndexError
+
+
+class _Collection:
+    """The slice of a Chroma collection CompactIndex.build reads."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.ids = [f"c{i}" for i in range(len(vectors))]
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include, limit, offset):
+        return {"ids": self.ids[offset:offset + limit], "embeddings": self.vectors[offset:offset + limit]}
+
+
+def _corpus(n=3000, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    vectors = _corpus()
+    persist = str(tmp_path_factory.mktemp("store"))
+    assert CompactIndex.build(persist, _Collection(vectors), page=700) == len(vectors)
+    return vectors, CompactIndex.load(persist)
+
+
+def test_index_is_int8_plus_float16_and_dequantizes_closely(built):
+    vectors, index = built
+    assert index.codes.dtype == np.int8 and index.vectors.dtype == np.float16
+    assert isinstance(index.codes, np.memmap)
+    restored = index.codes.astype(np.float32) * index.scales[:, None]
+    assert np.abs(restored - vectors).max() <= index.scales.max() / 2 + 1e-6
+    assert np.allclose(index.vectors_for(["c5", "c0"]), vectors[[5, 0]], atol=1e-3)
+
+
+def test_rescored_search_matches_exact_cosine(built):
+    vectors, index = built
+    queries = _corpus(n=50, seed=1)
+    k, recall = 10, []
+    for q in queries:
+        exact = {f"c{i}" for i in np.argsort(-(vectors @ q))[:k]}
+        hits = index.search(q.tolist(), k, rescore=4)
+        recall.append(len(exact & {chunk_id for chunk_id, _ in hits}) / k)
+        # Squared L2 distances, best first, as Chroma reports them
+        dists = [d for _, d in hits]
+        assert dists == sorted(dists)
+        best = int(hits[0][0][1:])
+        assert dists[0] == pytest.approx(float(((vectors[best] - q) ** 2).sum()), abs=1e-2)
+    assert np.mean(recall) >= 0.98
+
+
+def test_empty_collection_and_missing_index(tmp_path):
+    assert CompactIndex.load(str(tmp_path)) is None
+    CompactIndex.build(str(tmp_path), _Collection(np.zeros((0, 8), np.float32)))
+    assert CompactIndex.load(str(tmp_path)).search([0.0] * 8, 3) == []
+
+
+def test_vector_store_is_read_only(built):
+    class _Chroma:
+        _collection = None
+
+    store = CompactVectorStore(built[1], _Chroma(), embeddings=None)
+    with pytest.raises(ReadOnlyIndexError):
+        store.add_texts(["text"])
+    with pytest.raises(ReadOnlyIndexError):
+        CompactVectorStore.from_texts(["text"], embedding=None)
@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from modules.context_packer import pack_context
+from modules.tokens import count_tokens
+
+
+def _doc(text, source="a.pdf", page=0, start=None, id=None):
+    meta = {"source": source, "page": page}
+    if start is not None:
+        meta["start_index"] = start
+    return Document(id=id, page_content=text, metadata=meta)
+
+
+def test_adjacent_chunks_of_a_page_are_merged_by_offset():
+    page = "alpha beta gamma delta epsilon zeta eta theta iota kappa"
+    first, second = _doc(page[:30], start=0, id="1"), _doc(page[20:], start=20, id="2")
+    packed = pack_context([second, first], budget=None)
+    assert [d.page_content for d in packed] == [page]
+
+
+def test_overlapping_chunks_without_offsets_are_merged_by_text():
+    left = "The plan covers accidental damage from handling"
+    right = "accidental damage from handling and power surges."
+    packed = pack_context([_doc(left), _doc(right)], budget=None)
+    assert len(packed) == 1
+    assert packed[0].page_content == "The plan covers accidental damage from handling and power surges."
+
+
+def test_different_pages_stay_separate_in_relevance_order():
+    docs = [_doc("second page text", page=2, id="b"), _doc("first page text", page=1, id="a")]
+    packed = pack_context(docs, budget=None)
+    assert [d.id for d in packed] == ["b", "a"]
+
+
+def test_budget_skips_chunks_that_do_not_fit_but_keeps_shorter_later_ones():
+    big = _doc("x " * 400, page=1, id="big")
+    top = _doc("most relevant chunk", page=2, id="top")
+    small = _doc("short one", page=3, id="small")
+    budget = count_tokens(top.page_content) + count_tokens(small.page_content) + 2
+    packed = pack_context([top, big, small], budget=budget)
+    assert [d.id for d in packed] == ["top", "small"]
+
+
+def test_most_relevant_chunk_is_kept_even_over_budget():
+    top = _doc("word " * 200, id="top")
+    packed = pack_context([top, _doc("tiny", page=1)], budget=5)
+    assert [d.id for d in packed] == ["top"]
+
+
+def test_empty_input():
+    assert pack_context([], budget=100) == []
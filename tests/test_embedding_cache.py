@@ -0,0 +1,67 @@
+from modules.embedding_cache import CachedEmbeddings, normalize_text
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def _cache(tmp_path, model="model-a", inner=None, **kwargs):
+    return CachedEmbeddings(inner or _CountingEmbeddings(), model_name=model,
+                            path=str(tmp_path / "emb.sqlite"), **kwargs)
+
+
+def test_normalized_repeats_hit_memory_then_sqlite(tmp_path):
+    cache = _cache(tmp_path)
+    vector = cache.embed_query("What is covered?")
+    assert cache.embed_query("  what IS   covered? ") == vector
+    assert cache.embeddings.queries == ["What is covered?"]
+    assert normalize_text("  A\n b ") == "a b"
+
+    # A new process (empty LRU) is served from the SQLite tier
+    reopened = _cache(tmp_path)
+    assert reopened.embed_query("What is covered?") == vector
+    assert reopened.embeddings.queries == []
+    assert reopened.stats() == {"hits": 1, "misses": 0, "hit_rate": 1.0, "memory_items": 1, "stored_items": 1}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_model_name_is_part_of_the_key(tmp_path):
+    _cache(tmp_path, model="model-a").embed_query("What is covered?")
+    other = _cache(tmp_path, model="model-b")
+    other.embed_query("What is covered?")
+    assert other.embeddings.queries == ["What is covered?"]
+    assert other.stats()["misses"] == 1 and other.stats()["stored_items"] == 2
+
+
+def test_both_tiers_evict_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, memory_items=2, max_entries=3)
+    for q in ("q1", "q2", "q3"):
+        cache.embed_query(q)
+    assert cache.stats()["memory_items"] == 2
+    cache.embed_query("q1")  # from SQLite; now the most recently used
+    cache.embed_query("q4")  # evicts q2, the least recently used row
+    assert cache.stats()["stored_items"] == 3
+
+    fresh = _cache(tmp_path)
+    for q in ("q1", "q3", "q4"):
+        fresh.embed_query(q)
+    assert fresh.embeddings.queries == []
+    fresh.embed_query("q2")
+    assert fresh.embeddings.queries == ["q2"]
+
+
+def test_documents_pass_through_and_clear(tmp_path):
+    cache = _cache(tmp_path)
+    cache.embed_documents(["a", "a"])
+    assert cache.stats()["stored_items"] == 0 and cache.embeddings.queries == ["a", "a"]
+    cache.embed_query("q")
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0, "memory_items": 0, "stored_items": 0}
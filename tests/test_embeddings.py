@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_pdf
+from modules.embeddings import (
+    EMBEDDING_INFO_FILE,
+    HashingEmbeddings,
+    backend_id,
+    check_store,
+    read_embedding_info,
+    write_embedding_info,
+)
+
+
+def test_hashing_is_deterministic_normalized_and_sized():
+    emb = HashingEmbeddings(dim=64)
+    first = emb.embed_query("Theft of the covered product is reimbursed")
+    again = HashingEmbeddings(dim=64).embed_query("Theft of the covered product is reimbursed")
+    assert first == again
+    assert len(first) == 64
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-5)
+
+    docs = emb.embed_documents(["cancellation refund", "theft claim", ""])
+    assert [len(v) for v in docs] == [64, 64, 64]
+    assert docs[0] != docs[1]
+    assert not any(docs[2])  # no tokens → zero vector, not NaN
+    assert backend_id(emb) == "hashing:64"
+
+
+def test_hashing_similarity_is_lexical():
+    emb = HashingEmbeddings(dim=256)
+    query, near, far = (np.array(v) for v in emb.embed_documents([
+        "refund of the monthly plan fee",
+        "the monthly plan fee is refunded",
+        "police report for a stolen phone",
+    ]))
+    assert query @ near > query @ far
+
+
+def test_check_store_accepts_unknown_and_matching_stores(tmp_path):
+    emb = HashingEmbeddings(dim=32)
+    check_store(str(tmp_path), emb)  # no record yet
+    write_embedding_info(str(tmp_path), backend_id(emb), 32)
+    assert read_embedding_info(str(tmp_path)) == {"backend": "hashing:32", "dim": 32}
+    check_store(str(tmp_path), emb)
+
+
+def test_check_store_rejects_another_backend_or_dimension(tmp_path):
+    write_embedding_info(str(tmp_path), "openai:text-embedding-ada-002", 1536)
+    with pytest.raises(ValueError, match="embedded with openai"):
+        check_store(str(tmp_path), HashingEmbeddings(dim=32))
+
+    write_embedding_info(str(tmp_path), "hashing:32", 64)
+    with pytest.raises(ValueError, match="64-d vectors"):
+        check_store(str(tmp_path), HashingEmbeddings(dim=32))
+
+
+def test_ingest_rebuilds_a_store_embedded_by_another_backend(tmp_path, monkeypatch):
+    from modules import rag_ingest
+
+    docs = tmp_path / "documents"
+    docs.mkdir()
+    (docs / "urls.txt").write_text("")
+    write_pdf(str(docs / "policy.pdf"), ["Theft is reimbursed up to $500 per claim.",
+                                         "Cancel at any time with written notice."])
+    monkeypatch.setattr(rag_ingest, "DOCS_DIR", str(docs))
+    monkeypatch.setattr(rag_ingest, "URL_FILE", str(docs / "urls.txt"))
+    store = str(tmp_path / "store")
+
+    assert rag_ingest.ingest_documents(force_reload=False, output_dir=store, embeddings=HashingEmbeddings(dim=64))
+    assert read_embedding_info(store) == {"backend": "hashing:64", "dim": 64}
+
+    # Same sources, another model: everything is re-embedded instead of mixing dimensions
+    assert rag_ingest.ingest_documents(force_reload=False, output_dir=store, embeddings=HashingEmbeddings(dim=32))
+    with open(os.path.join(store, EMBEDDING_INFO_FILE)) as f:
+        assert json.load(f) == {"backend": "hashing:32", "dim": 32}
+    check_store(store, HashingEmbeddings(dim=32))
+    with pytest.raises(ValueError):
+        check_store(store, HashingEmbeddings(dim=64))
@@ -0,0 +1,57 @@
+# Ingestion (hashing embedder) into the scratch store, then queries and fallback
+# against benchmarks/fake_openai.py: the whole path, no network.
+
+import os
+
+import pytest
+
+from benchmarks.synthetic import write_pdf
+from modules.config import DOCS_DIR, PERSIST_DIR
+
+PAGES = [
+    "Section on theft. Theft of the covered product is reimbursed up to $500 per claim "
+    "when a police report is filed within 30 days.",
+    "Section on cancellation refund. Cancel at any time with written notice; the unused "
+    "monthly plan fee is refunded within 14 days.",
+]
+
+
+@pytest.fixture(scope="module")
+def store():
+    from modules.rag_ingest import ingest_documents
+
+    os.makedirs(DOCS_DIR, exist_ok=True)
+    open(os.path.join(DOCS_DIR, "urls.txt"), "w").close()
+    write_pdf(os.path.join(DOCS_DIR, "policy.pdf"), PAGES)
+    assert ingest_documents(force_reload=True)
+    return PERSIST_DIR
+
+
+def test_ingest_publishes_a_generation_and_noop_reingest_keeps_it(store):
+    from modules.generation import resolve_store
+    from modules.rag_ingest import ingest_documents
+
+    generation, path = resolve_store(store)
+    assert os.path.isdir(path) and path != store
+    assert ingest_documents(force_reload=False)
+    assert resolve_store(store) == (generation, path)
+
+
+def test_rag_answers_with_sources(store, fake_openai):
+    from modules.rag_qa import RAGQA
+
+    answer, sources = RAGQA().query("How is theft of the covered product reimbursed?")
+    assert answer.startswith("According to the documents")
+    assert sources
+    assert all(os.path.basename(d.metadata["source"]) == "policy.pdf" for d in sources)
+    assert fake_openai.calls["chat"] == 1
+
+
+def test_orchestrator_falls_back_once_on_a_miss(store, fake_openai):
+    from modules.orchestrator import AnswerOrchestrator
+    from modules.rag_qa import RAGQA
+
+    outcome = AnswerOrchestrator(RAGQA()).answer("zebra xylophone quantum banana")
+    assert outcome.provenance == "GPT" and outcome.answer
+    assert fake_openai.calls["chat"] == 1
+
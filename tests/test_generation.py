@@ -0,0 +1,107 @@
+import os
+
+from modules.generation import (
+    CURRENT_FILE,
+    STAGING_FILE,
+    abandon_generation,
+    collect_generations,
+    has_store,
+    publish_generation,
+    read_generation,
+    resolve_store,
+    stage_generation,
+)
+
+
+def _build(persist_dir, content):
+    path, resumed = stage_generation(persist_dir)
+    with open(os.path.join(path, "data.txt"), "w") as f:
+        f.write(content)
+    return path, resumed
+
+
+def test_stage_publish_swaps_the_current_pointer(tmp_path):
+    persist = str(tmp_path)
+    assert not has_store(persist)
+
+    path, resumed = _build(persist, "v1")
+    assert not resumed
+    # Staged builds are invisible until published
+    assert not os.path.exists(os.path.join(persist, CURRENT_FILE))
+
+    generation = publish_generation(persist, path)
+    assert resolve_store(persist) == (generation, path)
+    assert read_generation(path) == generation
+    assert not os.path.exists(os.path.join(path, STAGING_FILE))
+
+
+def test_next_stage_starts_as_a_copy_of_the_live_store(tmp_path):
+    persist = str(tmp_path)
+    first, _ = _build(persist, "v1")
+    publish_generation(persist, first)
+
+    second, _ = stage_generation(persist)
+    assert second != first
+    with open(os.path.join(second, "data.txt")) as f:
+        assert f.read() == "v1"
+
+
+def test_collect_keeps_live_in_use_and_recent_generations(tmp_path):
+    persist = str(tmp_path)
+    paths = []
+    for i in range(4):
+        path, _ = _build(persist, f"v{i}")
+        publish_generation(persist, path)
+        paths.append(path)
+        # Publication order is read from file mtimes
+        os.utime(os.path.join(path, ".generation"), (1000 + i, 1000 + i))
+    staged, _ = _build(persist, "in progress")
+
+    removed = collect_generations(persist, in_use=[paths[0]], keep=1)
+
+    assert removed == [paths[1]]
+    for kept in (paths[0], paths[2], paths[3], staged):
+        assert os.path.isdir(kept)
+    assert resolve_store(persist)[1] == paths[3]
+
+
+def test_abandoned_build_is_resumed(tmp_path):
+    persist = str(tmp_path)
+    path, _ = _build(persist, "partial")
+    abandon_generation(path)
+
+    resumed_path, resumed = stage_generation(persist)
+    assert resumed and resumed_path == path
+    with open(os.path.join(path, "data.txt")) as f:
+        assert f.read() == "partial"
+
+
+class _Kernel32:
+    """Stand-in for the Windows API calls _alive_nt makes."""
+
+    def __init__(self, exists=True, exit_code=259, error=87):
+        self.exists, self.exit_code, self.error = exists, exit_code, error
+        self.closed = []
+
+    def OpenProcess(self, access, inherit, pid):
+        return 42 if self.exists else 0
+
+    def GetExitCodeProcess(self, handle, code):
+        code._obj.value = self.exit_code
+        return 1
+
+    def CloseHandle(self, handle):
+        self.closed.append(handle)
+
+
+def test_windows_liveness_uses_the_process_exit_code():
+    from modules.generation import _alive_nt
+
+    def api(kernel32):
+        return kernel32, lambda: kernel32.error
+
+    running = _Kernel32()
+    assert _alive_nt(1234, api(running)) and running.closed == [42]
+    assert not _alive_nt(1234, api(_Kernel32(exit_code=0)))  # exited, handle still open
+    assert not _alive_nt(1234, api(_Kernel32(exists=False)))  # ERROR_INVALID_PARAMETER: gone
+    assert _alive_nt(1234, api(_Kernel32(exists=False, error=5)))  # access denied: exists
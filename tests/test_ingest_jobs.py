@@ -0,0 +1,147 @@
+import functools
+import threading
+import time
+
+import pytest
+
+from benchmarks.synthetic import write_pdf
+from modules import rag_ingest
+from modules.embeddings import HashingEmbeddings
+from modules.generation import STAGING_FILE, resolve_store
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class _FakeIngest:
+    """Replaces ingest_documents: each run waits to list its sources, then to finish."""
+
+    def __init__(self):
+        self.runs = []
+        self.list_gate = threading.Event()
+        self.done_gate = threading.Event()
+
+    def __call__(self, force_reload, progress, cancel):
+        self.runs.append(force_reload)
+        self.list_gate.wait(5)
+        progress({"stage": "list"})
+        self.done_gate.wait(5)
+        return True
+
+
+@pytest.fixture
+def fake_ingest(monkeypatch):
+    fake = _FakeIngest()
+    monkeypatch.setattr(rag_ingest, "ingest_documents", fake)
+    return fake
+
+
+def test_refreshes_coalesce_with_queued_and_running_jobs(fake_ingest):
+    worker = rag_ingest.IngestWorker()
+    first = worker.submit()
+    _wait(lambda: worker.status(first)["status"] == "running")
+
+    # Running, sources not listed yet: it will see whatever changed
+    assert worker.submit() == first
+    fake_ingest.list_gate.set()
+    _wait(lambda: worker._jobs[first].listed)
+
+    # Listed: one follow-up, shared by every later request (upgraded to a full rebuild)
+    follow_up = worker.submit()
+    assert follow_up != first
+    assert worker.submit() == follow_up
+    assert worker.submit(force_reload=True) == follow_up
+    assert worker.status(follow_up)["force_reload"] is True
+
+    fake_ingest.done_gate.set()
+    _wait(lambda: worker.status(follow_up)["status"] == "done")
+    assert fake_ingest.runs == [False, True]
+
+
+def test_follow_up_of_a_running_full_rebuild_is_incremental(fake_ingest):
+    worker = rag_ingest.IngestWorker()
+    full = worker.submit(force_reload=True)
+    _wait(lambda: worker.status(full)["status"] == "running")
+    assert worker.submit(force_reload=True) == full  # not listed yet
+    assert worker.submit(force_reload=False) == full
+
+    fake_ingest.list_gate.set()
+    _wait(lambda: worker._jobs[full].listed)
+    follow_up = worker.submit(force_reload=True)
+    assert worker.status(follow_up)["force_reload"] is False
+
+    fake_ingest.done_gate.set()
+    _wait(lambda: worker.status(follow_up)["status"] == "done")
+    assert fake_ingest.runs == [True, False]
+
+
+def test_a_cancelled_job_is_not_reused(fake_ingest):
+    worker = rag_ingest.IngestWorker()
+    first = worker.submit()
+    _wait(lambda: worker.status(first)["status"] == "running")
+    assert worker.cancel(first)
+    second = worker.submit()
+    assert second != first
+    fake_ingest.list_gate.set()
+    fake_ingest.done_gate.set()
+    _wait(lambda: worker.status(second)["status"] == "done")
+
+
+class _CountingEmbeddings(HashingEmbeddings):
+    def __init__(self, cancel=None):
+        super().__init__(dim=32)
+        self.cancel = cancel
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        if self.cancel is not None:
+            self.cancel.set()  # cancel as soon as the first batch is embedded
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    docs = tmp_path / "documents"
+    docs.mkdir()
+    (docs / "urls.txt").write_text("")
+    sentence = "Clause {i} of section {p}: the covered product is repaired or replaced within {i} days. "
+    for name in ("a", "b"):
+        pages = ["".join(sentence.format(i=i, p=p) for i in range(12)) for p in range(3)]
+        write_pdf(str(docs / f"{name}.pdf"), pages)
+    monkeypatch.setattr(rag_ingest, "DOCS_DIR", str(docs))
+    monkeypatch.setattr(rag_ingest, "URL_FILE", str(docs / "urls.txt"))
+    monkeypatch.setattr(rag_ingest, "PERSIST_DIR", str(tmp_path / "store"))
+    # Small batches, one at a time, so a cancel lands between batches
+    monkeypatch.setattr(rag_ingest, "_EmbeddingStage",
+                        functools.partial(rag_ingest._EmbeddingStage, max_items=4, concurrency=1))
+    return tmp_path
+
+
+def test_cancel_between_batches_then_resume(corpus):
+    reference = _CountingEmbeddings()
+    assert rag_ingest.ingest_documents(force_reload=False, output_dir=str(corpus / "reference"),
+                                       embeddings=reference)
+    total = reference.texts
+    assert total > 8
+
+    cancel = threading.Event()
+    first = _CountingEmbeddings(cancel)
+    with pytest.raises(rag_ingest.IngestCancelled):
+        rag_ingest.ingest_documents(force_reload=False, embeddings=first, cancel=cancel)
+    assert first.texts < total
+    # Nothing published; the build is left for the next run, marked as released
+    assert resolve_store(rag_ingest.PERSIST_DIR)[0] == ""
+    [staged] = (corpus / "store" / "generations").iterdir()
+    assert (staged / STAGING_FILE).read_text() == "0"
+
+    second = _CountingEmbeddings()
+    assert rag_ingest.ingest_documents(force_reload=False, embeddings=second)
+    generation, path = resolve_store(rag_ingest.PERSIST_DIR)
+    assert generation and path == str(staged)
+    # Committed batches are not embedded again
+    assert first.texts + second.texts == total
@@ -0,0 +1,11 @@
+def test_pooled_models_are_shared(fake_openai):
+    from modules.fallback import GPTFallback
+    from modules.llm_pool import get_chat_model, http_clients
+
+    first, second = GPTFallback(), GPTFallback()
+    assert first.llm is second.llm
+    assert first.llm.root_client._client is http_clients()[0]
+    other = get_chat_model(first.llm.model_name, 1.23)
+    assert other is not first.llm  # another temperature, another model…
+    assert other.root_client._client is http_clients()[0]  # …on the same connection pool
+    assert first.answer("hello")
@@ -0,0 +1,102 @@
+import threading
+
+from modules.memory import ChatMemory
+from modules.tokens import count_tokens
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _SummaryLLM:
+    def __init__(self, fail=False, gate=None):
+        self.fail = fail
+        self.gate = gate
+        self.calls = 0
+
+    def invoke(self, prompt):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return _Reply(f"summary #{self.calls}")
+
+
+def _chat(memory, turns, words=20):
+    for i in range(turns):
+        memory.add_user_message(f"question {i} " + "word " * words)
+        memory.add_ai_message(f"answer {i} " + "word " * words)
+
+
+def test_memory_stays_within_budget_and_folds_in_batches():
+    llm = _SummaryLLM()
+    memory = ChatMemory(token_budget=200, summary_tokens=40, max_messages=40, llm=llm)
+    _chat(memory, 30)
+    memory.flush()
+
+    assert memory.token_count() <= 200
+    assert memory.summary.startswith("summary #")
+    # Evicting down to the low-water mark batches the folds
+    assert 0 < llm.calls < 30
+    # Newest turn is verbatim, and history never starts with an orphaned answer
+    history = memory.history()
+    assert history[-1]["content"].startswith("answer 29")
+    assert history[0]["role"] == "user"
+
+
+def test_message_cap_is_enforced():
+    memory = ChatMemory(token_budget=100_000, summary_tokens=40, max_messages=6, llm=_SummaryLLM())
+    _chat(memory, 10, words=1)
+    assert len(memory) <= 6
+    assert memory.summary
+
+
+def test_failed_summary_keeps_the_evicted_text_within_the_summary_budget():
+    memory = ChatMemory(token_budget=200, summary_tokens=40, max_messages=40, llm=_SummaryLLM(fail=True))
+    _chat(memory, 20)
+    memory.flush()
+    assert "answer" in memory.summary
+    assert count_tokens(memory.summary, memory.model_name) <= 40
+
+
+def test_messages_and_clear():
+    memory = ChatMemory(token_budget=200, summary_tokens=40, llm=_SummaryLLM())
+    _chat(memory, 20)
+    memory.flush()
+    messages = memory.messages()
+    assert messages[0].type == "system" and "summary #" in messages[0].content
+    assert memory.load_memory_variables()["chat_history"] == messages
+
+    memory.clear()
+    assert len(memory) == 0 and memory.summary == "" and memory.token_count() == 0
+
+
+def test_summary_model_runs_after_the_answer_not_before_retrieval():
+    gate = threading.Event()
+    llm = _SummaryLLM(gate=gate)
+    memory = ChatMemory(token_budget=200, summary_tokens=40, max_messages=4, llm=llm)
+    _chat(memory, 2, words=1)
+    memory.add_user_message("question 2")  # evicts the first turn
+    # No model call yet: the evicted turn sits in the summary as plain text
+    assert llm.calls == 0 and memory._pending is None
+    assert "question 0" in memory.summary
+
+    # The answer starts the fold without waiting for the (slow) model
+    memory.add_ai_message("answer 2")
+    assert memory._pending is not None and "question 0" in memory.summary
+    gate.set()
+    memory.flush()
+    assert llm.calls == 1 and memory.summary == "summary #1"
+
+
+def test_clear_drops_a_fold_in_flight():
+    gate = threading.Event()
+    memory = ChatMemory(token_budget=200, summary_tokens=40, max_messages=4, llm=_SummaryLLM(gate=gate))
+    _chat(memory, 3, words=1)
+    pending = memory._pending
+    memory.clear()
+    gate.set()
+    pending.result(5)
+    assert memory.summary == "" and memory.token_count() == 0
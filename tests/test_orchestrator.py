@@ -0,0 +1,89 @@
+import asyncio
+
+from modules.config import SIMILARITY_THRESHOLD
+from modules.orchestrator import AnswerOrchestrator, BORDERLINE, CONFIDENT, MISS
+from modules.rag_qa import Retrieval
+
+
+def _retrieval(confidence, sources=("doc",)):
+    return Retrieval(vector=[0.0], generation="g", sources=list(sources), confidence=confidence)
+
+
+class _StubRAG:
+    def __init__(self, retrieval, answer, delay=0.0):
+        self.retrieval, self._answer, self.delay = retrieval, answer, delay
+
+    async def aretrieve(self, question, max_tokens=None):
+        return self.retrieval
+
+    async def aanswer(self, question, retrieval, max_tokens=None):
+        await asyncio.sleep(self.delay)
+        return self._answer, (retrieval.sources if self._answer else [])
+
+    def retrieve(self, question, max_tokens=None):
+        return self.retrieval
+
+    def stream_answer(self, question, retrieval, max_tokens=None):
+        yield from self._answer.split(" ") if self._answer else []
+
+
+class _StubFallback:
+    def __init__(self, delay=0.0):
+        self.delay, self.started, self.cancelled = delay, 0, 0
+
+    async def aanswer(self, question, max_tokens=None):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "general answer"
+
+    def stream(self, question, max_tokens=None):
+        yield "general answer"
+
+
+def test_bands():
+    orchestrator = AnswerOrchestrator(_StubRAG(None, ""), _StubFallback(), margin=0.1)
+    assert orchestrator.band(None) == MISS
+    assert orchestrator.band(_retrieval(0.9, sources=())) == MISS
+    assert orchestrator.band(_retrieval(SIMILARITY_THRESHOLD + 0.2)) == CONFIDENT
+    assert orchestrator.band(_retrieval(SIMILARITY_THRESHOLD + 0.05)) == BORDERLINE
+    assert orchestrator.band(_retrieval(None)) == BORDERLINE  # BM25-only hit
+
+
+def test_borderline_rag_answer_wins_and_cancels_the_fallback():
+    fallback = _StubFallback(delay=1.0)
+    rag = _StubRAG(_retrieval(SIMILARITY_THRESHOLD), "from the documents", delay=0.05)
+    outcome = AnswerOrchestrator(rag, fallback).answer("q")
+    assert (outcome.provenance, outcome.band, outcome.answer) == ("RAG", BORDERLINE, "from the documents")
+    assert fallback.started == 1 and fallback.cancelled == 1
+
+
+def test_borderline_miss_uses_the_fallback_already_in_flight():
+    fallback = _StubFallback(delay=0.2)
+    rag = _StubRAG(_retrieval(SIMILARITY_THRESHOLD), "", delay=0.2)
+    outcome = AnswerOrchestrator(rag, fallback).answer("q")
+    assert (outcome.provenance, outcome.answer) == ("GPT", "general answer")
+    assert fallback.started == 1 and fallback.cancelled == 0
+
+
+def test_confident_retrieval_never_starts_the_fallback():
+    fallback = _StubFallback()
+    rag = _StubRAG(_retrieval(SIMILARITY_THRESHOLD + 0.5), "from the documents")
+    outcome = AnswerOrchestrator(rag, fallback).answer("q")
+    assert outcome.provenance == "RAG" and fallback.started == 0
+
+
+def test_miss_without_fallback_returns_none():
+    rag = _StubRAG(None, "")
+    outcome = AnswerOrchestrator(rag, _StubFallback()).answer("q", use_fallback=False)
+    assert (outcome.provenance, outcome.answer) == ("NONE", "")
+
+
+def test_stream_labels_provenance_before_the_first_token():
+    rag = _StubRAG(_retrieval(SIMILARITY_THRESHOLD + 0.5), "from the documents")
+    result = AnswerOrchestrator(rag, _StubFallback()).stream("q")
+    first = next(result.tokens)
+    assert first == "from" and result.provenance == "RAG" and result.sources == ["doc"]
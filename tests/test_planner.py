@@ -0,0 +1,185 @@
+import json
+import time
+import asyncio
+
+from modules.orchestrator import Outcome
+from modules.planner import Planner, QueryPlan, SubQuery, _parse_plan
+from modules.tracing import _current, get_tracer
+
+
+def _reply(*subqueries):
+    return json.dumps({"subqueries": list(subqueries)})
+
+
+def test_parse_plan_orders_prerequisites_first():
+    plan = _parse_plan("q", _reply(
+        {"id": "b", "question": "What is the fee for {a}?", "depends_on": ["a"]},
+        {"id": "a", "question": "Which plan do I have?", "depends_on": []},
+    ), max_subqueries=4)
+    assert [n.id for n in plan.nodes] == ["a", "b"]
+    assert plan.compound
+
+
+def test_parse_plan_falls_back_to_the_question_on_garbage():
+    for text in ("not json", "{\"subqueries\": 3}", "", _reply({"id": "q1", "question": "  "})):
+        plan = _parse_plan("What is covered?", text, max_subqueries=4)
+        assert [(n.id, n.question) for n in plan.nodes] == [("q1", "What is covered?")]
+        assert not plan.compound
+
+
+def test_parse_plan_caps_and_dedupes():
+    items = [{"id": "q1", "question": f"part {i}"} for i in range(3)]
+    items += [{"id": f"q{i}", "question": f"part {i}"} for i in range(2, 9)]
+    plan = _parse_plan("q", _reply(*items), max_subqueries=4)
+    # The cap applies to the model's list; duplicate ids inside it are skipped
+    assert [n.id for n in plan.nodes] == ["q1", "q2"]
+
+
+def test_unknown_dependencies_and_their_placeholders_are_dropped():
+    plan = QueryPlan("q", [
+        SubQuery("a", "Which plan?"),
+        SubQuery("c", "Limits of {a} and {zz} today", ["a", "zz"]),
+    ])
+    c = plan.nodes[1]
+    assert c.depends_on == ["a"]
+    assert c.question == "Limits of {a} and today"
+
+
+def test_unlisted_placeholder_becomes_a_dependency():
+    plan = QueryPlan("q", [SubQuery("b", "Fee for {a}?"), SubQuery("a", "Which plan?")])
+    assert [n.id for n in plan.nodes] == ["a", "b"]
+    assert plan.nodes[1].depends_on == ["a"]
+
+
+def test_cycle_is_broken_and_the_dropped_placeholder_removed():
+    plan = QueryPlan("q", [
+        SubQuery("a", "Which plan covers {b}?", ["b"]),
+        SubQuery("b", "Fee for {a}?", ["a"]),
+    ])
+    assert [(n.id, n.depends_on, n.question) for n in plan.nodes] == [
+        ("a", [], "Which plan covers?"),
+        ("b", ["a"], "Fee for {a}?"),
+    ]
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _StubLLM:
+    def __init__(self, plan_json):
+        self.plan_json = plan_json
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return _Reply(self.plan_json if "Reply with JSON only" in prompt else "combined answer")
+
+    def invoke(self, prompt):
+        return asyncio.run(self.ainvoke(prompt))
+
+    def stream(self, prompt):
+        for word in ("combined ", "answer"):
+            yield _Reply(word)
+
+
+class _SlowOrchestrator:
+    def __init__(self, delay):
+        self.delay = delay
+        self.questions = []
+
+    async def aanswer(self, question, max_tokens=None, use_fallback=True):
+        self.questions.append(question)
+        await asyncio.sleep(self.delay)
+        return Outcome(f"answer to {question}", [], "RAG", "confident")
+
+
+def test_single_questions_skip_the_decomposition_call():
+    planner = Planner()
+    planner._llm = _StubLLM("unused")
+    plan = planner.plan("What is the deductible?")
+    assert not plan.compound
+    assert planner._llm.prompts == []
+
+
+def test_independent_subqueries_run_concurrently_then_synthesize():
+    planner = Planner()
+    planner._llm = _StubLLM(_reply(
+        {"id": "q1", "question": "What is covered?"},
+        {"id": "q2", "question": "How do I return it?"},
+    ))
+    plan = planner.plan("What's covered and how do I return it?")
+    assert len(plan) == 2
+
+    orchestrator = _SlowOrchestrator(delay=0.3)
+    started = time.perf_counter()
+    outcome = planner.answer(plan, orchestrator)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.55  # one round, not two
+    assert outcome.answer == "combined answer"
+    assert outcome.provenance == "RAG"
+    assert sorted(orchestrator.questions) == ["How do I return it?", "What is covered?"]
+
+
+def test_dependent_subquery_receives_its_prerequisite_answer():
+    planner = Planner()
+    planner._llm = _StubLLM(_reply(
+        {"id": "q1", "question": "Which plan do I have?"},
+        {"id": "q2", "question": "What is the fee for {q1}?", "depends_on": ["q1"]},
+    ))
+    plan = planner.plan("Which plan do I have, and what is its fee?")
+    orchestrator = _SlowOrchestrator(delay=0.0)
+    planner.answer(plan, orchestrator)
+    assert orchestrator.questions == [
+        "Which plan do I have?",
+        "What is the fee for answer to Which plan do I have??",
+    ]
+
+
+def test_streamed_synthesis_is_recorded_without_leaking_its_span():
+    planner = Planner()
+    planner._llm = _StubLLM(_reply(
+        {"id": "q1", "question": "What is covered?"},
+        {"id": "q2", "question": "How do I return it?"},
+    ))
+    plan = planner.plan("What's covered and how do I return it?")
+    tracer = get_tracer()
+    before = tracer.stage_stats().get("plan.synthesize", {}).get("count", 0)
+
+    result = planner.stream(plan, _SlowOrchestrator(delay=0.0))
+    tokens = iter(result.tokens)
+    assert next(tokens) == "combined "
+    # While the generator is suspended, the consumer is not inside its span
+    assert _current.get() is None
+    assert "".join(tokens) == "answer"
+    assert result.provenance == "RAG"
+    assert tracer.stage_stats()["plan.synthesize"]["count"] == before + 1
+
+    # Abandoned mid-stream (e.g. a Streamlit rerun): still recorded, no context error
+    abandoned = iter(planner.stream(plan, _SlowOrchestrator(delay=0.0)).tokens)
+    next(abandoned)
+    abandoned.close()
+    assert tracer.stage_stats()["plan.synthesize"]["count"] == before + 2
+
+
+def test_task_store_is_fifo_per_name_and_by_status():
+    planner = Planner()
+    for name in ("ingest", "query", "web"):
+        planner.add_task(name)
+    assert planner.get_next_task()["name"] == "ingest"
+    assert planner.mark_task_completed("ingest")
+    assert planner.mark_task_completed("web")
+    assert not planner.mark_task_completed("missing")
+    assert planner.get_next_task()["name"] == "query"
+
+    planner.add_task("web", {"retry": True})
+    assert planner.mark_task_completed("query")
+    assert planner.get_next_task() == {"name": "web", "params": {"retry": True}, "status": "pending"}
+    status = planner.get_status()
+    assert [t["name"] for t in status["completed_tasks"]] == ["ingest", "web", "query"]
+    assert [t["name"] for t in status["pending_tasks"]] == ["web"]
+
+    planner.reset()
+    assert planner.get_next_task() is None
@@ -0,0 +1,70 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from modules.reranker import CrossEncoderReranker, MMRReranker
+
+
+def _docs(*texts):
+    return [Document(id=f"d{i}", page_content=t) for i, t in enumerate(texts)]
+
+
+def test_mmr_prefers_a_diverse_chunk_over_a_near_duplicate():
+    docs = _docs("theft reimbursed", "theft reimbursed again", "refund of the plan fee")
+    vectors = np.array([[1.0, 0.0], [0.99, 0.05], [0.6, 0.8]], dtype=np.float32)
+    query = [1.0, 0.0]
+
+    picked = MMRReranker(mmr_lambda=0.5, time_budget_ms=1000).rerank("theft refund", query, docs, 2, vectors)
+    assert [d.id for d in picked] == ["d0", "d2"]
+    # λ = 1: relevance only, the near-duplicate wins
+    picked = MMRReranker(mmr_lambda=1.0, time_budget_ms=1000).rerank("theft refund", query, docs, 2, vectors)
+    assert [d.id for d in picked] == ["d0", "d1"]
+
+
+def test_mmr_without_vectors_orders_by_term_overlap():
+    docs = _docs("nothing relevant", "police report filed", "theft police report filed")
+    picked = MMRReranker().rerank("theft police report", [0.0], docs, 2, vectors=None)
+    assert [d.id for d in picked] == ["d2", "d1"]
+
+
+def test_mmr_out_of_budget_falls_back_to_relevance_order():
+    docs = _docs("a", "b", "c", "d")
+    vectors = np.array([[1, 0], [0.99, 0.01], [0.9, 0.4], [0, 1]], dtype=np.float32)
+    picked = MMRReranker(mmr_lambda=0.0, time_budget_ms=0).rerank("", [1.0, 0.0], docs, 3, vectors)
+    # λ = 0 would pick for diversity alone; with no budget the rest is plain relevance order
+    assert [d.id for d in picked] == ["d0", "d1", "d2"]
+
+
+def test_short_candidate_lists_are_returned_unchanged():
+    docs = _docs("a", "b")
+    assert MMRReranker().rerank("q", [1.0], docs, 5) is docs
+
+
+class _Model:
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size):
+        self.pairs += len(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+
+def _cross_encoder(batch_size, budget_ms):
+    # Bypass __init__ (it loads sentence-transformers)
+    reranker = CrossEncoderReranker.__new__(CrossEncoderReranker)
+    reranker.model, reranker.batch_size, reranker.time_budget = _Model(), batch_size, budget_ms / 1000.0
+    return reranker
+
+
+def test_cross_encoder_orders_by_score():
+    docs = _docs("x", "xxxx", "xx", "xxx")
+    picked = _cross_encoder(batch_size=2, budget_ms=1000).rerank("q", None, docs, 3)
+    assert [d.id for d in picked] == ["d1", "d3", "d2"]
+
+
+def test_cross_encoder_out_of_budget_keeps_the_first_stage_order_for_the_rest():
+    docs = _docs("x", "xx", "xxxxx", "xxxx", "xxx")
+    reranker = _cross_encoder(batch_size=2, budget_ms=0)
+    picked = reranker.rerank("q", None, docs, 4)
+    # Only the first batch was scored; the unscored candidates follow in retrieval order
+    assert reranker.model.pairs == 2
+    assert [d.id for d in picked] == ["d1", "d0", "d2", "d3"]
@@ -0,0 +1,113 @@
+import json
+import asyncio
+
+import pytest
+
+from modules import service
+from modules.orchestrator import Outcome
+from modules.service import RAGService, ServiceBusy, make_handler
+
+
+class _Orchestrator:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.questions = []
+
+    async def aanswer(self, question, max_tokens=None, use_fallback=True):
+        self.questions.append(question)
+        await asyncio.sleep(self.delay)
+        return Outcome(f"answer to {question}", [], "RAG", "confident")
+
+
+def _service(delay=0.0, max_pending=8):
+    svc = RAGService(rag=object(), max_concurrency=1, max_pending=max_pending)
+    svc.orchestrator = _Orchestrator(delay)
+    return svc
+
+
+async def _request(port, raw: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), head.decode("latin-1"), body
+
+
+def _post(payload: bytes, length=None) -> bytes:
+    length = len(payload) if length is None else length
+    return b"POST /query HTTP/1.1\r\nContent-Length: " + str(length).encode() + b"\r\n\r\n" + payload
+
+
+def _run(svc, *requests):
+    async def main():
+        server = await asyncio.start_server(make_handler(svc), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await asyncio.gather(*(_request(port, raw) for raw in requests))
+
+    return asyncio.run(main())
+
+
+def test_query_and_health():
+    svc = _service()
+    (status, _, body), (health, _, _) = _run(
+        svc, _post(b'{"question": "  What is covered?  "}'), b"GET /healthz HTTP/1.1\r\n\r\n"
+    )
+    assert status == 200 and health == 200
+    assert json.loads(body)["answer"] == "answer to What is covered?"
+    assert svc.orchestrator.questions == ["What is covered?"]
+
+
+@pytest.mark.parametrize("raw", [
+    _post(b"{not json"),
+    _post(b'["question"]'),
+    _post(b'{"max_tokens": 10}'),
+    _post(b'{"question": ""}'),
+    _post(b'{"question": "   "}'),
+    _post(b'{"question": null}'),
+    _post(b'{"question": "ok", "max_tokens": "many"}'),
+    b"POST /query HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+    b"POST /query HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+])
+def test_malformed_requests_are_400_and_never_reach_the_model(raw):
+    svc = _service()
+    [(status, _, body)] = _run(svc, raw)
+    assert status == 400 and "error" in json.loads(body)
+    assert svc.orchestrator.questions == []
+
+
+def test_oversized_body_is_413_without_reading_it():
+    svc = _service()
+    [(status, _, _)] = _run(svc, _post(b"", length=service.MAX_BODY_BYTES + 1))
+    assert status == 413
+    assert svc.orchestrator.questions == []
+
+
+def test_unknown_route_is_404():
+    [(status, _, _)] = _run(_service(), b"GET /nope HTTP/1.1\r\n\r\n")
+    assert status == 404
+
+
+def test_backpressure_rejects_with_503_and_retry_after():
+    svc = _service(delay=0.2, max_pending=1)
+    responses = _run(svc, _post(b'{"question": "a"}'), _post(b'{"question": "b"}'))
+    assert sorted(status for status, _, _ in responses) == [200, 503]
+    [busy] = [head for status, head, _ in responses if status == 503]
+    assert "Retry-After: 1" in busy
+    assert len(svc.orchestrator.questions) == 1
+
+
+def test_aquery_raises_busy_past_max_pending():
+    svc = _service(delay=0.1, max_pending=1)
+
+    async def main():
+        first = asyncio.ensure_future(svc.aquery("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(ServiceBusy):
+            await svc.aquery("b")
+        return await first
+
+    assert asyncio.run(main())["answer"] == "answer to a"
+    assert svc.pending == 0
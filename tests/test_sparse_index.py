@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from modules.sparse_index import SparseIndex, reciprocal_rank_fusion, tokenize
+
+
+def _index():
+    index = SparseIndex()
+    index.add("refund", "Cancellation refund: the plan refunds the unused monthly fee on cancellation.")
+    index.add("theft", "Theft is excluded unless the product was stolen during an authorized repair.")
+    index.add("water", "Water damage from spills is covered; flood damage is excluded.")
+    return index
+
+
+def test_bm25_ranks_the_matching_chunk_first():
+    results = _index().search("refund after cancellation", k=3)
+    assert results[0][0] == "refund"
+    assert all(0.0 <= coverage <= 1.0 for _, _, coverage in results)
+
+
+def test_unknown_terms_match_nothing():
+    assert _index().search("zebra xylophone", k=3) == []
+
+
+def test_remove_and_reconcile():
+    index = _index()
+    index.remove(["theft"])
+    assert len(index) == 2
+    assert all(chunk_id != "theft" for chunk_id, _, _ in index.search("theft stolen", k=3))
+
+    texts = {"theft": "Theft is excluded.", "new": "Power surge damage is covered."}
+    changed = index.reconcile(["refund", "theft", "new"], lambda ids: {i: texts[i] for i in ids})
+    assert changed == 3  # "water" removed, "theft" and "new" added
+    assert index.search("power surge", k=1)[0][0] == "new"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index()
+    index.save(str(tmp_path))
+    loaded = SparseIndex.load(str(tmp_path))
+    assert loaded.search("water spills", k=2) == index.search("water spills", k=2)
+    assert SparseIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_tokenize_is_case_insensitive():
+    assert tokenize("Refund REFUND refund") == tokenize("refund refund refund")
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_by_both():
+    a, b, c = (Document(id=i, page_content=i) for i in "abc")
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c]], limit=3)
+    assert [d.id for d in fused] == ["b", "c", "a"]
+    assert [d.id for d in reciprocal_rank_fusion([[a, b, c], [b, c]], limit=1)] == ["b"]
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from modules import store_registry
+from modules.generation import CHROMA_FILE, publish_generation, stage_generation
+from modules.store_registry import StoreRegistry
+
+
+class _Handle:
+    """Stands in for StoreHandle: no Chroma, just records close()."""
+
+    def __init__(self, path, generation, embeddings):
+        self.path = path
+        self.generation = generation
+        self.refs = 0
+        self.retired = False
+        self.closed = False
+
+    def close(self):
+        assert not self.closed, "closed twice"
+        self.closed = True
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_registry, "StoreHandle", _Handle)
+    return StoreRegistry(str(tmp_path))
+
+
+def _publish(persist_dir):
+    path, _ = stage_generation(persist_dir)
+    open(os.path.join(path, CHROMA_FILE), "w").close()
+    return publish_generation(persist_dir, path)
+
+
+def test_missing_store_raises(registry):
+    with pytest.raises(FileNotFoundError):
+        with registry.acquire():
+            pass
+
+
+def test_readers_share_one_handle_and_refs_are_counted(registry):
+    _publish(registry.persist_dir)
+    with registry.acquire() as first:
+        with registry.acquire() as second:
+            assert first is second
+            assert registry.stats()["in_flight"] == 2
+        assert registry.stats()["in_flight"] == 1
+    assert first.refs == 0 and not first.closed
+
+
+def test_swapped_generation_is_closed_after_its_last_reader(registry):
+    g1 = _publish(registry.persist_dir)
+    with registry.acquire() as old:
+        assert old.generation == g1
+        g2 = _publish(registry.persist_dir)
+        with registry.acquire() as new:
+            # New readers get the new generation; the old one drains
+            assert new is not old and new.generation == g2
+            assert old.retired and not old.closed
+            assert registry.stats()["draining"] == 1
+        assert not old.closed
+    assert old.closed and not new.closed
+    assert registry.stats()["draining"] == 0
+
+
+def test_retire_closes_an_idle_handle_now_and_a_busy_one_after_drain(registry):
+    _publish(registry.persist_dir)
+    idle = registry.current()
+    registry.retire()
+    assert idle.closed
+
+    with registry.acquire() as busy:
+        registry.retire()
+        assert busy.retired and not busy.closed
+        # The next reader opens a fresh handle instead of the retired one
+        with registry.acquire() as fresh:
+            assert fresh is not busy
+    assert busy.closed and not fresh.closed
@@ -0,0 +1,29 @@
+from modules.summarizer import Summarizer
+from modules.tracing import get_tracer
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class _StubChain:
+    def stream(self, inputs):
+        for word in ("short ", "summary"):
+            yield _Chunk(word)
+
+
+def _count(stage):
+    return get_tracer().stage_stats().get(stage, {}).get("count", 0)
+
+
+def test_stream_is_recorded_as_the_summarize_stage():
+    summarizer = Summarizer()
+    summarizer.chain = _StubChain()
+    before = _count("summarize")
+
+    assert "".join(summarizer.stream("word " * 50, max_tokens=5)) == "short summary"
+    # Within budget: passed through, no model call, still one stage
+    assert "".join(summarizer.stream("already short", max_tokens=50)) == "already short"
+    assert _count("summarize") == before + 2
+    assert "summarize.stream" not in get_tracer().stage_stats()
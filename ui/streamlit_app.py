@@ -2,10 +2,6 @@
 
 import os
 import sys
-import time
-import gc
-import shutil
-import tempfile
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -18,13 +14,10 @@ if ROOT not in sys.path:
 load_dotenv(os.path.join(ROOT, ".env"))
 
 # ─── App modules ───
-from modules.rag_qa import RAGQA
-from modules.summarizer import Summarizer
-from modules.memory import ChatMemory
-from modules.planner import Planner
-from modules.fallback import fallback_answer
-import modules.rag_ingest as rag_ingest
-from modules.config import PERSIST_DIR
+# Only the light ones here: RAG, LLM clients and the ingestion stack are imported
+# and built on first use (see "Session objects"), so the login screen renders
+# without loading LangChain/OpenAI, and query-only sessions never import rag_ingest.
+from modules.tracing import span, get_tracer
 from modules.config import OPENAI_MODEL_FALLBACK as FALLBACK_MODEL
 
 # ─── Auth ───
@@ -44,19 +37,41 @@ st.title("🤖 AI Agent MCP")
 # ─── Session state init ───
 if "auth" not in st.session_state:
     st.session_state.auth = False
-if "rag" not in st.session_state:
-    st.session_state.rag = RAGQA()
-if "summ" not in st.session_state:
-    st.session_state.summ = Summarizer()
-if "plan" not in st.session_state:
-    st.session_state.plan = Planner()
-if "mem" not in st.session_state:
-    st.session_state.mem = ChatMemory()
-if "hist" not in st.session_state:
-    st.session_state.hist = []
 if "use_gpt_fallback" not in st.session_state:
     st.session_state.use_gpt_fallback = False
 
+
+# ─── Session objects (built on first use, never before login) ───
+def _session(key, factory):
+    if key not in st.session_state:
+        st.session_state[key] = factory()
+    return st.session_state[key]
+
+
+def _rag():
+    from modules.rag_qa import RAGQA
+    return _session("rag", RAGQA)
+
+
+def _orch():
+    from modules.orchestrator import AnswerOrchestrator
+    return _session("orch", lambda: AnswerOrchestrator(_rag()))
+
+
+def _summ():
+    from modules.summarizer import Summarizer
+    return _session("summ", Summarizer)
+
+
+def _plan():
+    from modules.planner import Planner
+    return _session("plan", Planner)
+
+
+def _mem():
+    from modules.memory import ChatMemory
+    return _session("mem", ChatMemory)
+
 # ─── Login ───
 if not st.session_state.auth:
     st.subheader("🔐 Login")
@@ -73,33 +88,57 @@ if not st.session_state.auth:
 # ─── Sidebar ───
 st.sidebar.header("Settings & Tools")
 
-# Refresh Vector Store (temp-dir build + atomic swap)
-if st.sidebar.button("🔁 Refresh Vector Store"):
-    try:
-        # 1) Release current RAG/Chroma so SQLite files are unlocked
-        st.session_state.rag = None
-        gc.collect()
-        time.sleep(0.5)
-
-        # 2) Build in a temp directory first (avoids writing into a locked dir)
-        with st.spinner("♻️ Rebuilding vector store…"):
-            tmp_dir = tempfile.mkdtemp(prefix="vectorstore_")
-            rag_ingest.ingest_documents(force_reload=True, output_dir=tmp_dir)
-
-        # 3) Replace old store with new one
-        if os.path.exists(PERSIST_DIR):
-            shutil.rmtree(PERSIST_DIR)
-        shutil.move(tmp_dir, PERSIST_DIR)
-
-        # 4) Reload RAG
-        st.session_state.rag = RAGQA(force_reload=True)
-        st.sidebar.success("✅ Vector store refreshed and reloaded.")
-    except Exception as e:
-        st.sidebar.error(f"❌ Ingestion error: {e}")
+# Refresh Vector Store (background job builds a new generation, then swaps the pointer)
+def _ingest():
+    import modules.rag_ingest as rag_ingest
+    return rag_ingest
+
+
+@st.cache_resource
+def _refresh_state():
+    # Last submitted refresh job, shared by every session of this server process
+    return {"job_id": None}
+
+
+@st.fragment(run_every=2)
+def _refresh_panel():
+    state = _refresh_state()
+    # The ingestion stack is imported only once a refresh has been requested
+    rag_ingest = _ingest() if state["job_id"] else None
+    job = rag_ingest.job_status(state["job_id"]) if rag_ingest else None
+    active = job is not None and job["status"] in ("queued", "running")
+
+    if st.button("🔁 Refresh Vector Store", disabled=active):
+        # Queries keep using the live generation until the new one is published
+        rag_ingest = _ingest()
+        state["job_id"] = rag_ingest.submit_ingest(force_reload=False)
+        job = rag_ingest.job_status(state["job_id"])
+        active = True
+
+    if job is None:
+        return
+    if active:
+        total = job["sources_total"]
+        label = f"♻️ {job['status'].capitalize()}: {job['sources_done']}/{total or '?'} source(s), " \
+                f"{job['chunks_embedded']} chunk(s) embedded"
+        if job["eta"] is not None:
+            label += f", ~{int(job['eta'])}s left"
+        st.progress(job["sources_done"] / total if total else 0.0, text=label)
+        if st.button("✖ Cancel refresh"):
+            rag_ingest.cancel_job(job["id"])
+    elif job["status"] == "done":
+        st.success("✅ Vector store refreshed. New queries use the new generation.")
+    elif job["status"] == "cancelled":
+        st.info("Refresh cancelled; the next one resumes where it stopped.")
+    else:
+        st.error(f"❌ Ingestion error: {job['error']}")
+
+
+with st.sidebar:
+    _refresh_panel()
 
 if st.sidebar.button("🔄 Reset Conversation"):
-    st.session_state.mem.clear()
-    st.session_state.hist = []
+    _mem().clear()
     st.session_state.auth = True
     st.experimental_rerun()
 
@@ -107,85 +146,113 @@ st.session_state.use_gpt_fallback = st.sidebar.checkbox(
     "Enable GPT fallback", value=st.session_state.use_gpt_fallback
 )
 
+# Query-embedding cache counters (only when the cache is enabled and RAG is loaded)
+rag_obj = st.session_state.get("rag")
+if rag_obj is not None and hasattr(rag_obj.embeddings, "stats"):
+    _stats = rag_obj.embeddings.stats()
+    st.sidebar.caption(
+        f"🧮 Embedding cache: {_stats['hits']} hits · {_stats['misses']} misses "
+        f"({_stats['hit_rate']:.0%})"
+    )
+if rag_obj is not None and rag_obj.answer_cache is not None:
+    _stats = rag_obj.answer_cache.stats()
+    st.sidebar.caption(
+        f"♻️ Answer cache: {_stats['hits']} hits · {_stats['misses']} misses "
+        f"({_stats['entries']} cached)"
+    )
+
+# Per-stage latency over the recent window (all sessions of this server process)
+with st.sidebar.expander("⏱️ Latency (p50 / p95)"):
+    _latency = get_tracer().stage_stats()
+    if _latency:
+        st.table([
+            {"stage": name, "n": s["count"], "p50 ms": round(s["p50_ms"], 1), "p95 ms": round(s["p95_ms"], 1)}
+            for name, s in sorted(_latency.items())
+        ])
+    else:
+        st.caption("No timings yet.")
+
+# ─── Rendering helpers ───
+def _render_stream(placeholder, tokens, on_start=None) -> str:
+    """Write tokens into `placeholder` as they arrive; return the full text."""
+    text = ""
+    for token in tokens:
+        if on_start is not None and not text:
+            on_start()
+        text += token
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
+
+
+def _render_sources(placeholder, sources):
+    with placeholder.container():
+        st.markdown("### 📚 Sources")
+        for doc in sources:
+            # doc could be a langchain Document or dict; be defensive
+            md = getattr(doc, "metadata", None) or (doc.get("metadata") if isinstance(doc, dict) else None) or {}
+            src = md.get("source", "unknown")
+            # For the fallback, we’ll show the label as-is
+            if isinstance(src, str) and src.lower().endswith(".pdf"):
+                src = os.path.basename(src)
+            st.write(f"- {src}")
+
+
 # ─── Main Interaction ───
 query = st.text_input("Ask a question:")
 length = st.slider("Summary Length (max tokens)", min_value=50, max_value=1000, value=300, step=50)
 
 if query:
     try:
-        # 1) Plan (placeholder)
-        steps = st.session_state.plan.plan(query)
+        # 1) Plan: compound questions become sub-queries answered in parallel
+        with span("plan"):
+            qplan = _plan().plan(query)
         st.markdown("### 🔎 Plan")
-        st.write(steps)
+        st.write(qplan.steps())
 
         # 2) Track user message
-        st.session_state.mem.add_user_message(query)
-        st.session_state.hist.append({"role": "user", "content": query})
+        _mem().add_user_message(query)
 
-        # 3) RAG
+        # 3) Answer area: badge, streamed text and sources are filled in as they arrive
+        st.markdown("### 💬 Answer")
+        badge_box = st.empty()
+        answer_box = st.empty()
+        sources_box = st.empty()
+
+        # 4) RAG, or GPT fallback on a miss; borderline retrievals race both so a
+        #    miss costs one LLM round trip (the provenance is known at the first token).
+        #    Sub-queries of a compound question are answered together, then merged.
         with st.spinner("🔎 Searching documents…"):
-            answer, sources = st.session_state.rag.query(query)
-
-        # 4) Decide if RAG “hit” is good enough
-        rag_hit = isinstance(answer, str) and bool(answer.strip()) and bool(sources)
-        provenance = "RAG"  # default; will flip if we use GPT
-
-        # 5) If RAG missed, optionally use GPT (based on checkbox)
-        if not rag_hit:
-            if st.session_state.use_gpt_fallback:
-                with st.spinner(f"💬 No RAG hit — asking ChatGPT ({FALLBACK_MODEL})…"):
-                    fb = fallback_answer(query)   # MUST be called
-                    # Normalize fallback result to string
-                    if callable(fb):
-                        answer = "[Invalid fallback result: function]"
-                    elif isinstance(fb, str):
-                        answer = fb
-                    else:
-                        answer = str(fb)
-                    sources = [{"metadata": {"source": f"💬 ChatGPT (fallback · {FALLBACK_MODEL})"}}]
-                    provenance = "GPT"
+            # Ask for an answer within the requested length so summarizing is rarely needed
+            result = _plan().stream(
+                qplan, _orch(), max_tokens=length, use_fallback=st.session_state.use_gpt_fallback
+            )
+
+        def _label():
+            if result.provenance == "RAG":
+                badge_box.markdown("🧠 **RAG**")
+                _render_sources(sources_box, result.sources)
             else:
-                # Fallback off → provide a helpful message and keep sources empty
-                answer = ("No relevant context found in your documents. "
-                          "Enable **GPT fallback** in the sidebar to answer using general knowledge.")
-                sources = []
-                provenance = "NONE"
-
-        # 6) Normalize answer BEFORE summarizing
-        if callable(answer):
-            answer = "[Internal error: answer was a function]"
-        elif not isinstance(answer, str):
-            answer = str(answer)
-
-        # 7) Summarize
-        summary = st.session_state.summ.summarize(answer, max_tokens=length)
-
-        # 8) Track AI response
-        st.session_state.mem.add_ai_message(summary)
-        st.session_state.hist.append({"role": "assistant", "content": summary})
-
-        # 9) Display with provenance badge
-        st.markdown("### 💬 Answer")
-        if provenance == "RAG":
-            badge = "🧠 **RAG**"
-        elif provenance == "GPT":
-            badge = f"💬 **GPT fallback · model: {FALLBACK_MODEL}**"
-        else:
-            badge = "⚠️ **No context**"
-        st.markdown(badge)
-        st.write(summary)
-
-        # 10) Sources (if any)
-        if sources:
-            st.markdown("### 📚 Sources")
-            for doc in sources:
-                # doc could be a langchain Document or dict; be defensive
-                md = getattr(doc, "metadata", None) or getattr(doc, "__dict__", {}).get("metadata", {}) or {}
-                src = md.get("source", "unknown")
-                # For the fallback, we’ll show the label as-is
-                if isinstance(src, str) and src.lower().endswith(".pdf"):
-                    src = os.path.basename(src)
-                st.write(f"- {src}")
+                badge_box.markdown(f"💬 **GPT fallback · model: {FALLBACK_MODEL}**")
+                _render_sources(sources_box, [{"metadata": {"source": f"💬 ChatGPT (fallback · {FALLBACK_MODEL})"}}])
+
+        answer = _render_stream(answer_box, result.tokens, on_start=_label)
+
+        # 5) Nothing from RAG and fallback off → provide a helpful message
+        if not answer.strip():
+            sources_box.empty()
+            badge_box.markdown("⚠️ **No context**")
+            answer = ("No relevant context found in your documents. "
+                      "Enable **GPT fallback** in the sidebar to answer using general knowledge.")
+            answer_box.markdown(answer)
+
+        # 6) Summarize only if the answer is still over budget (streams over it in place)
+        summary = answer.strip()
+        if _summ().needs_summary(answer, max_tokens=length):
+            summary = _render_stream(answer_box, _summ().stream(answer, max_tokens=length))
+
+        # 7) Track AI response
+        _mem().add_ai_message(summary)
 
     except Exception as e:
         st.error(f"🚨 {e}")
@@ -193,7 +260,10 @@ if query:
 # ─── Chat History ───
 if st.checkbox("Show Chat History"):
     st.markdown("### 📝 History")
-    for msg in st.session_state.hist:
+    # ChatMemory is the only copy: older turns are shown as its running summary
+    if _mem().summary:
+        st.info(f"**Earlier (summary):** {_mem().summary}")
+    for msg in _mem().history():
         who = "You" if msg["role"] == "user" else "AI"
         st.write(f"**{who}:** {msg['content']}")
 